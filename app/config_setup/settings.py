@@ -13,6 +13,7 @@ class Settings(BaseSettings):
     PHONE_NUMBER_ID: str = Field(..., description="ID del número de teléfono asociado a la cuenta de WhatsApp Business")
     META_API_VER: str = Field(..., description="Versión de la API de Meta utilizada")
     META_URL: str = Field(..., description="URL base de la API de Meta")
+    APP_SECRET: Optional[str] = Field(None, description="App Secret de la app de Meta para verificar la firma X-Hub-Signature-256 de los webhooks (vacío = sin verificar)")
     
     # Recipient Configuration
     RECIPIENT_ITEM_1: str = Field(None, description="ID del ítem del destinatario, si es requerido")
@@ -26,6 +27,10 @@ class Settings(BaseSettings):
     NGROK_AUTH_TOKEN: str = Field(..., description="Token de autenticación de ngrok")
     NGROK_COMMAND: str = Field(..., description="Comando para ngrok")
     NGROK_TIMEOUT: int = Field(..., description="Tiempo de espera para ngrok")
+    NGROK_ENABLED: bool = Field(default=True, description="Mantener el túnel ngrok en modo dev (main.py --no-ngrok lo desactiva)")
+    NGROK_API_URL: str = Field(default="http://127.0.0.1:4040", description="URL de la API local del agente ngrok")
+    NGROK_HEALTH_INTERVAL: float = Field(default=10.0, description="Segundos entre revisiones de salud del túnel")
+    NGROK_MAX_FAILURES: int = Field(default=3, description="Revisiones fallidas seguidas tras las cuales se reinicia el agente")
     
     # Debug Configuration
     DEBUG: bool = Field(None, description="Modo de depuración")
@@ -37,7 +42,115 @@ class Settings(BaseSettings):
     # Path Configuration
     DOCS_PATH: str = Field(default="./docs", description="Ruta a los documentos de conocimiento")
     MODELS_PATH: str = Field(default="./models", description="Ruta a los modelos de lenguaje")
-    
+
+    # Logging Configuration
+    LOG_LEVEL: str = Field(default="INFO", description="Nivel mínimo de log (DEBUG, INFO, WARNING, ERROR); DEBUG=True lo fuerza a DEBUG")
+    LOG_QUEUE_ENABLED: bool = Field(default=False, description="Escribir los logs desde un hilo (QueueHandler/QueueListener) fuera del event loop")
+    LOG_FILE: str = Field(default="", description="Archivo de log adicional a la consola (vacío = solo consola)")
+
+    # Server Configuration (modo de arranque de main.py; la línea de comandos tiene prioridad)
+    SERVER_MODE: str = Field(default="dev", description="dev: un proceso + túnel ngrok; prod: varios workers con uvloop/httptools y sin ngrok")
+    SERVER_HOST: str = Field(default="127.0.0.1", description="Interfaz en la que escucha uvicorn (0.0.0.0 para aceptar conexiones externas)")
+    SERVER_PORT: int = Field(default=5000, description="Puerto en el que escucha uvicorn")
+    SERVER_WORKERS: int = Field(default=0, description="Procesos worker en modo prod (0 = uno por CPU)")
+    SERVER_BACKLOG: int = Field(default=2048, description="Conexiones pendientes de aceptar en el socket (modo prod)")
+    SERVER_KEEPALIVE_TIMEOUT: int = Field(default=75, description="Segundos que se mantiene abierta una conexión keep-alive ociosa (modo prod)")
+    SERVER_LIMIT_CONCURRENCY: int = Field(default=0, description="Conexiones/tareas simultáneas por worker antes de responder 503 (0 = sin límite; modo prod)")
+    SERVER_GRACEFUL_SHUTDOWN_TIMEOUT: int = Field(default=15, description="Segundos de espera de los requests en curso al apagar (modo prod)")
+    SERVER_ACCESS_LOG: bool = Field(default=False, description="Log de acceso de uvicorn por request en modo prod")
+    WARMUP_ENABLED: bool = Field(default=True, description="Calentar parser, motor de conversación y modelo al arrancar; GET /ready responde 503 hasta terminar")
+
+    # Metrics Configuration (GET /metrics en formato Prometheus)
+    METRICS_ENABLED: bool = Field(default=True, description="Exponer GET /metrics y medir el lag del event loop")
+    METRICS_LOOP_LAG_INTERVAL: float = Field(default=0.5, description="Segundos entre mediciones del lag del event loop (0 = no medir)")
+
+    # HTTP Client Configuration (cliente compartido hacia la Graph API)
+    HTTP2_ENABLED: bool = Field(default=True, description="Usar HTTP/2 en el cliente saliente (requiere el paquete 'h2')")
+    HTTP_MAX_CONNECTIONS: int = Field(default=100, description="Máximo de conexiones simultáneas del pool")
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = Field(default=20, description="Máximo de conexiones ociosas mantenidas abiertas")
+    HTTP_KEEPALIVE_EXPIRY: float = Field(default=30.0, description="Segundos que una conexión ociosa permanece abierta")
+    HTTP_TIMEOUT: float = Field(default=10.0, description="Timeout en segundos para lectura/escritura de las peticiones")
+    HTTP_CONNECT_TIMEOUT: float = Field(default=5.0, description="Timeout en segundos para establecer la conexión")
+
+    # Webhook Queue Configuration (procesamiento en segundo plano)
+    WEBHOOK_QUEUE_WORKERS: int = Field(default=4, description="Cantidad de workers que procesan los webhooks encolados")
+    WEBHOOK_QUEUE_MAXSIZE: int = Field(default=1000, description="Capacidad máxima de la cola de webhooks")
+    WEBHOOK_QUEUE_PUT_TIMEOUT: float = Field(default=5.0, description="Segundos de espera para encolar si la cola está llena")
+    WEBHOOK_QUEUE_DRAIN_TIMEOUT: float = Field(default=10.0, description="Segundos para vaciar la cola al apagar el servidor")
+    DISPATCH_MAX_CONCURRENCY: int = Field(default=32, description="Máximo de conversaciones respondiéndose en paralelo")
+    WEBHOOK_JSON_MODE: str = Field(default="pydantic", description="Decodificación del body de POST /webhook: standard, pydantic, orjson o ujson")
+
+    # Rate Limit Configuration (pacing de envíos salientes)
+    RATE_LIMIT_ENABLED: bool = Field(default=True, description="Aplicar el limitador de tasa a los envíos salientes")
+    RATE_LIMIT_GLOBAL_PER_SECOND: float = Field(default=80.0, description="Mensajes por segundo para todo el número de WhatsApp Business")
+    RATE_LIMIT_GLOBAL_BURST: float = Field(default=80.0, description="Ráfaga global de mensajes permitida")
+    RATE_LIMIT_PER_NUMBER_PER_SECOND: float = Field(default=1.0, description="Mensajes por segundo hacia un mismo destinatario")
+    RATE_LIMIT_PER_NUMBER_BURST: float = Field(default=5.0, description="Ráfaga de mensajes permitida hacia un mismo destinatario")
+
+    # Retry / Circuit Breaker Configuration (resiliencia de envíos)
+    RETRY_MAX_ATTEMPTS: int = Field(default=3, description="Intentos totales por envío (1 = sin reintentos)")
+    RETRY_BASE_DELAY: float = Field(default=0.5, description="Espera base en segundos del backoff exponencial")
+    RETRY_MAX_DELAY: float = Field(default=8.0, description="Tope en segundos de la espera entre reintentos")
+    RETRY_MAX_RETRY_AFTER: float = Field(default=30.0, description="Retry-After máximo (segundos) que se acepta esperar")
+    CIRCUIT_FAILURE_THRESHOLD: int = Field(default=5, description="Fallos consecutivos de la Graph API que abren el circuito")
+    CIRCUIT_RESET_TIMEOUT: float = Field(default=30.0, description="Segundos que el circuito permanece abierto antes de probar")
+
+    # Dedupe Configuration (idempotencia por message.id)
+    DEDUPE_BACKEND: str = Field(default="memory", description="Backend de deduplicación: memory, sqlite o redis")
+    DEDUPE_TTL_SECONDS: float = Field(default=86400.0, description="Segundos que un message.id se considera ya procesado")
+    DEDUPE_MAX_ENTRIES: int = Field(default=100000, description="Máximo de ids en memoria (backend memory)")
+    DEDUPE_SQLITE_PATH: str = Field(default="./data/dedupe.sqlite3", description="Archivo SQLite del backend sqlite")
+    REDIS_URL: str = Field(default="redis://localhost:6379/0", description="URL del servidor con protocolo Redis")
+
+    # Conversation Configuration (sesiones del motor de conversación)
+    SESSION_TTL_SECONDS: float = Field(default=1800.0, description="Segundos de inactividad tras los cuales una conversación vuelve a empezar")
+    SESSION_BACKEND: str = Field(default="memory", description="Backend de sesiones: memory, sqlite o redis (usar sqlite o redis con varios workers)")
+    SESSION_MAX_ENTRIES: int = Field(default=10000, description="Máximo de sesiones (memory y sqlite); al superarlo se descartan las menos recientes")
+    SESSION_SQLITE_PATH: str = Field(default="./data/sessions.sqlite3", description="Archivo SQLite del backend sqlite")
+    SESSION_SQLITE_MMAP_BYTES: int = Field(default=67108864, description="Bytes del archivo de sesiones mapeados en memoria (PRAGMA mmap_size)")
+
+    # Knowledge Base Configuration (respuestas con los documentos de KNOWLEDGE_PATH)
+    KNOWLEDGE_ENABLED: bool = Field(default=True, description="Responder las preguntas de texto libre con los documentos de KNOWLEDGE_PATH")
+    KNOWLEDGE_PATH: str = Field(default="./knowledge", description="Directorio de los documentos Markdown que se envían como respuesta (no usar DOCS_PATH: contiene documentación interna)")
+    KNOWLEDGE_INDEX_PATH: str = Field(default="./data/knowledge_index.pkl", description="Archivo del índice invertido guardado (vacío = no guardar)")
+    KNOWLEDGE_CHUNK_CHARS: int = Field(default=800, description="Largo máximo de cada fragmento indexado")
+    KNOWLEDGE_MIN_SCORE: float = Field(default=2.0, description="Puntaje BM25 mínimo para responder con un fragmento")
+    KNOWLEDGE_MAX_ANSWER_CHARS: int = Field(default=1000, description="Largo máximo de la respuesta enviada")
+    KNOWLEDGE_RELOAD_INTERVAL: float = Field(default=30.0, description="Segundos entre revisiones de cambios en KNOWLEDGE_PATH (0 = solo al arrancar)")
+    SEMANTIC_ENABLED: bool = Field(default=False, description="Buscar por similitud (embeddings locales) las preguntas sin respuesta por palabras clave (requiere 'numpy')")
+    SEMANTIC_CACHE_DIR: str = Field(default="./data/semantic", description="Directorio de la matriz de embeddings (.npy) y su manifiesto (vacío = no guardar)")
+    SEMANTIC_DIM: int = Field(default=512, description="Dimensión de los embeddings por hashing de n-gramas")
+    SEMANTIC_MIN_SCORE: float = Field(default=0.3, description="Similitud coseno mínima para responder con un fragmento")
+
+    # Answer Cache Configuration (respuestas a preguntas repetidas)
+    ANSWER_CACHE_ENABLED: bool = Field(default=True, description="Guardar las respuestas por pregunta normalizada y reutilizarlas")
+    ANSWER_CACHE_TTL_SECONDS: float = Field(default=3600.0, description="Segundos de validez de una respuesta guardada")
+    ANSWER_CACHE_MAX_ENTRIES: int = Field(default=1000, description="Respuestas guardadas máximas (LRU)")
+
+    # Intent Configuration (enrutamiento de textos libres a los temas del menú)
+    INTENT_ENABLED: bool = Field(default=True, description="Enrutar los textos libres con una intención clara directo al estado del menú")
+    INTENT_MODEL_ENABLED: bool = Field(default=True, description="Consultar el modelo lineal si el texto no tiene palabras clave de un tema")
+    INTENT_MIN_CONFIDENCE: float = Field(default=0.7, description="Probabilidad mínima del modelo lineal para enrutar")
+
+    # Generation Configuration (respuestas generadas con MODEL_NAME)
+    GENERATION_ENABLED: bool = Field(default=False, description="Generar con el modelo local las respuestas a preguntas sin respuesta en los documentos (requiere 'transformers' y 'torch')")
+    GENERATION_MAX_BATCH: int = Field(default=8, description="Preguntas máximas por pasada del modelo (micro-lote)")
+    GENERATION_BATCH_WINDOW: float = Field(default=0.02, description="Segundos que se espera a que lleguen más preguntas antes de generar")
+    GENERATION_MAX_NEW_TOKENS: int = Field(default=64, description="Tokens máximos por respuesta generada")
+    GENERATION_TIMEOUT: float = Field(default=8.0, description="Segundos máximos de espera de una respuesta; al vencer se envía el menú")
+    GENERATION_MAX_QUEUE: int = Field(default=64, description="Preguntas en espera a partir de las cuales se responde con el menú sin generar")
+    GENERATION_THREADS: int = Field(default=0, description="Hilos de PyTorch para la inferencia (0 = valor por defecto)")
+    GENERATION_LOAD_RETRY_SECONDS: float = Field(default=300.0, description="Segundos tras una carga fallida del modelo durante los cuales se responde con el menú sin reintentarla")
+
+    # Outbox Configuration (persistencia de los envíos salientes)
+    OUTBOX_ENABLED: bool = Field(default=True, description="Registrar los envíos en el outbox durable y reenviar los pendientes")
+    OUTBOX_PATH: str = Field(default="./data/outbox.sqlite3", description="Archivo SQLite del outbox")
+    OUTBOX_BATCH_SIZE: int = Field(default=100, description="Operaciones en buffer que disparan una escritura inmediata")
+    OUTBOX_FLUSH_INTERVAL: float = Field(default=0.05, description="Segundos máximos entre escrituras en lote")
+    OUTBOX_REPLAY_INTERVAL: float = Field(default=30.0, description="Segundos entre pasadas del reenvío de pendientes")
+    OUTBOX_MAX_ATTEMPTS: int = Field(default=10, description="Reenvíos fallidos tras los cuales un mensaje se descarta")
+    OUTBOX_CLAIM_TTL: float = Field(default=120.0, description="Segundos tras los cuales un mensaje reclamado por otro worker se considera abandonado y se reenvía")
+
     class Config:
         model_config = {
         "env_file": ".env",  # Archivo de variables de entorno
@@ -1,16 +1,24 @@
-from fastapi import APIRouter, Request
-from starlette.responses import PlainTextResponse
+import time
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Request
+from starlette.responses import JSONResponse, PlainTextResponse, Response
 from app.schemas.webhook_schema import WebhookPayload, WebhookVerification
 from app.utils.utils import configure_logging
 from app.config_setup.config_settings import get_settings
-from app.services.wa_services import WhatsAppService, handle_webhook_POST_logic
+from app.services.wa_services import WhatsAppService, handle_webhook_POST_logic, get_default_dispatcher
+from app.services.dependencies import get_whatsapp_service, get_job_queue, get_deduplicator, get_conversation_engine, get_signature_verifier, parse_webhook_payload
+from app.services.conversation import ConversationEngine
+from app.services.dedupe import MessageDeduplicator
+from app.services.job_queue import JobQueue, QueueFullError
+from app.services.metrics import CONTENT_TYPE, REGISTRY, WEBHOOK_LATENCY, WEBHOOK_REQUESTS, webhook_type
+from app.services.signature import SignatureVerifier
+from app.utils.http_client import get_pool_stats
 
 
 # Configurar el logger
 logger = configure_logging(__name__)
 
 router = APIRouter()
-whatsapp_service = WhatsAppService()
 settings = get_settings()
 
 @router.get("/", tags=["Home"])
@@ -23,6 +31,76 @@ def read_root():
     }
 
 
+async def collect_stats(
+    wa_service: WhatsAppService,
+    job_queue: JobQueue,
+    deduplicator: MessageDeduplicator,
+    engine: ConversationEngine,
+    verifier: Optional[SignatureVerifier],
+) -> dict:
+    """Estadísticas de los recursos compartidos (pool HTTP, cola, deduplicación, despacho, limitador, reintentos, circuito, outbox, firmas y conversaciones)."""
+    return {
+        "http_pool": get_pool_stats(),
+        "job_queue": job_queue.stats(),
+        "dedupe": deduplicator.stats(),
+        "dispatcher": get_default_dispatcher().stats(),
+        "rate_limiter": wa_service.rate_limiter.stats() if wa_service.rate_limiter else None,
+        "retry": wa_service.retry_policy.stats() if wa_service.retry_policy else None,
+        "circuit_breaker": wa_service.circuit_breaker.stats() if wa_service.circuit_breaker else None,
+        "outbox": await wa_service.outbox.stats() if wa_service.outbox else None,
+        "templates": wa_service.templates.stats(),
+        "signature": verifier.stats() if verifier else None,
+        "conversation": await engine.stats(),
+    }
+
+
+@router.get("/ready", tags=["Home"])
+def read_ready(request: Request):
+    """
+    Readiness para el balanceador / orquestador: 200 cuando el warm-up del arranque terminó,
+    503 mientras tanto (GET / solo indica que el proceso está vivo).
+    """
+    state = request.app.state
+    if not getattr(state, "ready", False):
+        return JSONResponse(status_code=503, content={"status": "warming_up"})
+    seconds = getattr(state, "warmup_seconds", None)
+    return {"status": "ready", "warmup_ms": round(seconds * 1000, 1) if seconds is not None else None}
+
+
+@router.get("/stats", tags=["Stats"])
+async def read_stats(
+    request: Request,
+    wa_service: WhatsAppService = Depends(get_whatsapp_service),
+    job_queue: JobQueue = Depends(get_job_queue),
+    deduplicator: MessageDeduplicator = Depends(get_deduplicator),
+    engine: ConversationEngine = Depends(get_conversation_engine),
+    verifier: Optional[SignatureVerifier] = Depends(get_signature_verifier),
+):
+    """Estadísticas de los recursos compartidos (pool HTTP, cola, deduplicación, despacho, limitador, reintentos, circuito, outbox, firmas, conversaciones y túnel ngrok)."""
+    stats = await collect_stats(wa_service, job_queue, deduplicator, engine, verifier)
+    tunnel = getattr(request.app.state, "ngrok", None)
+    stats["ngrok"] = tunnel.stats() if tunnel is not None else None
+    return stats
+
+
+@router.get("/metrics", tags=["Stats"])
+async def read_metrics(
+    wa_service: WhatsAppService = Depends(get_whatsapp_service),
+    job_queue: JobQueue = Depends(get_job_queue),
+    deduplicator: MessageDeduplicator = Depends(get_deduplicator),
+    engine: ConversationEngine = Depends(get_conversation_engine),
+    verifier: Optional[SignatureVerifier] = Depends(get_signature_verifier),
+):
+    """
+    Métricas en formato de texto de Prometheus: contadores e histogramas del webhook, de los envíos
+    a la Graph API y del lag del event loop, más profundidades de colas y tasas de acierto de /stats.
+    """
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Métricas deshabilitadas (METRICS_ENABLED)")
+    stats = await collect_stats(wa_service, job_queue, deduplicator, engine, verifier)
+    return Response(content=REGISTRY.render(stats), media_type=CONTENT_TYPE)
+
+
 # Validación del webhook: (Meta)
 @router.get("/webhook", tags=["Webhook"])
 async def verify_webhook(request: Request):
@@ -57,17 +135,35 @@ async def verify_webhook(request: Request):
 
 
 @router.post("/webhook", tags=["Webhook"])
-async def webhook_handler(payload: WebhookPayload):
+async def webhook_handler(
+    request: Request,
+    payload: WebhookPayload = Depends(parse_webhook_payload),
+    wa_service: WhatsAppService = Depends(get_whatsapp_service),
+    job_queue: JobQueue = Depends(get_job_queue),
+    deduplicator: MessageDeduplicator = Depends(get_deduplicator),
+    engine: ConversationEngine = Depends(get_conversation_engine),
+):
     """
-    Procesa los mensajes entrantes del webhook de WhatsApp.
-    Solo delega el manejo de la lógica.
+    Recibe los mensajes entrantes del webhook de WhatsApp.
+    Encola el payload para procesarlo en segundo plano y responde a Meta de inmediato,
+    así la latencia de la Graph API no demora la respuesta del webhook.
     """
+    kind = webhook_type(payload)
     try:
-        response = await handle_webhook_POST_logic(payload)
-        return response
-    except ValueError as e:
-        # Manejo de errores específicos desde el servicio
-        logger.error(f"Error en el webhook: {e}")
+        await job_queue.enqueue(handle_webhook_POST_logic, payload, wa_service, deduplicator, None, engine)
+        WEBHOOK_REQUESTS.inc((kind, "accepted"))
+        WEBHOOK_LATENCY.observe(time.perf_counter() - request.state.webhook_started, (kind,))
+        return {
+            "status": "success",
+            "description": "Mensaje recibido y encolado para su procesamiento.",
+        }
+    except QueueFullError as e:
+        # Backpressure: se pide a Meta que reintente más tarde
+        WEBHOOK_REQUESTS.inc((kind, "busy"))
+        logger.warning("Webhook rechazado, cola llena: %s", e)
+        raise HTTPException(status_code=503, detail="Servidor ocupado, reintente más tarde")
     except Exception as e:
-        # Manejo general de errores no esperados
-        logger.error(f"Error inesperado en el webhook: {e}")
\ No newline at end of file
+        # El webhook no quedó encolado: un 500 hace que Meta lo reintente en lugar de darlo por entregado
+        WEBHOOK_REQUESTS.inc((kind, "error"))
+        logger.error("Error al encolar el webhook: %s", e)
+        raise HTTPException(status_code=500, detail="Error al procesar el webhook")
\ No newline at end of file
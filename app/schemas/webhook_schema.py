@@ -5,8 +5,13 @@
 ..........................................................................
 """
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import Callable, List, Optional, Dict, Any, Iterator, Union
 from enum import Enum
+import importlib
+import json
+import logging
+
+logger = logging.getLogger(__name__)
 
 class MessageType(str, Enum):
     """Tipos de mensajes que podemos recibir"""
@@ -25,23 +30,41 @@ class ButtonReply(BaseModel):
     id: str
     title: str
 
+class ListReply(BaseModel):
+    """Estructura para respuestas de listas"""
+    id: str
+    title: str
+    description: Optional[str] = None
+
 class InteractiveMessage(BaseModel):
     """Estructura para mensajes interactivos"""
     type: str
     button_reply: Optional[ButtonReply] = Field(None, alias="button_reply")
+    list_reply: Optional[ListReply] = Field(None, alias="list_reply")
 
 class Message(BaseModel):
     """Estructura principal del mensaje"""
     from_: str = Field(..., alias="from")
     id: str
     timestamp: str
-    type: MessageType
+    # Meta agrega tipos nuevos (audio, sticker, reaction...): los desconocidos se conservan como str
+    type: Union[MessageType, str]
     text: Optional[TextMessage] = None
     interactive: Optional[InteractiveMessage] = None
 
     class Config:
         populate_by_name = True
 
+class Status(BaseModel):
+    """Estado de un mensaje enviado (sent, delivered, read, failed)"""
+    id: str
+    status: str
+    timestamp: Optional[str] = None
+    recipient_id: Optional[str] = None
+    conversation: Optional[Dict[str, Any]] = None
+    pricing: Optional[Dict[str, Any]] = None
+    errors: Optional[List[Dict[str, Any]]] = None
+
 class Metadata(BaseModel):
     """Metadata del mensaje"""
     display_phone_number: str
@@ -50,9 +73,11 @@ class Metadata(BaseModel):
 class Value(BaseModel):
     """Valor del cambio en el webhook"""
     messaging_product: str
-    metadata: Metadata
+    # Las notificaciones de estado pueden llegar sin metadata
+    metadata: Optional[Metadata] = None
     contacts: Optional[List[Dict[str, Any]]] = None
     messages: Optional[List[Message]] = None
+    statuses: Optional[List[Status]] = None
 
 class Change(BaseModel):
     """Estructura de cambios"""
@@ -65,36 +90,43 @@ class Entry(BaseModel):
     changes: List[Change]
 
 class WebhookPayload(BaseModel):
-    """Payload completo del webhook"""
+    """
+    Payload completo del webhook.
+    Se valida una única vez al construirse: entradas, cambios, mensajes y estados
+    quedan tipados y el resto del código trabaja sobre los modelos, sin recorrer diccionarios.
+    """
     object: str = Field(..., description="Objeto del webhook (generalmente 'whatsapp_business_account')")
-    entry: list[Dict[str, Any]] = Field(..., description="Lista de entradas del webhook")
+    entry: List[Entry] = Field(..., description="Lista de entradas del webhook")
 
     def validate_payload(self) -> Optional[str]:
         """
         Valida la estructura del payload.
-        Retorna un mensaje de error si hay problemas, o None si es válido.
+        La estructura ya fue validada por Pydantic; solo resta exigir al menos una entrada.
         """
         if not self.entry:
             raise ValueError("El payload debe contener una lista 'entry'.")
+        return {"success": True}
 
-        # Validar contenido de las entradas
+    def iter_messages(self) -> Iterator[Message]:
+        """Recorre todos los mensajes de todas las entradas y cambios."""
         for entry in self.entry:
-            if 'changes' not in entry or not isinstance(entry['changes'], list):
-                raise ValueError("Cada entrada debe contener una lista 'changes'.")
-            for change in entry['changes']:
-                if not isinstance(change, dict):
-                    raise ValueError("Cada cambio debe ser un diccionario.")
-            if 'value' not in change or not isinstance(change['value'], dict):
-                raise ValueError("Cada cambio debe contener un diccionario 'value'.")
-            if 'messages' in change['value']:
-                if not isinstance(change['value']['messages'], list):
-                    raise ValueError("El campo 'messages' debe ser una lista.")
-                for message in change['value']['messages']:
-                    if not isinstance(message, dict):
-                        raise ValueError("Cada mensaje debe ser un diccionario.")
-        return {"success": True}        
-   
-        
+            for change in entry.changes:
+                if change.value.messages:
+                    yield from change.value.messages
+
+    def iter_statuses(self) -> Iterator[Status]:
+        """Recorre todos los estados de todas las entradas y cambios."""
+        for entry in self.entry:
+            for change in entry.changes:
+                if change.value.statuses:
+                    yield from change.value.statuses
+
+    def get_value_object(self) -> Optional[Value]:
+        """Retorna el 'value' del primer cambio de la primera entrada, si existe."""
+        if self.entry and self.entry[0].changes:
+            return self.entry[0].changes[0].value
+        return None
+
     def get_message_if_exists(self) -> Optional[Message]:
         """
         Verifica si el objeto 'value' es un mensaje y lo retorna.
@@ -106,32 +138,18 @@ class WebhookPayload(BaseModel):
         if value_object and value_object.messages:
             return value_object.messages[0]
         return None
-    
+
     def get_first_message(self) -> Optional[Message]:
         """
         Helper method para obtener el primer mensaje del payload
         Retorna:
-            Optional[Message]: Un objeto Message si el evento es un evento de mensaje, de lo contrario, None.        
+            Optional[Message]: Un objeto Message si el evento es un evento de mensaje, de lo contrario, None.
         """
-        if self.is_message_event():
-            message_data = self.entry[0]['changes'][0]['value']['messages'][0]
-            return Message(**message_data)
-        
-        return None
+        return next(self.iter_messages(), None)
 
     def is_message_event(self) -> bool:
         """Verifica si es un evento de mensaje"""
-        if not self.entry:
-            return False
-        for entry in self.entry:
-            if 'changes' not in entry:
-                continue
-            for change in entry['changes']:
-                if 'value' not in change:
-                    continue
-                if 'messages' in change['value']:
-                    return True
-        return False
+        return self.get_first_message() is not None
 
     def get_message_type(self) -> Optional[MessageType]:
         """
@@ -141,7 +159,7 @@ class WebhookPayload(BaseModel):
         if not message:
             return None
         return message.type
-    
+
     def get_sender_phone_number(self) -> Optional[str]:
         """
         Obtiene el número de teléfono del remitente del primer mensaje.
@@ -149,12 +167,11 @@ class WebhookPayload(BaseModel):
         Returns:
             Optional[str]: Número del remitente o None si no hay mensajes.
         """
-        if self.is_message_event():
-            first_message = self.get_first_message()
-            if first_message:
-                return first_message.from_
+        first_message = self.get_first_message()
+        if first_message:
+            return first_message.from_
         return None
-    
+
 class WebhookVerification(BaseModel):
     """Modelo para la verificación del webhook"""
     mode: str = Field(..., alias="hub.mode")
@@ -162,4 +179,45 @@ class WebhookVerification(BaseModel):
     challenge: str = Field(..., alias="hub.challenge")
 
     class Config:
-        population_by_name = True
\ No newline at end of file
+        population_by_name = True
+
+
+# ---------------------------------------------------------------------------
+# Decodificación del body crudo de POST /webhook
+# ---------------------------------------------------------------------------
+# Modos disponibles (Settings.WEBHOOK_JSON_MODE):
+#   + standard: json.loads de la biblioteca estándar + validación (camino clásico de FastAPI).
+#   + pydantic: model_validate_json directo sobre los bytes (una sola pasada en pydantic-core).
+#   + orjson / ujson: decodificador alternativo + validación, si el paquete está instalado.
+JSON_MODES = ("standard", "pydantic", "orjson", "ujson")
+
+
+def _loads_for(mode: str) -> Optional[Callable[[bytes], Any]]:
+    """Retorna la función loads del modo pedido, o None si el modo es 'pydantic'."""
+    if mode == "pydantic":
+        return None
+    if mode == "standard":
+        return json.loads
+    return importlib.import_module(mode).loads
+
+
+def get_webhook_parser(mode: str = "pydantic") -> Callable[[bytes], WebhookPayload]:
+    """
+    Construye el parser de bytes -> WebhookPayload para el modo indicado.
+    Si el paquete del modo no está instalado se usa 'pydantic'.
+
+    Raises:
+        ValueError: Si el modo no es uno de JSON_MODES.
+        pydantic.ValidationError: (al parsear) si el body no es un WebhookPayload válido.
+    """
+    if mode not in JSON_MODES:
+        raise ValueError(f"Modo de decodificación JSON no válido: {mode}")
+    try:
+        loads = _loads_for(mode)
+    except ImportError:
+        logger.warning("WEBHOOK_JSON_MODE=%s pero el paquete '%s' no está instalado. Se usa 'pydantic'.", mode, mode)
+        loads = None
+    if loads is None:
+        return WebhookPayload.model_validate_json
+    return lambda body: WebhookPayload.model_validate(loads(body))
+
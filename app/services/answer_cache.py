@@ -0,0 +1,127 @@
+'''
+answer_cache.py
+Caché de respuestas a preguntas de texto libre (base de conocimiento y generador).
+    + La clave es la pregunta normalizada: minúsculas (casefold), sin acentos, espacios colapsados
+      y sin signos de puntuación en los extremos ('¿Horarios  de la PILETA?' = 'horarios de la pileta').
+    + LRU con TTL fijo desde que se guarda la respuesta y límite de cantidad.
+    + También se guarda que los documentos no tienen respuesta (None): una pregunta repetida no
+      vuelve a buscarse en el índice.
+    + El motor de conversación la vacía cuando cambian los documentos de KNOWLEDGE_PATH.
+'''
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from app.config_setup.settings import Settings
+from app.utils.utils import configure_logging
+
+
+# Configuración del logger
+logger = configure_logging(__name__)
+
+_PUNCTUATION = "¿?¡!.,;: "
+
+
+def normalize_question(text: str) -> str:
+    """Forma normalizada de una pregunta: casefold, sin acentos y con los espacios colapsados."""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(text.split()).strip(_PUNCTUATION)
+
+
+class CachedAnswer:
+    """
+    Respuesta guardada.
+
+    Args:
+        text (Optional[str]): Texto de la respuesta (None = los documentos no tienen respuesta).
+        generated (bool): Si la generó el modelo (se envía con los botones del estado).
+        expires (float): Instante de vencimiento (time.monotonic).
+    """
+
+    __slots__ = ("text", "generated", "expires")
+
+    def __init__(self, text: Optional[str], generated: bool, expires: float):
+        self.text = text
+        self.generated = generated
+        self.expires = expires
+
+
+class AnswerCache:
+    """
+    Caché LRU + TTL de respuestas por pregunta normalizada.
+
+    Args:
+        ttl (float): Segundos de validez de una respuesta.
+        max_entries (int): Respuestas máximas; al superarlo se descarta la menos usada.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, CachedAnswer]" = OrderedDict()
+        # Métricas
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+        self.invalidations = 0
+
+    def get(self, question: str) -> Optional[CachedAnswer]:
+        """Respuesta vigente para la pregunta, o None si no está en la caché."""
+        key = normalize_question(question)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry.expires <= time.monotonic():
+            del self._entries[key]
+            self.expired += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def set(self, question: str, text: Optional[str], generated: bool = False) -> None:
+        """Guarda la respuesta (o su ausencia, con text=None) de la pregunta."""
+        key = normalize_question(question)
+        if not key:
+            return
+        self._entries[key] = CachedAnswer(text, generated, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evicted += 1
+
+    def clear(self) -> None:
+        """Descarta todas las respuestas (por ejemplo, al cambiar los documentos)."""
+        if self._entries:
+            logger.info("Caché de respuestas invalidada (%d respuestas descartadas).", len(self._entries))
+        self._entries.clear()
+        self.invalidations += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "invalidations": self.invalidations,
+        }
+
+
+def create_answer_cache(settings: Settings) -> Optional[AnswerCache]:
+    """Crea la caché de respuestas; None si ANSWER_CACHE_ENABLED es False."""
+    if not settings.ANSWER_CACHE_ENABLED:
+        return None
+    return AnswerCache(settings.ANSWER_CACHE_TTL_SECONDS, settings.ANSWER_CACHE_MAX_ENTRIES)
@@ -0,0 +1,429 @@
+'''
+conversation.py
+Motor de conversación: máquina de estados declarativa menú -> tema (pileta/tenis/sum) -> sub-opciones.
+    + El grafo se declara como datos (State/Option). Al construirlo se validan los destinos y los
+      límites de WhatsApp (3 botones, títulos de 20 caracteres) y se precalculan las tablas de
+      transición y los botones de cada estado.
+    + Cada mensaje entrante cuesta una lectura y una escritura en el almacén de sesiones y una
+      búsqueda en un diccionario: O(1) sin importar el tamaño del grafo ni la cantidad de usuarios.
+      Un lote del webhook se resuelve con una sola lectura y una sola escritura (handle_batch).
+    + El motor no hace I/O: retorna las respuestas (Reply) y el servicio de WhatsApp las envía.
+    + Un texto libre con una intención clara ('a qué hora abre la pileta') va directo al estado
+      correspondiente (app/services/intents.py), también con una sesión nueva: sin el saludo y el
+      menú de por medio.
+    + Los textos libres que no corresponden a ninguna opción se consultan en la base de
+      conocimiento (app/services/knowledge.py); si no hay respuesta se repite el estado actual.
+    + Las respuestas (de los documentos o generadas) se guardan por pregunta normalizada
+      (app/services/answer_cache.py): una pregunta repetida no se busca ni se genera de nuevo.
+    + Con un generador de respuestas (app/services/generation.py), esa repetición sale como
+      respuesta diferida: al enviarla se genera el texto (complete) y, si no llega a tiempo,
+      se envía tal cual (el menú).
+'''
+import asyncio
+import unicodedata
+from dataclasses import dataclass, replace
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config_setup.settings import Settings
+from app.schemas.webhook_schema import Message, MessageType
+from app.services.answer_cache import AnswerCache, create_answer_cache
+from app.services.generation import AnswerGenerator, create_answer_generator
+from app.services.intents import IntentRouter, create_intent_router
+from app.services.knowledge import KnowledgeBase, create_knowledge_base
+from app.services.sessions import SessionStore, create_session_store
+from app.services.templates import state_template_name
+from app.utils.utils import configure_logging
+
+
+# Configuración del logger
+logger = configure_logging(__name__)
+
+# Límites de los botones de respuesta de WhatsApp
+MAX_BUTTONS = 3
+MAX_BUTTON_TITLE = 20
+
+# Palabras que reinician la conversación desde el menú
+RESET_WORDS = frozenset({"hola", "menu", "inicio", "empezar"})
+
+
+@dataclass(frozen=True)
+class Option:
+    """Botón de un estado: 'id' es el reply.id que devuelve WhatsApp, 'target' el estado destino."""
+    id: str
+    title: str
+    target: str
+
+
+@dataclass(frozen=True)
+class State:
+    """Nodo del grafo: texto a enviar al entrar y opciones (botones) que ofrece."""
+    name: str
+    text: str
+    options: Tuple[Option, ...] = ()
+
+
+@dataclass(frozen=True)
+class Reply:
+    """
+    Respuesta a enviar: un texto simple, o un texto con botones interactivos.
+    'template' nombra la plantilla precompilada del estado (app/services/templates.py), si la hay.
+    Con 'question' la respuesta es diferida: se genera al enviarla (ConversationEngine.complete)
+    para el estado 'state', y el resto de los campos es lo que se envía si la generación falla.
+    """
+    text: str
+    buttons: Optional[List[Dict[str, Any]]] = None
+    template: Optional[str] = None
+    question: Optional[str] = None
+    state: Optional[str] = None
+
+
+def _normalize(text: str) -> str:
+    """Minúsculas, sin acentos ni espacios extremos (para reconocer 'Menú' o ' pileta ')."""
+    text = unicodedata.normalize("NFKD", text.strip().lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def _back(topic: str) -> Tuple[Option, ...]:
+    return (Option(f"{topic}_volver", "Volver", topic), Option("menu", "Menú principal", "menu"))
+
+
+# Grafo por defecto (los textos se editan aquí)
+DEFAULT_STATES: Tuple[State, ...] = (
+    State("menu", "Por favor, elije una opción:", (
+        Option("pileta", "Pileta", "pileta"),
+        Option("tenis", "Tenis", "tenis"),
+        Option("sum", "SUM", "sum"),
+    )),
+    State("pileta", "Pileta: ¿qué necesitás?", (
+        Option("pileta_horarios", "Horarios", "pileta_horarios"),
+        Option("pileta_reservar", "Reservar turno", "pileta_reservar"),
+        Option("menu", "Menú principal", "menu"),
+    )),
+    State("pileta_horarios", "Los horarios de la pileta están publicados en la administración y en la cartelera del club.", _back("pileta")),
+    State("pileta_reservar", "Para reservar un turno de pileta, indicá día y horario y la administración te confirmará.", _back("pileta")),
+    State("tenis", "Tenis: ¿qué necesitás?", (
+        Option("tenis_horarios", "Horarios", "tenis_horarios"),
+        Option("tenis_reservar", "Reservar cancha", "tenis_reservar"),
+        Option("menu", "Menú principal", "menu"),
+    )),
+    State("tenis_horarios", "Las canchas de tenis se pueden usar en los horarios publicados en la administración del club.", _back("tenis")),
+    State("tenis_reservar", "Para reservar una cancha de tenis, indicá día y horario y la administración te confirmará.", _back("tenis")),
+    State("sum", "SUM: ¿qué necesitás?", (
+        Option("sum_reservar", "Reservar SUM", "sum_reservar"),
+        Option("sum_reglamento", "Reglamento", "sum_reglamento"),
+        Option("menu", "Menú principal", "menu"),
+    )),
+    State("sum_reservar", "Para reservar el SUM, indicá la fecha del evento y la administración te confirmará la disponibilidad.", _back("sum")),
+    State("sum_reglamento", "El reglamento de uso del SUM está disponible en la administración del club.", _back("sum")),
+)
+
+
+class ConversationGraph:
+    """
+    Grafo validado y compilado.
+
+    Args:
+        states (Tuple[State, ...]): Estados del grafo.
+        initial (str): Estado al que se llega con una sesión nueva o una palabra de reinicio.
+
+    Raises:
+        ValueError: Si un destino no existe o se exceden los límites de los botones de WhatsApp.
+    """
+
+    def __init__(self, states: Tuple[State, ...], initial: str = "menu"):
+        self.states: Dict[str, State] = {state.name: state for state in states}
+        if initial not in self.states:
+            raise ValueError(f"El estado inicial '{initial}' no existe en el grafo.")
+        self.initial = initial
+        # Tablas precalculadas: transiciones por reply.id y por título/id normalizado, y botones listos para enviar
+        self.transitions: Dict[str, Dict[str, str]] = {}
+        self.text_transitions: Dict[str, Dict[str, str]] = {}
+        self.buttons: Dict[str, List[Dict[str, Any]]] = {}
+        # Destino de cada reply.id en todo el grafo (botones de mensajes anteriores)
+        self.global_transitions: Dict[str, str] = {}
+        for state in states:
+            if len(state.options) > MAX_BUTTONS:
+                raise ValueError(f"El estado '{state.name}' tiene {len(state.options)} opciones (máximo {MAX_BUTTONS}).")
+            for option in state.options:
+                if option.target not in self.states:
+                    raise ValueError(f"La opción '{option.id}' de '{state.name}' apunta a un estado inexistente: '{option.target}'.")
+                if len(option.title) > MAX_BUTTON_TITLE:
+                    raise ValueError(f"El título '{option.title}' supera los {MAX_BUTTON_TITLE} caracteres.")
+                self.global_transitions.setdefault(option.id, option.target)
+            self.transitions[state.name] = {option.id: option.target for option in state.options}
+            self.text_transitions[state.name] = {
+                **{_normalize(option.id): option.target for option in state.options},
+                **{_normalize(option.title): option.target for option in state.options},
+            }
+            self.buttons[state.name] = [
+                {"type": "reply", "reply": {"id": option.id, "title": option.title}} for option in state.options
+            ]
+
+    def render(self, state_name: str, prefix: Optional[str] = None) -> Reply:
+        """Respuesta que presenta un estado (con sus botones, si tiene)."""
+        state = self.states[state_name]
+        buttons = self.buttons[state_name] or None
+        if prefix:
+            return Reply(f"{prefix}\n{state.text}", buttons)
+        return Reply(state.text, buttons, state_template_name(state_name) if buttons else None)
+
+
+DEFAULT_GRAPH = ConversationGraph(DEFAULT_STATES)
+
+
+class ConversationEngine:
+    """
+    Aplica el grafo a los mensajes entrantes y mantiene la sesión de cada usuario.
+
+    Args:
+        graph (ConversationGraph): Grafo compilado.
+        store (SessionStore): Almacén de sesiones (memory, sqlite o redis).
+        knowledge (Optional[KnowledgeBase]): Base de conocimiento para las preguntas de texto libre.
+        generator (Optional[AnswerGenerator]): Generador de respuestas para las preguntas que los documentos no responden.
+        cache (Optional[AnswerCache]): Caché de respuestas por pregunta normalizada.
+        router (Optional[IntentRouter]): Clasificador de intenciones de los textos libres.
+    """
+
+    def __init__(
+        self,
+        graph: ConversationGraph,
+        store: SessionStore,
+        knowledge: Optional[KnowledgeBase] = None,
+        generator: Optional[AnswerGenerator] = None,
+        cache: Optional[AnswerCache] = None,
+        router: Optional[IntentRouter] = None,
+    ):
+        self.graph = graph
+        self.store = store
+        self.knowledge = knowledge
+        self.generator = generator
+        self.cache = cache
+        self.router = router
+        # Métricas
+        self.transitions = 0
+        self.unrecognized = 0
+        self.answered = 0
+        self.generated = 0
+        self.routed = 0
+
+    def _next_state(self, current: str, message: Message) -> Optional[str]:
+        """Estado destino para el mensaje, o None si no se reconoce la entrada."""
+        graph = self.graph
+        if message.type == MessageType.INTERACTIVE and message.interactive is not None:
+            reply = message.interactive.button_reply or message.interactive.list_reply
+            if reply is None:
+                return None
+            return graph.transitions[current].get(reply.id) or graph.global_transitions.get(reply.id)
+        if message.type == MessageType.TEXT and message.text is not None:
+            text = _normalize(message.text.body)
+            if text in RESET_WORDS:
+                return graph.initial
+            return graph.text_transitions[current].get(text)
+        return None
+
+    @staticmethod
+    def _question(message: Message) -> Optional[str]:
+        """Texto libre del mensaje (None si no es texto o es una palabra de reinicio)."""
+        if message.type != MessageType.TEXT or message.text is None:
+            return None
+        if _normalize(message.text.body) in RESET_WORDS:
+            return None
+        return message.text.body
+
+    def _route(self, message: Message, current: Optional[str]) -> Optional[str]:
+        """Estado destino según la intención del texto libre (None si no hay clasificador o no es clara)."""
+        question = self._question(message) if self.router is not None else None
+        if question is None:
+            return None
+        intent = self.router.classify(question, current)
+        if intent is None or intent.target not in self.graph.states:
+            return None
+        self.routed += 1
+        logger.debug("Intención de %s: %s (%s, %.2f)", message.from_, intent.target, intent.source, intent.confidence)
+        return intent.target
+
+    def _answer(self, message: Message, state: str) -> Optional[List[Reply]]:
+        """
+        Respuestas para un texto libre en 'state': de la caché o de la base de conocimiento,
+        seguidas del estado. None si no hay respuesta o el mensaje no es una pregunta.
+        """
+        if self.knowledge is None and self.cache is None:
+            return None
+        question = self._question(message)
+        if question is None:
+            return None
+        cached = self.cache.get(question) if self.cache is not None else None
+        if cached is not None:
+            if cached.text is None:
+                return None
+            self.answered += 1
+            if cached.generated:
+                return [self.graph.render(state, prefix=cached.text)]
+            return [Reply(cached.text), self.graph.render(state)]
+        if self.knowledge is None:
+            return None
+        answer = self.knowledge.answer(question)
+        if self.cache is not None:
+            self.cache.set(question, answer)
+        if answer is None:
+            return None
+        self.answered += 1
+        return [Reply(answer), self.graph.render(state)]
+
+    def _deferred(self, message: Message, state: str, fallback: Reply) -> Reply:
+        """'fallback' como respuesta diferida si hay generador y el mensaje es una pregunta."""
+        question = self._question(message) if self.generator is not None else None
+        if question is None:
+            return fallback
+        return replace(fallback, question=question, state=state)
+
+    async def complete(self, reply: Reply) -> Reply:
+        """
+        Resuelve una respuesta diferida: genera el texto y lo envía con los botones del estado.
+        Si la generación vence o falla se envía la respuesta tal cual (el menú).
+        """
+        if reply.question is None or self.generator is None or reply.state is None:
+            return reply
+        cached = self.cache.get(reply.question) if self.cache is not None else None
+        if cached is not None and cached.generated and cached.text:
+            # Otra conversación generó la misma pregunta mientras esta esperaba
+            return self.graph.render(reply.state, prefix=cached.text)
+        context = self.knowledge.context(reply.question) if self.knowledge is not None else ""
+        text = await self.generator.generate(reply.question, context)
+        if not text:
+            return replace(reply, question=None, state=None)
+        self.generated += 1
+        if self.cache is not None:
+            self.cache.set(reply.question, text, generated=True)
+        return self.graph.render(reply.state, prefix=text)
+
+    def step(self, state: Optional[str], message: Message) -> Tuple[Optional[str], List[Reply]]:
+        """
+        Transición pura (sin I/O) desde 'state' (None = sin sesión) con un mensaje.
+        Una sesión nueva (o vencida) recibe el saludo y el menú, como el bot sin estado.
+        Un texto libre no reconocido recibe la respuesta de la base de conocimiento (si la hay)
+        seguida del estado actual.
+
+        Returns:
+            Tuple[Optional[str], List[Reply]]: Estado a guardar (None = no se escribe) y respuestas, en orden.
+        """
+        if message.type not in (MessageType.TEXT, MessageType.INTERACTIVE):
+            return None, []
+        graph = self.graph
+        if state is None or state not in graph.states:
+            # Un botón de un mensaje anterior sigue siendo válido aunque la sesión haya vencido
+            target = self._next_state(graph.initial, message) if message.type == MessageType.INTERACTIVE else None
+            if target is not None:
+                self.transitions += 1
+                return target, [graph.render(target)]
+            # Intención clara: el saludo viaja en el mismo mensaje que el estado pedido
+            target = self._route(message, None)
+            if target is not None:
+                self.transitions += 1
+                return target, [graph.render(target, prefix="Hola!")]
+            answers = self._answer(message, graph.initial)
+            if answers:
+                return graph.initial, [Reply("Hola!"), *answers]
+            return graph.initial, [Reply("Hola!"), self._deferred(message, graph.initial, graph.render(graph.initial))]
+
+        target = self._next_state(state, message) or self._route(message, state)
+        if target is None:
+            answers = self._answer(message, state)
+            if answers:
+                return state, answers
+            # Entrada no reconocida: se repite el estado actual (y se renueva el TTL)
+            self.unrecognized += 1
+            return state, [self._deferred(message, state, graph.render(state, prefix="No entendí tu respuesta."))]
+
+        self.transitions += 1
+        logger.debug("Conversación con %s: %s -> %s", message.from_, state, target)
+        return target, [graph.render(target)]
+
+    async def handle(self, message: Message) -> List[Reply]:
+        """Procesa un mensaje: una lectura y (si corresponde) una escritura en el almacén de sesiones."""
+        session = await self.store.get(message.from_)
+        state, replies = self.step(session.state if session else None, message)
+        if state is not None:
+            await self.store.set(message.from_, state)
+        return replies
+
+    async def handle_batch(self, conversations: Dict[str, List[Message]]) -> Dict[str, List[Reply]]:
+        """
+        Procesa un lote agrupado por usuario con una sola lectura (get_many) y una sola
+        escritura (set_many, en pipeline o transacción según el backend) para todo el lote.
+
+        Returns:
+            Dict[str, List[Reply]]: Respuestas de cada usuario, en orden.
+        """
+        sessions = await self.store.get_many(conversations)
+        updates: Dict[str, str] = {}
+        replies: Dict[str, List[Reply]] = {}
+        for user, messages in conversations.items():
+            session = sessions.get(user)
+            state = session.state if session else None
+            user_replies: List[Reply] = []
+            for message in messages:
+                new_state, message_replies = self.step(state, message)
+                user_replies.extend(message_replies)
+                if new_state is not None:
+                    state = updates[user] = new_state
+            replies[user] = user_replies
+        await self.store.set_many(updates)
+        return replies
+
+    async def warm_up(self, sample: str = "hola, cuales son los horarios?") -> None:
+        """
+        Ejercita una vez los caminos del primer mensaje sin tocar sesiones ni la caché de respuestas:
+        render de todos los estados, clasificación de intención, búsqueda en la base de
+        conocimiento y carga del modelo de generación (en un hilo, puede tardar segundos).
+        """
+        for state in self.graph.states:
+            self.graph.render(state)
+        if self.router is not None:
+            self.router.classify(sample, None)
+        if self.knowledge is not None:
+            self.knowledge.search(sample)
+        if self.generator is not None:
+            try:
+                await asyncio.to_thread(self.generator.load)
+            except Exception as e:
+                logger.error("No se pudo cargar el modelo de generación en el warm-up: %s", e)
+
+    async def stats(self) -> Dict[str, Any]:
+        return {
+            "states": len(self.graph.states),
+            "transitions": self.transitions,
+            "unrecognized": self.unrecognized,
+            "answered": self.answered,
+            "generated": self.generated,
+            "routed": self.routed,
+            "sessions": await self.store.stats(),
+            "knowledge": self.knowledge.stats() if self.knowledge is not None else None,
+            "generation": self.generator.stats() if self.generator is not None else None,
+            "answer_cache": self.cache.stats() if self.cache is not None else None,
+            "intents": self.router.stats() if self.router is not None else None,
+        }
+
+    def start(self) -> None:
+        """Inicia la revisión de los documentos en segundo plano; cada reconstrucción vacía la caché de respuestas."""
+        if self.knowledge is not None:
+            self.knowledge.start(self.cache.clear if self.cache is not None else None)
+
+    async def close(self) -> None:
+        if self.knowledge is not None:
+            await self.knowledge.stop()
+        if self.generator is not None:
+            await asyncio.to_thread(self.generator.close)
+        await self.store.close()
+
+
+def create_conversation_engine(settings: Settings) -> ConversationEngine:
+    """Construye el motor de conversación con el grafo por defecto y el almacén de sesiones, la base de conocimiento y el generador de los Settings."""
+    return ConversationEngine(
+        DEFAULT_GRAPH,
+        create_session_store(settings),
+        create_knowledge_base(settings),
+        create_answer_generator(settings),
+        create_answer_cache(settings),
+        create_intent_router(settings, DEFAULT_GRAPH.states),
+    )
@@ -0,0 +1,220 @@
+'''
+dedupe.py
+Capa de idempotencia para el webhook: registra los 'message.id' ya procesados.
+Meta reenvía el mismo webhook si no recibe respuesta a tiempo; con esta capa un duplicado
+cuesta una sola consulta y ningún envío saliente.
+Backends disponibles:
+    + memory: LRU en memoria con TTL y límite de entradas (un solo proceso).
+    + sqlite: archivo local en modo WAL, compartido entre workers de la misma máquina.
+      Las consultas corren en un hilo (asyncio.to_thread) para no bloquear el event loop.
+    + redis: servidor con protocolo Redis (SET NX EX), compartido entre máquinas. Requiere 'redis'.
+'''
+import asyncio
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from app.config_setup.settings import Settings
+from app.utils.utils import configure_logging
+
+
+# Configuración del logger
+logger = configure_logging(__name__)
+
+
+class MemoryDedupeBackend:
+    """
+    LRU en memoria con TTL. Al superar 'max_entries' se descartan los ids más antiguos.
+
+    Args:
+        ttl (float): Segundos que un id se considera visto.
+        max_entries (int): Cantidad máxima de ids almacenados (límite de memoria).
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._seen: "OrderedDict[str, float]" = OrderedDict()
+
+    async def check_and_add(self, key: str) -> bool:
+        """Retorna True si 'key' ya fue vista y sigue vigente; si no, la registra y retorna False."""
+        now = time.monotonic()
+        expires = self._seen.get(key)
+        if expires is not None and expires > now:
+            self._seen.move_to_end(key)
+            return True
+        self._seen[key] = now + self.ttl
+        self._seen.move_to_end(key)
+        while len(self._seen) > self.max_entries:
+            self._seen.popitem(last=False)
+        return False
+
+    def entries(self) -> Optional[int]:
+        return len(self._seen)
+
+    async def close(self) -> None:
+        self._seen.clear()
+
+
+class SQLiteDedupeBackend:
+    """
+    Tabla SQLite (WAL) con los ids vistos y su vencimiento.
+    Varios procesos uvicorn de la misma máquina pueden compartir el archivo.
+    Las consultas corren en un hilo (asyncio.to_thread), de a una por conexión, para que la espera
+    de un lock de escritura de otro worker no bloquee el event loop.
+
+    Args:
+        path (str): Ruta del archivo SQLite.
+        ttl (float): Segundos que un id se considera visto.
+        purge_every (int): Cada cuántas inserciones se borran los ids vencidos y se recuenta la tabla.
+    """
+
+    def __init__(self, path: str, ttl: float, purge_every: int = 1000):
+        self.ttl = ttl
+        self.purge_every = purge_every
+        self._inserts = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS seen_messages (id TEXT PRIMARY KEY, expires REAL NOT NULL)"
+        )
+        self._db_lock = asyncio.Lock()
+        # Cantidad aproximada: se suma por inserción propia y se recuenta en cada purga
+        self._entries = self._count()
+
+    async def _run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        async with self._db_lock:
+            return await asyncio.to_thread(fn, *args)
+
+    def _upsert(self, key: str, now: float) -> bool:
+        cursor = self._conn.execute(
+            "INSERT INTO seen_messages (id, expires) VALUES (?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET expires = excluded.expires WHERE seen_messages.expires <= ?",
+            (key, now + self.ttl, now),
+        )
+        return cursor.rowcount > 0
+
+    def _purge(self, now: float) -> int:
+        self._conn.execute("DELETE FROM seen_messages WHERE expires <= ?", (now,))
+        return self._count()
+
+    def _count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM seen_messages").fetchone()[0]
+
+    async def check_and_add(self, key: str) -> bool:
+        """Un único UPSERT: inserta el id o renueva uno vencido. Si no cambia ninguna fila, es duplicado."""
+        now = time.time()
+        if not await self._run(self._upsert, key, now):
+            return True
+        self._inserts += 1
+        self._entries += 1
+        if self._inserts % self.purge_every == 0:
+            self._entries = await self._run(self._purge, now)
+        return False
+
+    def entries(self) -> Optional[int]:
+        return self._entries
+
+    async def close(self) -> None:
+        async with self._db_lock:
+            await asyncio.to_thread(self._conn.close)
+
+
+class RedisDedupeBackend:
+    """
+    Servidor con protocolo Redis: 'SET key 1 NX EX ttl' registra y consulta en un solo comando.
+
+    Args:
+        url (str): URL del servidor (redis://host:port/db).
+        ttl (float): Segundos que un id se considera visto.
+        prefix (str): Prefijo de las claves.
+        client: Cliente redis.asyncio ya creado (por ejemplo fakeredis.aioredis.FakeRedis() en pruebas).
+    """
+
+    def __init__(self, url: str, ttl: float, prefix: str = "wa:dedupe:", client: Any = None):
+        if client is None:
+            try:
+                import redis.asyncio as redis_asyncio
+            except ImportError as e:
+                raise RuntimeError("DEDUPE_BACKEND=redis requiere el paquete 'redis' (pip install redis).") from e
+            client = redis_asyncio.from_url(url)
+        self.ttl = int(ttl)
+        self.prefix = prefix
+        self._redis = client
+
+    async def check_and_add(self, key: str) -> bool:
+        created = await self._redis.set(f"{self.prefix}{key}", 1, nx=True, ex=self.ttl)
+        return not created
+
+    def entries(self) -> Optional[int]:
+        return None  # No se cuenta para no recorrer el keyspace
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+
+class MessageDeduplicator:
+    """
+    Fachada sobre el backend elegido con contadores de aciertos (duplicados) y fallos (nuevos).
+    """
+
+    def __init__(self, backend: Any):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    async def is_duplicate(self, message_id: Optional[str]) -> bool:
+        """
+        Retorna True si el mensaje ya fue procesado. Si el backend falla se procesa igual
+        (preferimos un envío repetido antes que perder una respuesta).
+        """
+        if not message_id:
+            return False
+        try:
+            duplicate = await self.backend.check_and_add(message_id)
+        except Exception as e:
+            self.errors += 1
+            logger.error("Error en el backend de deduplicación: %s", e)
+            return False
+        if duplicate:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return duplicate
+
+    async def close(self) -> None:
+        await self.backend.close()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "entries": self.backend.entries(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+def create_deduplicator(settings: Settings) -> MessageDeduplicator:
+    """Construye el deduplicador según DEDUPE_BACKEND ('memory', 'sqlite' o 'redis')."""
+    backend_name = settings.DEDUPE_BACKEND.lower()
+    match backend_name:
+        case "memory":
+            backend = MemoryDedupeBackend(settings.DEDUPE_TTL_SECONDS, settings.DEDUPE_MAX_ENTRIES)
+        case "sqlite":
+            backend = SQLiteDedupeBackend(settings.DEDUPE_SQLITE_PATH, settings.DEDUPE_TTL_SECONDS)
+        case "redis":
+            backend = RedisDedupeBackend(settings.REDIS_URL, settings.DEDUPE_TTL_SECONDS)
+        case _:
+            raise ValueError(f"DEDUPE_BACKEND no válido: {settings.DEDUPE_BACKEND}")
+    logger.info("Deduplicación de mensajes con backend: %s", backend_name)
+    return MessageDeduplicator(backend)
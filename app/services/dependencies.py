@@ -0,0 +1,210 @@
+'''
+dependencies.py
+Proveedores de dependencias de FastAPI con alcance de aplicación.
+Los recursos se crean una sola vez en el lifespan (main.py), se guardan en app.state
+y los handlers los reciben inyectados con Depends(...).
+En pruebas se reemplazan con app.dependency_overrides[get_whatsapp_service] = lambda: fake.
+'''
+import asyncio
+import time
+from typing import Optional
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
+from app.config_setup.config_settings import get_settings
+from app.services.conversation import ConversationEngine, create_conversation_engine
+from app.services.dedupe import MessageDeduplicator, create_deduplicator
+from app.services.job_queue import JobQueue
+from app.services.metrics import WEBHOOK_REQUESTS
+from app.services.outbox import MessageOutbox, create_outbox
+from app.services.rate_limiter import create_rate_limiter
+from app.services.resilience import create_circuit_breaker, create_retry_policy
+from app.services.signature import SIGNATURE_HEADER, SignatureVerifier, create_signature_verifier
+from app.services.wa_services import WhatsAppService
+from app.schemas.webhook_schema import WebhookPayload, get_webhook_parser
+from app.utils.http_client import get_http_client
+from app.utils.utils import configure_logging
+
+
+# Configuración del logger
+logger = configure_logging(__name__)
+
+
+def create_whatsapp_service(app: FastAPI) -> WhatsAppService:
+    """
+    Crea el servicio de WhatsApp de la aplicación y lo registra en app.state.
+    Headers, URL base, cliente HTTP, limitador de tasa, reintentos y circuito se resuelven una única vez para todo el proceso.
+    """
+    client = getattr(app.state, "http_client", None) or get_http_client()
+    settings = get_settings()
+    app.state.whatsapp_service = WhatsAppService(
+        client=client,
+        rate_limiter=create_rate_limiter(settings),
+        retry_policy=create_retry_policy(settings),
+        circuit_breaker=create_circuit_breaker(settings),
+    )
+    logger.info("WhatsAppService de la aplicación creado.")
+    return app.state.whatsapp_service
+
+
+def get_whatsapp_service(request: Request) -> WhatsAppService:
+    """
+    Dependencia de FastAPI: retorna la instancia única de WhatsAppService.
+    Si la app no pasó por el lifespan (por ejemplo un TestClient sin 'with'), la crea bajo demanda.
+    """
+    return get_whatsapp_service_for(request.app)
+
+
+def get_whatsapp_service_for(app: FastAPI) -> WhatsAppService:
+    """Retorna el WhatsAppService registrado en app.state, creándolo si todavía no existe."""
+    service = getattr(app.state, "whatsapp_service", None)
+    if service is None:
+        service = create_whatsapp_service(app)
+    return service
+
+
+async def create_job_queue(app: FastAPI) -> JobQueue:
+    """Crea e inicia la cola de trabajos del webhook y la registra en app.state."""
+    settings = get_settings()
+    queue = JobQueue(
+        workers=settings.WEBHOOK_QUEUE_WORKERS,
+        maxsize=settings.WEBHOOK_QUEUE_MAXSIZE,
+        put_timeout=settings.WEBHOOK_QUEUE_PUT_TIMEOUT,
+    )
+    await queue.start()
+    app.state.job_queue = queue
+    return queue
+
+
+async def get_job_queue(request: Request) -> JobQueue:
+    """
+    Dependencia de FastAPI: retorna la cola de trabajos del webhook.
+    Si la app no pasó por el lifespan, la crea e inicia bajo demanda.
+    """
+    queue = getattr(request.app.state, "job_queue", None)
+    if queue is None:
+        queue = await create_job_queue(request.app)
+    return queue
+
+
+async def start_outbox(app: FastAPI) -> Optional[MessageOutbox]:
+    """
+    Crea e inicia el outbox durable, lo conecta al WhatsAppService de la aplicación y lo registra en app.state.
+    Al iniciar, el worker de replay reenvía los mensajes que quedaron pendientes de una ejecución anterior.
+    """
+    service = get_whatsapp_service_for(app)
+    outbox = create_outbox(get_settings())
+    if outbox is not None:
+        await outbox.start(service.deliver)
+        service.outbox = outbox
+    app.state.outbox = outbox
+    return outbox
+
+
+def get_deduplicator(request: Request) -> MessageDeduplicator:
+    """
+    Dependencia de FastAPI: retorna el deduplicador de mensajes de la aplicación.
+    Si la app no pasó por el lifespan, lo crea bajo demanda.
+    """
+    deduplicator = getattr(request.app.state, "deduplicator", None)
+    if deduplicator is None:
+        deduplicator = request.app.state.deduplicator = create_deduplicator(get_settings())
+    return deduplicator
+
+
+def get_conversation_engine(request: Request) -> ConversationEngine:
+    """
+    Dependencia de FastAPI: retorna el motor de conversación (grafo + sesiones) de la aplicación.
+    Si la app no pasó por el lifespan, lo crea bajo demanda.
+    """
+    engine = getattr(request.app.state, "conversation_engine", None)
+    if engine is None:
+        engine = request.app.state.conversation_engine = create_conversation_engine(get_settings())
+        engine.start()
+    return engine
+
+
+def get_signature_verifier(request: Request) -> Optional[SignatureVerifier]:
+    """
+    Dependencia de FastAPI: retorna el verificador de firmas de los webhooks (None si APP_SECRET no está configurado).
+    Si la app no pasó por el lifespan, lo crea bajo demanda.
+    """
+    state = request.app.state
+    if not hasattr(state, "signature_verifier"):
+        state.signature_verifier = create_signature_verifier(get_settings())
+    return state.signature_verifier
+
+
+# Webhook de ejemplo para el warm-up del parser (un texto libre, el caso más costoso del motor)
+WARMUP_WEBHOOK = (
+    b'{"object":"whatsapp_business_account","entry":[{"id":"0","changes":[{"field":"messages",'
+    b'"value":{"messaging_product":"whatsapp","metadata":{"display_phone_number":"0","phone_number_id":"0"},'
+    b'"messages":[{"from":"0","id":"wamid.warmup","timestamp":"0","type":"text","text":{"body":"hola"}}]}}]}]}'
+)
+
+
+async def warm_up(app: FastAPI) -> None:
+    """
+    Calienta los caminos del primer webhook para que no los pague un usuario: parser del body,
+    grafo, intenciones, base de conocimiento y modelo de generación (ConversationEngine.warm_up).
+    Al terminar marca app.state.ready (GET /ready pasa de 503 a 200).
+    """
+    started = time.perf_counter()
+    try:
+        parser = app.state.webhook_parser = get_webhook_parser(get_settings().WEBHOOK_JSON_MODE)
+        parser(WARMUP_WEBHOOK)
+        engine = getattr(app.state, "conversation_engine", None)
+        if engine is not None:
+            await engine.warm_up()
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error("Error en el warm-up (el servidor queda listo igual): %s", e)
+    app.state.warmup_seconds = time.perf_counter() - started
+    app.state.ready = True
+    logger.info("Warm-up completo en %.0f ms: servidor listo.", app.state.warmup_seconds * 1000)
+
+
+def start_warm_up(app: FastAPI) -> Optional[asyncio.Task]:
+    """
+    Lanza el warm-up en segundo plano (el servidor ya acepta requests; /ready indica cuándo terminó).
+    Con WARMUP_ENABLED=False la app queda lista de inmediato y retorna None.
+    """
+    app.state.warmup_seconds = None
+    if not get_settings().WARMUP_ENABLED:
+        app.state.ready = True
+        return None
+    app.state.ready = False
+    return asyncio.create_task(warm_up(app), name="warm-up")
+
+
+async def parse_webhook_payload(request: Request, verifier: Optional[SignatureVerifier] = Depends(get_signature_verifier)) -> WebhookPayload:
+    """
+    Dependencia de FastAPI: lee el body crudo una sola vez, verifica la firma X-Hub-Signature-256
+    sobre esos bytes y lo valida directamente en WebhookPayload con el decodificador de WEBHOOK_JSON_MODE.
+    Una firma inválida responde 403 sin decodificar el body; un body inválido responde 422,
+    igual que la validación automática de FastAPI.
+    """
+    parser = getattr(request.app.state, "webhook_parser", None)
+    if parser is None:
+        parser = request.app.state.webhook_parser = get_webhook_parser(get_settings().WEBHOOK_JSON_MODE)
+    # Inicio de la medición de latencia del webhook (whatsapp_webhook_latency_seconds)
+    request.state.webhook_started = time.perf_counter()
+    body = await request.body()
+    if verifier is not None and not verifier.verify(body, request.headers.get(SIGNATURE_HEADER)):
+        logger.debug("Webhook rechazado: firma %s inválida o ausente.", SIGNATURE_HEADER)
+        WEBHOOK_REQUESTS.inc(("unknown", "forbidden"))
+        raise HTTPException(status_code=403, detail="Firma del webhook inválida")
+    try:
+        return parser(body)
+    except ValidationError as e:
+        WEBHOOK_REQUESTS.inc(("unknown", "invalid"))
+        errors = [{**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)]
+        raise RequestValidationError(errors, body=body)
+    except ValueError as e:
+        WEBHOOK_REQUESTS.inc(("unknown", "invalid"))
+        # JSON mal formado en los decodificadores alternativos (orjson/ujson/json)
+        raise RequestValidationError(
+            [{"type": "json_invalid", "loc": ("body",), "msg": f"JSON decode error: {e}", "input": {}}],
+            body=body,
+        )
@@ -0,0 +1,164 @@
+'''
+dispatcher.py
+Despachador concurrente de respuestas salientes.
+Un webhook de Meta puede traer varias entradas, cambios y mensajes. El despachador agrupa el
+trabajo por destinatario (conversación) y procesa conversaciones distintas en paralelo,
+bajo un límite global de concurrencia, manteniendo el orden dentro de cada conversación
+(por ejemplo, el saludo siempre llega antes que los botones del menú).
+Así la latencia de un lote crece con la conversación más lenta y no con la cantidad de mensajes.
+'''
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Sequence
+
+from app.utils.utils import configure_logging
+
+
+# Configuración del logger
+logger = configure_logging(__name__)
+
+
+class ReplyDispatcher:
+    """
+    Ejecuta el trabajo de cada conversación en orden y las conversaciones entre sí en paralelo.
+
+    Args:
+        max_concurrency (int): Máximo de conversaciones procesándose a la vez en todo el proceso.
+    """
+
+    def __init__(self, max_concurrency: int = 32):
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        # Un lock por destinatario: ordena también lotes distintos del mismo usuario
+        # que los workers de la cola procesen a la vez. Se eliminan al quedar libres.
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._waiters: Dict[str, int] = {}
+        # Métricas
+        self.active = 0
+        self.batches = 0
+        self.conversations = 0
+        self.failed = 0
+
+    async def _acquire(self, recipient: str) -> None:
+        """Toma el lock del destinatario (lo crea si no existe)."""
+        lock = self._locks.setdefault(recipient, asyncio.Lock())
+        self._waiters[recipient] = self._waiters.get(recipient, 0) + 1
+        try:
+            await lock.acquire()
+        except BaseException:
+            self._release(recipient, locked=False)
+            raise
+
+    def _release(self, recipient: str, locked: bool = True) -> None:
+        """Libera el lock del destinatario y lo elimina si nadie más lo espera."""
+        if locked:
+            self._locks[recipient].release()
+        self._waiters[recipient] -= 1
+        if not self._waiters[recipient]:
+            del self._waiters[recipient]
+            del self._locks[recipient]
+
+    async def _send_conversation(self, items: Sequence[Any], handler: Callable[[Any], Awaitable[Any]]) -> None:
+        """Procesa en orden los ítems de un destinatario (con su lock ya tomado). Si uno falla, no se envían los siguientes."""
+        async with self._semaphore:
+            self.active += 1
+            try:
+                for item in items:
+                    await handler(item)
+            finally:
+                self.active -= 1
+
+    async def _run_conversation(self, recipient: str, items: Sequence[Any], handler: Callable[[Any], Awaitable[Any]]) -> None:
+        await self._acquire(recipient)
+        try:
+            await self._send_conversation(items, handler)
+        finally:
+            self._release(recipient)
+
+    async def _finish_conversation(self, recipient: str, items: Sequence[Any], handler: Callable[[Any], Awaitable[Any]]) -> None:
+        try:
+            if items:
+                await self._send_conversation(items, handler)
+        finally:
+            self._release(recipient)
+
+    async def dispatch(self, conversations: Dict[str, List[Any]], handler: Callable[[Any], Awaitable[Any]]) -> int:
+        """
+        Despacha un lote agrupado por destinatario.
+
+        Args:
+            conversations (Dict[str, List[Any]]): Ítems de cada destinatario, en orden de llegada.
+            handler (Callable): Corrutina que procesa un ítem.
+
+        Returns:
+            int: Cantidad de conversaciones que fallaron.
+        """
+        if not conversations:
+            return 0
+        self.batches += 1
+        self.conversations += len(conversations)
+        recipients = list(conversations)
+        results = await asyncio.gather(
+            *(self._run_conversation(r, conversations[r], handler) for r in recipients),
+            return_exceptions=True,
+        )
+        return self._count_failures(recipients, results)
+
+    async def dispatch_batch(
+        self,
+        batch: Dict[str, Any],
+        resolve: Callable[[Dict[str, Any]], Awaitable[Dict[str, List[Any]]]],
+        handler: Callable[[Any], Awaitable[Any]],
+    ) -> int:
+        """
+        Como dispatch, pero los ítems de cada destinatario los calcula 'resolve' para todo el lote
+        con los locks de sus destinatarios ya tomados. El lock de cada uno se libera al terminar
+        sus envíos: la lectura y escritura del estado y los envíos son una sola sección crítica,
+        así dos lotes del mismo usuario (en workers distintos de la cola) no parten de la misma
+        sesión ni intercalan sus respuestas. Los locks se toman en orden para no bloquearse entre lotes.
+
+        Args:
+            batch (Dict[str, Any]): Entrada de cada destinatario (por ejemplo, sus mensajes).
+            resolve (Callable): Corrutina que recibe 'batch' y retorna los ítems de cada destinatario.
+            handler (Callable): Corrutina que procesa un ítem.
+
+        Returns:
+            int: Cantidad de conversaciones que fallaron.
+        """
+        if not batch:
+            return 0
+        recipients = sorted(batch)
+        acquired: List[str] = []
+        try:
+            for recipient in recipients:
+                await self._acquire(recipient)
+                acquired.append(recipient)
+            conversations = await resolve(batch)
+        except BaseException:
+            for recipient in acquired:
+                self._release(recipient)
+            raise
+        self.batches += 1
+        self.conversations += sum(1 for items in conversations.values() if items)
+        results = await asyncio.gather(
+            *(self._finish_conversation(r, conversations.get(r) or (), handler) for r in recipients),
+            return_exceptions=True,
+        )
+        return self._count_failures(recipients, results)
+
+    def _count_failures(self, recipients: List[str], results: List[Any]) -> int:
+        failed = 0
+        for recipient, result in zip(recipients, results):
+            if isinstance(result, BaseException):
+                failed += 1
+                logger.error("Error al responder la conversación con %s: %s", recipient, result)
+        self.failed += failed
+        return failed
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "active": self.active,
+            "batches": self.batches,
+            "conversations": self.conversations,
+            "failed": self.failed,
+        }
@@ -0,0 +1,335 @@
+'''
+generation.py
+Generación local de respuestas con un modelo de lenguaje (MODEL_NAME, por defecto google/flan-t5-small).
+    + El modelo se carga recién con la primera pregunta (no demora el arranque), desde
+      MODELS_PATH/<MODEL_NAME> si existe o descargándolo a MODELS_PATH con HUGGINGFACE_TOKEN.
+    + La inferencia corre en CPU en un hilo dedicado: el event loop solo encola la pregunta y espera
+      un future. PyTorch libera el GIL mientras calcula, así que el loop sigue atendiendo webhooks.
+    + Las preguntas que llegan juntas (distintas conversaciones despachadas en paralelo) se agrupan
+      en micro-lotes: el hilo espera hasta GENERATION_BATCH_WINDOW segundos o GENERATION_MAX_BATCH
+      preguntas y genera todas en una sola pasada del modelo.
+    + Si la respuesta no llega en GENERATION_TIMEOUT segundos (o la cola está llena) se retorna None
+      y el motor de conversación envía el menú.
+    + Si el modelo no se puede cargar (falta 'transformers' o la descarga falla), durante
+      GENERATION_LOAD_RETRY_SECONDS las preguntas reciben None sin encolarse ni reintentar la carga.
+Requiere 'transformers' y 'torch'.
+'''
+import asyncio
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Protocol, Tuple
+
+from app.config_setup.settings import Settings
+from app.utils.utils import configure_logging
+
+
+# Configuración del logger
+logger = configure_logging(__name__)
+
+PROMPT = (
+    "Respondé en español, en una o dos oraciones, la pregunta de un socio del club.\n"
+    "Información: {context}\n"
+    "Pregunta: {question}"
+)
+
+
+class TextModel(Protocol):
+    """Modelo de generación: recibe un lote de prompts y retorna (texto, tokens generados) de cada uno."""
+
+    def generate(self, prompts: List[str]) -> List[Tuple[str, int]]: ...
+
+
+class TransformersModel:
+    """
+    Modelo seq2seq de Hugging Face (por ejemplo flan-t5) en CPU.
+
+    Args:
+        model_name (str): Nombre del modelo en Hugging Face.
+        models_path (str): Directorio de modelos: se usa MODELS_PATH/<model_name> si existe; si no,
+            se descarga en ese directorio (caché de Hugging Face).
+        token (str, opcional): Token de Hugging Face.
+        max_new_tokens (int): Tokens máximos por respuesta.
+        threads (int): Hilos de PyTorch (0 = valor por defecto).
+
+    Raises:
+        RuntimeError: Si no están instalados 'transformers' y 'torch'.
+    """
+
+    def __init__(self, model_name: str, models_path: str, token: Optional[str] = None, max_new_tokens: int = 64, threads: int = 0):
+        try:
+            import torch
+            from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+        except ImportError as e:
+            raise RuntimeError("GENERATION_ENABLED=True requiere los paquetes 'transformers' y 'torch'.") from e
+        if threads > 0:
+            torch.set_num_threads(threads)
+        local_path = os.path.join(models_path, model_name)
+        source = local_path if os.path.isdir(local_path) else model_name
+        options = {} if source == local_path else {"cache_dir": models_path, "token": token}
+        self._torch = torch
+        self.tokenizer = AutoTokenizer.from_pretrained(source, **options)
+        self.model = AutoModelForSeq2SeqLM.from_pretrained(source, **options)
+        self.model.eval()
+        self.max_new_tokens = max_new_tokens
+
+    def generate(self, prompts: List[str]) -> List[Tuple[str, int]]:
+        inputs = self.tokenizer(prompts, return_tensors="pt", padding=True, truncation=True, max_length=512)
+        with self._torch.inference_mode():
+            outputs = self.model.generate(**inputs, max_new_tokens=self.max_new_tokens)
+        pad_id = self.tokenizer.pad_token_id
+        results = []
+        for output in outputs:
+            tokens = int((output != pad_id).sum())
+            results.append((self.tokenizer.decode(output, skip_special_tokens=True).strip(), tokens))
+        return results
+
+
+@dataclass
+class _Request:
+    prompt: str
+    future: asyncio.Future
+    loop: asyncio.AbstractEventLoop
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+
+class AnswerGenerator:
+    """
+    Cola de preguntas atendida por un hilo que agrupa micro-lotes y llama al modelo.
+
+    Args:
+        load_model (Callable[[], TextModel]): Crea el modelo; se llama en el warm-up (load) o en el hilo con la primera pregunta, y tras un fallo recién pasados load_retry_after segundos.
+        max_batch (int): Preguntas máximas por pasada del modelo.
+        batch_window (float): Segundos que se espera a que lleguen más preguntas antes de generar.
+        timeout (float): Segundos máximos de espera de una respuesta (cola + generación).
+        max_queue (int): Preguntas en espera a partir de las cuales se responde con el menú sin encolar.
+        max_answer_chars (int): Largo máximo del texto generado (cuerpo de un mensaje con botones).
+        load_retry_after (float): Segundos tras una carga fallida durante los cuales no se vuelve a intentar.
+    """
+
+    def __init__(
+        self,
+        load_model,
+        max_batch: int = 8,
+        batch_window: float = 0.02,
+        timeout: float = 8.0,
+        max_queue: int = 64,
+        max_answer_chars: int = 600,
+        load_retry_after: float = 300.0,
+    ):
+        self._load_model = load_model
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self.timeout = timeout
+        self.max_queue = max_queue
+        self.max_answer_chars = max_answer_chars
+        self.load_retry_after = load_retry_after
+        self._model: Optional[TextModel] = None
+        # Instante (time.monotonic) hasta el cual no se reintenta la carga tras un fallo
+        self._load_failed_until: Optional[float] = None
+        self._queue: "queue.Queue[Optional[_Request]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._model_lock = threading.Lock()
+        # Métricas
+        self.requests = 0
+        self.completed = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.errors = 0
+        self.unavailable = 0
+        self.load_failures = 0
+        self.batches = 0
+        self.batched_requests = 0
+        self.tokens = 0
+        self.generation_seconds = 0.0
+        self.queue_seconds = 0.0
+        self.queue_seconds_max = 0.0
+        self.load_seconds: Optional[float] = None
+
+    def start(self) -> None:
+        """Inicia el hilo de inferencia (idempotente)."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="answer-generator", daemon=True)
+                self._thread.start()
+
+    def load(self) -> None:
+        """
+        Carga el modelo si todavía no está cargado (bloqueante; el warm-up lo llama en un hilo al arrancar).
+        Si la carga falla, no se reintenta hasta pasados load_retry_after segundos.
+        """
+        with self._model_lock:
+            if self._model is not None:
+                return
+            if self._unavailable():
+                raise RuntimeError("El modelo de generación no está disponible (falló la carga anterior).")
+            started = time.perf_counter()
+            try:
+                self._model = self._load_model()
+            except Exception:
+                self.load_failures += 1
+                self._load_failed_until = time.monotonic() + self.load_retry_after
+                logger.warning("Falló la carga del modelo de generación: se reintenta en %.0f s.", self.load_retry_after)
+                raise
+            self._load_failed_until = None
+            self.load_seconds = time.perf_counter() - started
+            logger.info("Modelo de generación cargado en %.1f s.", self.load_seconds)
+
+    def _unavailable(self) -> bool:
+        return self._load_failed_until is not None and time.monotonic() < self._load_failed_until
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Detiene el hilo; las preguntas pendientes reciben None (menú)."""
+        thread = self._thread
+        if thread is None:
+            return
+        self._queue.put(None)
+        thread.join(timeout)
+        self._thread = None
+        logger.info("Generador de respuestas detenido.")
+
+    async def generate(self, question: str, context: str = "") -> Optional[str]:
+        """
+        Genera la respuesta a una pregunta. Retorna None si se vence el timeout, la cola está
+        llena o el modelo falla: en ese caso se envía el menú.
+        """
+        self.requests += 1
+        if self._model is None and self._unavailable():
+            self.unavailable += 1
+            return None
+        if self._queue.qsize() >= self.max_queue:
+            self.rejected += 1
+            logger.warning("Cola de generación llena (%d): se responde con el menú.", self.max_queue)
+            return None
+        self.start()
+        loop = asyncio.get_running_loop()
+        request = _Request(PROMPT.format(context=context or "-", question=question), loop.create_future(), loop)
+        self._queue.put(request)
+        try:
+            text = await asyncio.wait_for(asyncio.shield(request.future), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            logger.warning("Generación vencida tras %.1f s: se responde con el menú.", self.timeout)
+            return None
+        if not text:
+            return None
+        self.completed += 1
+        if len(text) > self.max_answer_chars:
+            text = text[: self.max_answer_chars - 1].rstrip() + "…"
+        return text
+
+    # ------------------------------------------------------------------
+    # Hilo de inferencia
+    # ------------------------------------------------------------------
+    def _next_batch(self) -> Optional[List[_Request]]:
+        """Bloquea hasta la primera pregunta y junta las que lleguen dentro de la ventana."""
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.perf_counter() + self.batch_window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                # Se procesa el lote en curso y se vuelve a encolar la señal de parada
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    @staticmethod
+    def _resolve(request: _Request, text: Optional[str]) -> None:
+        def set_result() -> None:
+            if not request.future.done():
+                request.future.set_result(text)
+        try:
+            request.loop.call_soon_threadsafe(set_result)
+        except RuntimeError:
+            pass  # el event loop ya se cerró
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                break
+            started = time.perf_counter()
+            for request in batch:
+                waited = started - request.enqueued_at
+                self.queue_seconds += waited
+                self.queue_seconds_max = max(self.queue_seconds_max, waited)
+            try:
+                if self._model is None:
+                    self.load()
+                    started = time.perf_counter()
+                results = self._model.generate([request.prompt for request in batch])
+            except Exception as e:
+                self.errors += 1
+                logger.error("Error del modelo de generación (lote de %d): %s", len(batch), e)
+                results = [(None, 0)] * len(batch)
+            self.generation_seconds += time.perf_counter() - started
+            self.batches += 1
+            self.batched_requests += len(batch)
+            for request, (text, tokens) in zip(batch, results):
+                self.tokens += tokens
+                self._resolve(request, text)
+        # Las preguntas que quedaron sin atender reciben None
+        while True:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is not None:
+                self._resolve(request, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "model_loaded": self._model is not None,
+            "load_seconds": round(self.load_seconds, 2) if self.load_seconds is not None else None,
+            "queued": self._queue.qsize(),
+            "requests": self.requests,
+            "completed": self.completed,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "unavailable": self.unavailable,
+            "load_failures": self.load_failures,
+            "batches": self.batches,
+            "batch_size_avg": round(self.batched_requests / self.batches, 2) if self.batches else 0.0,
+            "tokens": self.tokens,
+            "tokens_per_second": round(self.tokens / self.generation_seconds, 1) if self.generation_seconds else 0.0,
+            "queue_ms_avg": round(self.queue_seconds / self.batched_requests * 1000, 2) if self.batched_requests else 0.0,
+            "queue_ms_max": round(self.queue_seconds_max * 1000, 2),
+        }
+
+
+def create_answer_generator(settings: Settings) -> Optional[AnswerGenerator]:
+    """Crea el generador de respuestas (el modelo se carga con la primera pregunta); None si GENERATION_ENABLED es False."""
+    if not settings.GENERATION_ENABLED:
+        return None
+
+    def load_model() -> TextModel:
+        return TransformersModel(
+            settings.MODEL_NAME,
+            settings.MODELS_PATH,
+            settings.HUGGINGFACE_TOKEN,
+            settings.GENERATION_MAX_NEW_TOKENS,
+            settings.GENERATION_THREADS,
+        )
+
+    return AnswerGenerator(
+        load_model,
+        max_batch=settings.GENERATION_MAX_BATCH,
+        batch_window=settings.GENERATION_BATCH_WINDOW,
+        timeout=settings.GENERATION_TIMEOUT,
+        max_queue=settings.GENERATION_MAX_QUEUE,
+        load_retry_after=settings.GENERATION_LOAD_RETRY_SECONDS,
+    )
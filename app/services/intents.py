@@ -0,0 +1,281 @@
+'''
+intents.py
+Clasificador de intenciones para enrutar textos libres directo a un estado del menú.
+    + Autómata Aho-Corasick compilado al arrancar con las palabras clave de cada tema (pileta,
+      tenis, sum) y de cada acción (horarios, reservar, reglamento): una sola pasada por el texto,
+      sin importar la cantidad de palabras clave. 'reserv*' marca un prefijo ('reservar', 'reservo').
+    + Tema + acción se resuelven al estado del grafo '<tema>_<acción>' si existe ('pileta_horarios'),
+      o al estado del tema. Sin tema, se usa el tema del estado actual de la conversación.
+    + Modelo lineal opcional (Naive Bayes multinomial) entrenado al arrancar con ejemplos: las
+      log-probabilidades de cada término quedan precalculadas y clasificar es sumar filas de una
+      tabla. Se consulta solo si el autómata no encontró un tema.
+    + Un texto ambiguo (dos temas con el mismo puntaje, o confianza baja del modelo) no se enruta.
+'''
+import math
+import re
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.config_setup.settings import Settings
+from app.services.knowledge import fold, tokenize
+from app.utils.utils import configure_logging
+
+
+# Configuración del logger
+logger = configure_logging(__name__)
+
+# Palabras clave por tema y por acción ('*' al final = prefijo)
+TOPIC_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    "pileta": ("pileta*", "piscina*", "pile", "natacion", "nadar", "nado", "pileton"),
+    "tenis": ("tenis*", "cancha*", "raqueta*", "singles", "dobles"),
+    "sum": ("sum", "salon*", "usos multiples", "cumple*", "fiesta*", "evento*", "festejo*"),
+}
+ACTION_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    "horarios": ("horario*", "hora", "horas", "abre*", "cierra*", "abierto*", "abierta*", "cuando"),
+    "reservar": ("reserv*", "turno*", "alquil*", "anotar*", "anoto", "sacar"),
+    "reglamento": ("reglamento*", "regla*", "norma*", "permitido*", "prohibido*", "se puede"),
+}
+
+# Ejemplos de entrenamiento del modelo lineal ('otro' = fuera de los temas del menú)
+TRAINING_EXAMPLES: Tuple[Tuple[str, str], ...] = (
+    ("quiero ir a tomar sol al agua", "pileta"),
+    ("los chicos pueden meterse al agua", "pileta"),
+    ("está climatizada el agua", "pileta"),
+    ("necesito gorra y antiparras", "pileta"),
+    ("hay guardavidas", "pileta"),
+    ("clases para aprender a flotar", "pileta"),
+    ("hay profe para jugar con la pelotita amarilla", "tenis"),
+    ("busco compañero para un partido", "tenis"),
+    ("el polvo de ladrillo está mojado", "tenis"),
+    ("hay luz para jugar de noche el partido", "tenis"),
+    ("se puede jugar un set", "tenis"),
+    ("tienen red y pelotas para prestar", "tenis"),
+    ("quiero festejar el aniversario", "sum"),
+    ("necesito el lugar para una reunión de consorcio", "sum"),
+    ("cuántas personas entran en el salón", "sum"),
+    ("tiene parrilla y vajilla el lugar", "sum"),
+    ("quiero hacer un asado con amigos adentro", "sum"),
+    ("se puede poner música en la reunión", "sum"),
+    ("cuánto sale la cuota", "otro"),
+    ("dónde pago las expensas", "otro"),
+    ("perdí mi carnet de socio", "otro"),
+    ("hay estacionamiento", "otro"),
+    ("gracias", "otro"),
+    ("ok perfecto", "otro"),
+    ("quiero hablar con una persona", "otro"),
+    ("cómo me hago socio", "otro"),
+)
+
+_WORD = re.compile(r"[a-z0-9ñ]")
+
+
+@dataclass(frozen=True)
+class Intent:
+    """Resultado de la clasificación: estado destino, tema, acción, origen y confianza."""
+    target: str
+    topic: str
+    action: Optional[str]
+    source: str
+    confidence: float
+
+
+class KeywordAutomaton:
+    """
+    Autómata Aho-Corasick sobre palabras clave normalizadas, con límites de palabra.
+
+    Args:
+        keywords (Iterable[Tuple[str, str]]): Pares (palabra clave, etiqueta). Una palabra clave
+            terminada en '*' coincide como prefijo de palabra.
+    """
+
+    def __init__(self, keywords: Iterable[Tuple[str, str]]):
+        # goto[nodo] = {carácter: nodo}; outputs[nodo] = [(largo, etiqueta, es_prefijo)]
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._outputs: List[List[Tuple[int, str, bool]]] = [[]]
+        for keyword, label in keywords:
+            prefix = keyword.endswith("*")
+            pattern = fold(keyword.rstrip("*"))
+            node = 0
+            for char in pattern:
+                next_node = self._goto[node].get(char)
+                if next_node is None:
+                    next_node = len(self._goto)
+                    self._goto[node][char] = next_node
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._outputs.append([])
+                node = next_node
+            self._outputs[node].append((len(pattern), label, prefix))
+        self._build_failure_links()
+
+    def _build_failure_links(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                candidate = self._goto[fail].get(char, 0)
+                self._fail[child] = candidate if candidate != child else 0
+                # Las coincidencias del sufijo más largo también terminan en este nodo
+                self._outputs[child] = self._outputs[child] + self._outputs[self._fail[child]]
+
+    def __len__(self) -> int:
+        return len(self._goto)
+
+    def find(self, text: str) -> List[str]:
+        """Etiquetas de las palabras clave presentes en 'text' (ya normalizado con fold)."""
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        labels = []
+        node = 0
+        last = len(text) - 1
+        for i, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for length, label, prefix in outputs[node]:
+                start = i - length + 1
+                if start > 0 and _WORD.match(text[start - 1]):
+                    continue
+                if not prefix and i < last and _WORD.match(text[i + 1]):
+                    continue
+                labels.append(label)
+        return labels
+
+
+class NaiveBayesModel:
+    """
+    Naive Bayes multinomial con la tabla de log-probabilidades precalculada por término.
+
+    Args:
+        examples (Iterable[Tuple[str, str]]): Pares (texto, etiqueta) de entrenamiento.
+        alpha (float): Suavizado de Laplace.
+    """
+
+    def __init__(self, examples: Iterable[Tuple[str, str]], alpha: float = 0.5):
+        counts: Dict[str, Dict[str, int]] = {}
+        totals: Dict[str, int] = {}
+        for text, label in examples:
+            for token in tokenize(text):
+                counts.setdefault(token, {}).setdefault(label, 0)
+                counts[token][label] += 1
+                totals[label] = totals.get(label, 0) + 1
+        self.labels: Tuple[str, ...] = tuple(sorted(totals))
+        vocabulary = len(counts)
+        # Por término: log P(término | etiqueta) en el orden de self.labels
+        self.table: Dict[str, Tuple[float, ...]] = {
+            token: tuple(
+                math.log((by_label.get(label, 0) + alpha) / (totals[label] + alpha * vocabulary))
+                for label in self.labels
+            )
+            for token, by_label in counts.items()
+        }
+
+    def predict(self, text: str) -> Optional[Tuple[str, float]]:
+        """Etiqueta más probable y su probabilidad normalizada; None si ningún término es conocido."""
+        scores = None
+        for token in tokenize(text):
+            row = self.table.get(token)
+            if row is None:
+                continue
+            scores = list(row) if scores is None else [score + value for score, value in zip(scores, row)]
+        if scores is None:
+            return None
+        best = max(scores)
+        weights = [math.exp(score - best) for score in scores]
+        index = weights.index(1.0)
+        return self.labels[index], 1.0 / sum(weights)
+
+
+class IntentRouter:
+    """
+    Clasifica un texto libre en un estado del grafo de conversación.
+
+    Args:
+        states (Iterable[str]): Nombres de los estados del grafo (destinos válidos).
+        model (NaiveBayesModel, opcional): Modelo lineal para los textos sin palabras clave de tema.
+        min_confidence (float): Probabilidad mínima del modelo para enrutar.
+    """
+
+    def __init__(self, states: Iterable[str], model: Optional[NaiveBayesModel] = None, min_confidence: float = 0.7):
+        self.states = frozenset(states)
+        self.model = model
+        self.min_confidence = min_confidence
+        keywords = [(keyword, f"topic:{topic}") for topic, words in TOPIC_KEYWORDS.items() for keyword in words]
+        keywords += [(keyword, f"action:{action}") for action, words in ACTION_KEYWORDS.items() for keyword in words]
+        self.automaton = KeywordAutomaton(keywords)
+        # Métricas
+        self.classified = 0
+        self.routed = 0
+        self.by_model = 0
+
+    @staticmethod
+    def _best(labels: List[str], kind: str) -> Optional[str]:
+        """Etiqueta de 'kind' con más coincidencias; None si no hay o hay empate."""
+        counts: Dict[str, int] = {}
+        for label in labels:
+            if label.startswith(kind):
+                name = label[len(kind):]
+                counts[name] = counts.get(name, 0) + 1
+        if not counts:
+            return None
+        ranked = sorted(counts.items(), key=lambda item: item[1], reverse=True)
+        if len(ranked) > 1 and ranked[0][1] == ranked[1][1]:
+            return None
+        return ranked[0][0]
+
+    def classify(self, text: str, current: Optional[str] = None) -> Optional[Intent]:
+        """
+        Estado destino para 'text', o None si la intención no es clara.
+
+        Args:
+            text (str): Texto libre del usuario.
+            current (str, opcional): Estado actual; su tema se usa si el texto solo trae una acción.
+        """
+        self.classified += 1
+        labels = self.automaton.find(fold(text))
+        topic = self._best(labels, "topic:")
+        action = self._best(labels, "action:")
+        source, confidence = "keywords", 1.0
+        if topic is None and self.model is not None and not any(label.startswith("topic:") for label in labels):
+            prediction = self.model.predict(text)
+            if prediction is not None and prediction[0] in TOPIC_KEYWORDS and prediction[1] >= self.min_confidence:
+                topic, confidence = prediction
+                source = "model"
+        if topic is None and action is not None and current is not None:
+            # 'quiero reservar' estando en el menú de tenis -> tenis_reservar
+            current_topic = current.split("_", 1)[0]
+            if current_topic in TOPIC_KEYWORDS:
+                topic, source = current_topic, "context"
+        if topic is None:
+            return None
+        target = f"{topic}_{action}" if action is not None and f"{topic}_{action}" in self.states else topic
+        if target not in self.states:
+            return None
+        self.routed += 1
+        if source == "model":
+            self.by_model += 1
+        return Intent(target, topic, action, source, confidence)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "automaton_nodes": len(self.automaton),
+            "model_terms": len(self.model.table) if self.model is not None else None,
+            "classified": self.classified,
+            "routed": self.routed,
+            "by_model": self.by_model,
+        }
+
+
+def create_intent_router(settings: Settings, states: Iterable[str]) -> Optional[IntentRouter]:
+    """Compila el clasificador de intenciones para los estados del grafo; None si INTENT_ENABLED es False."""
+    if not settings.INTENT_ENABLED:
+        return None
+    model = NaiveBayesModel(TRAINING_EXAMPLES) if settings.INTENT_MODEL_ENABLED else None
+    router = IntentRouter(states, model, settings.INTENT_MIN_CONFIDENCE)
+    logger.debug("Clasificador de intenciones compilado: %s", router.stats())
+    return router
@@ -0,0 +1,139 @@
+'''
+job_queue.py
+Cola de trabajos asíncrona en proceso para el webhook.
+El handler de POST /webhook valida el payload, lo encola y responde 200 a Meta de inmediato;
+un grupo de workers consume la cola y realiza los envíos a la Graph API.
+La cola es acotada: si se llena, encolar espera (backpressure) hasta un timeout configurable.
+'''
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.utils.utils import configure_logging
+
+
+# Configuración del logger
+logger = configure_logging(__name__)
+
+
+class QueueFullError(Exception):
+    """Se lanza cuando la cola sigue llena tras esperar el timeout de encolado."""
+
+
+@dataclass
+class Job:
+    """Trabajo encolado: corrutina a ejecutar, sus argumentos y el instante de encolado."""
+    func: Callable[..., Awaitable[Any]]
+    args: Tuple[Any, ...] = ()
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+
+class JobQueue:
+    """
+    Cola acotada de trabajos asíncronos con N workers.
+
+    Args:
+        workers (int): Cantidad de workers que consumen la cola.
+        maxsize (int): Capacidad máxima de la cola (0 = ilimitada).
+        put_timeout (float): Segundos a esperar lugar en la cola antes de rechazar el trabajo.
+        name (str): Nombre de la cola para los logs.
+    """
+
+    def __init__(self, workers: int = 4, maxsize: int = 1000, put_timeout: float = 5.0, name: str = "webhook"):
+        self.workers = workers
+        self.maxsize = maxsize
+        self.put_timeout = put_timeout
+        self.name = name
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        # Métricas
+        self.enqueued = 0
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._dequeued = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._wait_last = 0.0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self) -> None:
+        """Crea la cola y lanza los workers."""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._tasks = [
+            asyncio.create_task(self._worker(i), name=f"{self.name}-worker-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info("Cola '%s' iniciada: [workers: %s, maxsize: %s]", self.name, self.workers, self.maxsize)
+
+    async def stop(self, drain_timeout: float = 10.0) -> None:
+        """
+        Detiene los workers. Antes intenta vaciar la cola durante 'drain_timeout' segundos.
+        """
+        if not self.running:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Cola '%s': se descartan %s trabajos pendientes al apagar.", self.name, self._queue.qsize())
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("Cola '%s' detenida.", self.name)
+
+    async def enqueue(self, func: Callable[..., Awaitable[Any]], *args: Any) -> None:
+        """
+        Encola un trabajo. Si la cola está llena espera hasta 'put_timeout' segundos.
+
+        Raises:
+            QueueFullError: Si la cola sigue llena al vencer el timeout.
+        """
+        if not self.running:
+            raise RuntimeError(f"La cola '{self.name}' no está iniciada.")
+        job = Job(func=func, args=args)
+        try:
+            await asyncio.wait_for(self._queue.put(job), timeout=self.put_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise QueueFullError(f"Cola '{self.name}' llena ({self.maxsize} trabajos).")
+        self.enqueued += 1
+
+    async def _worker(self, worker_id: int) -> None:
+        """Consume trabajos de la cola hasta ser cancelado."""
+        while True:
+            job = await self._queue.get()
+            wait = time.perf_counter() - job.enqueued_at
+            self._dequeued += 1
+            self._wait_last = wait
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+            try:
+                await job.func(*job.args)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error("Cola '%s' worker %s: error al procesar el trabajo: %s", self.name, worker_id, e)
+            finally:
+                self._queue.task_done()
+
+    def stats(self) -> Dict[str, Any]:
+        """Profundidad de la cola, contadores y latencia desde el encolado hasta el procesamiento."""
+        return {
+            "depth": self._queue.qsize() if self._queue is not None else 0,
+            "maxsize": self.maxsize,
+            "workers": self.workers,
+            "enqueued": self.enqueued,
+            "processed": self.processed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "wait_ms_last": round(self._wait_last * 1000, 3),
+            "wait_ms_avg": round(self._wait_total / self._dequeued * 1000, 3) if self._dequeued else 0.0,
+            "wait_ms_max": round(self._wait_max * 1000, 3),
+        }
@@ -0,0 +1,496 @@
+'''
+knowledge.py
+Base de conocimiento local: responde preguntas de texto libre con los documentos Markdown de KNOWLEDGE_PATH.
+    + Al arrancar se leen los .md de KNOWLEDGE_PATH, se cortan en fragmentos por título y párrafo,
+      y se arma un índice invertido (término -> documentos) con puntaje BM25.
+    + El peso BM25 de cada aparición (idf, frecuencia y normalización por longitud) se calcula
+      al indexar: una consulta solo suma pesos de las listas de sus términos, sin recorrer el corpus.
+    + El índice se guarda en KNOWLEDGE_INDEX_PATH junto con el hash del contenido de cada documento;
+      un reinicio con los mismos documentos lo carga del archivo en lugar de reconstruirlo.
+    + Es CPU pura en memoria y no hace I/O por consulta: el motor de conversación la consulta
+      con los textos que no corresponden a ninguna opción del menú.
+    + Con KNOWLEDGE_RELOAD_INTERVAL > 0 una tarea en segundo plano (start/stop) revisa cada
+      intervalo, en un hilo, si cambiaron los documentos (fecha y tamaño de los archivos) y, en ese
+      caso, reconstruye los índices en el mismo hilo y los reemplaza de una vez en el event loop:
+      las consultas nunca esperan la revisión ni ven un índice a medio construir.
+    + Con SEMANTIC_ENABLED, las preguntas sin respuesta por palabras clave se buscan por similitud
+      en el índice semántico (app/services/semantic.py, requiere numpy).
+'''
+import asyncio
+import hashlib
+import heapq
+import math
+import os
+import pickle
+import re
+import time
+import unicodedata
+from array import array
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.config_setup.settings import Settings
+from app.utils.utils import configure_logging
+
+
+# Configuración del logger
+logger = configure_logging(__name__)
+
+# Se incrementa cuando cambia el formato del índice o la tokenización (invalida los archivos guardados)
+INDEX_VERSION = 1
+
+# Parámetros de BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Palabras vacías en español (no aportan al puntaje y alargan las listas del índice)
+STOPWORDS = frozenset("""
+a al algo como con cual cuales cuando de del desde donde el ella ellas ellos en entre era es esa ese eso esta
+este esto estos estas fue ha hay la las le les lo los mas me mi mis muy no nos o para pero por porque que quien
+se ser si sin sobre son su sus te tiene tu tus un una uno unos unas y ya yo puedo puede quiero hace hacer
+""".split())
+
+_TOKEN_RE = re.compile(r"[a-z0-9ñ]+")
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.*)$")
+_IMAGE_RE = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+_LINK_RE = re.compile(r"\[([^\]]+)\]\([^)]*\)")
+
+
+def fold(text: str) -> str:
+    """Minúsculas y sin acentos (la ñ se conserva)."""
+    text = unicodedata.normalize("NFKD", text.lower().replace("ñ", "\0"))
+    return "".join(c for c in text if not unicodedata.combining(c)).replace("\0", "ñ")
+
+
+def _stem(token: str) -> str:
+    """Plurales simples: 'horarios' -> 'horario', 'reservas' -> 'reserva', 'canciones' -> 'cancion'."""
+    if len(token) > 5 and token.endswith("es") and token[-3] not in "aeiou":
+        return token[:-2]
+    if len(token) > 3 and token.endswith("s"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Términos de búsqueda de un texto: normalizados, sin palabras vacías y con plurales simplificados."""
+    return [_stem(token) for token in _TOKEN_RE.findall(fold(text)) if token not in STOPWORDS and len(token) > 1]
+
+
+@dataclass(frozen=True)
+class Chunk:
+    """Fragmento de un documento: archivo de origen, título de la sección y texto."""
+    source: str
+    title: str
+    text: str
+
+
+@dataclass(frozen=True)
+class SearchHit:
+    """Resultado de una búsqueda: fragmento y puntaje BM25."""
+    chunk: Chunk
+    score: float
+
+
+def _clean(line: str) -> str:
+    line = _IMAGE_RE.sub("", line)
+    return _LINK_RE.sub(r"\1", line).strip()
+
+
+def chunk_markdown(source: str, text: str, max_chars: int) -> List[Chunk]:
+    """
+    Corta un documento Markdown por títulos y, dentro de cada sección, por párrafos,
+    juntando párrafos consecutivos mientras no superen max_chars.
+    """
+    chunks: List[Chunk] = []
+    title = Path(source).stem
+    paragraphs: List[str] = []
+    current: List[str] = []
+    in_code = False
+
+    def close_paragraph() -> None:
+        if current:
+            paragraphs.append(" ".join(current))
+            current.clear()
+
+    def close_section() -> None:
+        close_paragraph()
+        buffer = ""
+        for paragraph in paragraphs:
+            if buffer and len(buffer) + len(paragraph) + 1 > max_chars:
+                chunks.append(Chunk(source, title, buffer))
+                buffer = ""
+            buffer = f"{buffer}\n{paragraph}" if buffer else paragraph
+        if buffer:
+            chunks.append(Chunk(source, title, buffer))
+        paragraphs.clear()
+
+    for raw in text.splitlines():
+        if raw.lstrip().startswith("```"):
+            # Los bloques de código no son respuestas útiles por WhatsApp
+            in_code = not in_code
+            continue
+        if in_code:
+            continue
+        heading = _HEADING_RE.match(raw.strip())
+        if heading:
+            close_section()
+            title = _clean(heading.group(2)).strip("*`") or title
+            continue
+        line = _clean(raw)
+        if line:
+            current.append(line)
+        else:
+            close_paragraph()
+    close_section()
+    return chunks
+
+
+def load_documents(docs_path: str) -> Dict[str, str]:
+    """Lee los archivos .md de docs_path (recursivo), indexados por ruta relativa."""
+    root = Path(docs_path)
+    if not root.is_dir():
+        logger.warning("KNOWLEDGE_PATH no existe o no es un directorio: %s", docs_path)
+        return {}
+    documents = {}
+    for path in sorted(root.rglob("*.md")):
+        try:
+            documents[path.relative_to(root).as_posix()] = path.read_text(encoding="utf-8")
+        except (OSError, UnicodeDecodeError) as e:
+            logger.warning("No se pudo leer %s: %s", path, e)
+    return documents
+
+
+def docs_fingerprint(docs_path: str) -> Tuple[Tuple[str, int, int], ...]:
+    """Ruta, fecha de modificación y tamaño de cada .md de docs_path (detecta cambios sin leerlos)."""
+    root = Path(docs_path)
+    if not root.is_dir():
+        return ()
+    fingerprint = []
+    for path in sorted(root.rglob("*.md")):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        fingerprint.append((path.relative_to(root).as_posix(), stat.st_mtime_ns, stat.st_size))
+    return tuple(fingerprint)
+
+
+def content_hashes(documents: Dict[str, str]) -> Dict[str, str]:
+    """Hash SHA-256 del contenido de cada documento."""
+    return {source: hashlib.sha256(text.encode("utf-8")).hexdigest() for source, text in documents.items()}
+
+
+class KnowledgeIndex:
+    """
+    Índice invertido con pesos BM25 precalculados.
+
+    Args:
+        chunks (List[Chunk]): Fragmentos indexados (el id de cada uno es su posición).
+        postings (Dict[str, Tuple[array, array]]): Por término, ids de fragmento ('I') y peso BM25 ('f').
+        hashes (Dict[str, str]): Hash del contenido de cada documento indexado.
+        chunk_chars (int): Tamaño de fragmento con el que se construyó.
+    """
+
+    def __init__(
+        self,
+        chunks: List[Chunk],
+        postings: Dict[str, Tuple[array, array]],
+        hashes: Dict[str, str],
+        chunk_chars: int,
+    ):
+        self.chunks = chunks
+        self.postings = postings
+        self.hashes = hashes
+        self.chunk_chars = chunk_chars
+
+    @classmethod
+    def build(cls, documents: Dict[str, str], chunk_chars: int = 800) -> "KnowledgeIndex":
+        """Fragmenta los documentos y arma el índice invertido con los pesos BM25 de cada aparición."""
+        chunks: List[Chunk] = []
+        for source, text in documents.items():
+            chunks.extend(chunk_markdown(source, text, chunk_chars))
+
+        frequencies: Dict[str, Dict[int, int]] = {}
+        lengths: List[int] = []
+        for chunk_id, chunk in enumerate(chunks):
+            # El título forma parte del fragmento: "Horarios" en el título cuenta para la sección
+            tokens = tokenize(f"{chunk.title} {chunk.text}")
+            lengths.append(len(tokens))
+            for token in tokens:
+                postings = frequencies.setdefault(token, {})
+                postings[chunk_id] = postings.get(chunk_id, 0) + 1
+
+        total = len(chunks)
+        avg_length = (sum(lengths) / total) if total else 0.0
+        postings_arrays: Dict[str, Tuple[array, array]] = {}
+        for token, postings in frequencies.items():
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            ids = array("I")
+            weights = array("f")
+            for chunk_id, tf in postings.items():
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[chunk_id] / avg_length)
+                ids.append(chunk_id)
+                weights.append(idf * tf * (BM25_K1 + 1) / (tf + norm))
+            postings_arrays[token] = (ids, weights)
+        return cls(chunks, postings_arrays, content_hashes(documents), chunk_chars)
+
+    def search(self, query: str, top_k: int = 3) -> List[SearchHit]:
+        """Fragmentos con mayor puntaje BM25 para la consulta (vacío si ningún término aparece)."""
+        scores: Dict[int, float] = {}
+        get = scores.get
+        for token in set(tokenize(query)):
+            postings = self.postings.get(token)
+            if postings is None:
+                continue
+            for chunk_id, weight in zip(*postings):
+                scores[chunk_id] = get(chunk_id, 0.0) + weight
+        if not scores:
+            return []
+        best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        return [SearchHit(self.chunks[chunk_id], score) for chunk_id, score in best]
+
+    def save(self, path: str) -> None:
+        """Guarda el índice de forma atómica (archivo temporal + os.replace)."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        state = {
+            "version": INDEX_VERSION,
+            "chunk_chars": self.chunk_chars,
+            "hashes": self.hashes,
+            "chunks": [(chunk.source, chunk.title, chunk.text) for chunk in self.chunks],
+            "postings": self.postings,
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as file:
+            pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["KnowledgeIndex"]:
+        """Carga un índice guardado; None si no existe, está dañado o es de otra versión."""
+        try:
+            with open(path, "rb") as file:
+                state = pickle.load(file)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning("No se pudo leer el índice de conocimiento %s: %s", path, e)
+            return None
+        if not isinstance(state, dict) or state.get("version") != INDEX_VERSION:
+            return None
+        chunks = [Chunk(*item) for item in state["chunks"]]
+        return cls(chunks, state["postings"], state["hashes"], state["chunk_chars"])
+
+
+class KnowledgeBase:
+    """
+    Responde preguntas de texto libre con el mejor fragmento del índice.
+
+    Args:
+        index (KnowledgeIndex): Índice de los documentos.
+        min_score (float): Puntaje BM25 mínimo para considerar que un fragmento responde la pregunta.
+        max_answer_chars (int): Largo máximo de la respuesta enviada.
+        semantic (SemanticIndex, opcional): Índice semántico que se consulta si BM25 no alcanza min_score.
+        semantic_min_score (float): Similitud coseno mínima de la búsqueda semántica.
+        docs_path (str): Directorio de los documentos (para detectar cambios).
+        reload_interval (float): Segundos mínimos entre revisiones de cambios (0 = no revisar).
+        rebuild (Callable, opcional): Reconstruye (índice, índice semántico) a partir de documentos y hashes.
+    """
+
+    def __init__(
+        self,
+        index: KnowledgeIndex,
+        min_score: float = 2.0,
+        max_answer_chars: int = 1000,
+        semantic: Any = None,
+        semantic_min_score: float = 0.3,
+        docs_path: str = "",
+        reload_interval: float = 0.0,
+        rebuild: Optional[Callable[[Dict[str, str], Dict[str, str]], Tuple[KnowledgeIndex, Any]]] = None,
+    ):
+        self.index = index
+        self.min_score = min_score
+        self.max_answer_chars = max_answer_chars
+        self.semantic = semantic
+        self.semantic_min_score = semantic_min_score
+        self.docs_path = docs_path
+        self.reload_interval = reload_interval
+        self._rebuild = rebuild
+        self._fingerprint = docs_fingerprint(docs_path) if docs_path and reload_interval > 0 else ()
+        self._task: Optional[asyncio.Task] = None
+        # Métricas
+        self.queries = 0
+        self.answered = 0
+        self.semantic_answered = 0
+        self.query_seconds = 0.0
+        self.reloads = 0
+
+    def _load_changes(self) -> Optional[Tuple[KnowledgeIndex, Any]]:
+        """
+        Revisa si cambiaron los documentos y, si su contenido es distinto, construye los índices
+        nuevos sin tocar los actuales. Hace I/O y CPU: corre en un hilo (reload).
+
+        Returns:
+            Optional[Tuple[KnowledgeIndex, Any]]: (índice, índice semántico) nuevos, o None si no hubo cambios.
+        """
+        fingerprint = docs_fingerprint(self.docs_path)
+        if fingerprint == self._fingerprint:
+            return None
+        self._fingerprint = fingerprint
+        documents = load_documents(self.docs_path)
+        hashes = content_hashes(documents)
+        if hashes == self.index.hashes:
+            return None
+        return self._rebuild(documents, hashes)
+
+    async def reload(self) -> bool:
+        """
+        Revisa los documentos en un hilo y, si cambiaron, reemplaza ambos índices en una sola
+        asignación. Retorna True si se reconstruyeron.
+        """
+        if self._rebuild is None:
+            return False
+        rebuilt = await asyncio.to_thread(self._load_changes)
+        if rebuilt is None:
+            return False
+        self.index, self.semantic = rebuilt
+        self.reloads += 1
+        logger.info("Documentos de %s modificados: base de conocimiento reconstruida.", self.docs_path)
+        return True
+
+    async def _watch(self, on_reload: Optional[Callable[[], None]]) -> None:
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                if await self.reload() and on_reload is not None:
+                    on_reload()
+            except Exception as e:
+                logger.error("Error al revisar los documentos de %s: %s", self.docs_path, e)
+
+    def start(self, on_reload: Optional[Callable[[], None]] = None) -> None:
+        """
+        Inicia la revisión periódica de los documentos (si reload_interval > 0).
+
+        Args:
+            on_reload (Callable, opcional): Se llama tras cada reconstrucción (por ejemplo, para vaciar la caché de respuestas).
+        """
+        if self.reload_interval <= 0 or self._rebuild is None or self._task is not None:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._watch(on_reload), name="knowledge-reload")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def search(self, question: str, top_k: int = 3) -> List[SearchHit]:
+        start = time.perf_counter()
+        hits = self.index.search(question, top_k)
+        self.query_seconds += time.perf_counter() - start
+        self.queries += 1
+        return hits
+
+    def answer(self, question: str) -> Optional[str]:
+        """Texto de la mejor respuesta, o None si ningún fragmento supera min_score (ni semantic_min_score)."""
+        hits = self.search(question, top_k=1)
+        if hits and hits[0].score >= self.min_score:
+            self.answered += 1
+            return format_answer(hits[0].chunk, self.max_answer_chars)
+        if self.semantic is not None:
+            start = time.perf_counter()
+            hits = self.semantic.search(question, top_k=1)
+            self.query_seconds += time.perf_counter() - start
+            if hits and hits[0].score >= self.semantic_min_score:
+                self.answered += 1
+                self.semantic_answered += 1
+                return format_answer(hits[0].chunk, self.max_answer_chars)
+        return None
+
+    def context(self, question: str, top_k: int = 2, max_chars: int = 1500) -> str:
+        """Fragmentos más relevantes (sin puntaje mínimo) como contexto para el generador de respuestas."""
+        text = " ".join(hit.chunk.text for hit in self.index.search(question, top_k))
+        return text[:max_chars]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "documents": len(self.index.hashes),
+            "chunks": len(self.index.chunks),
+            "terms": len(self.index.postings),
+            "queries": self.queries,
+            "answered": self.answered,
+            "semantic_answered": self.semantic_answered,
+            "semantic": self.semantic.stats() if self.semantic is not None else None,
+            "reloads": self.reloads,
+            "query_ms_avg": round(self.query_seconds / self.queries * 1000, 3) if self.queries else 0.0,
+        }
+
+
+def format_answer(chunk: Chunk, max_chars: int) -> str:
+    """Título en negrita (formato de WhatsApp) y texto, recortado a max_chars."""
+    text = f"*{chunk.title}*\n{chunk.text}"
+    if len(text) > max_chars:
+        text = text[: max_chars - 1].rstrip() + "…"
+    return text
+
+
+def load_or_build_index(documents: Dict[str, str], hashes: Dict[str, str], index_path: str, chunk_chars: int) -> KnowledgeIndex:
+    """
+    Carga el índice guardado si los documentos no cambiaron (mismos hashes de contenido y
+    parámetros); si no, lo reconstruye y lo guarda.
+    """
+    if index_path:
+        index = KnowledgeIndex.load(index_path)
+        if index is not None and index.hashes == hashes and index.chunk_chars == chunk_chars:
+            logger.info("Índice de conocimiento cargado de %s (%d fragmentos).", index_path, len(index.chunks))
+            return index
+    start = time.perf_counter()
+    index = KnowledgeIndex.build(documents, chunk_chars)
+    logger.info(
+        "Índice de conocimiento construido: %d documentos, %d fragmentos, %d términos en %.1f ms.",
+        len(documents), len(index.chunks), len(index.postings), (time.perf_counter() - start) * 1000,
+    )
+    if index_path:
+        try:
+            index.save(index_path)
+        except OSError as e:
+            logger.warning("No se pudo guardar el índice de conocimiento en %s: %s", index_path, e)
+    return index
+
+
+def create_knowledge_base(settings: Settings) -> Optional[KnowledgeBase]:
+    """
+    Construye (o carga) la base de conocimiento de KNOWLEDGE_PATH; None si KNOWLEDGE_ENABLED es False.
+
+    Raises:
+        RuntimeError: Si SEMANTIC_ENABLED es True y no está instalado numpy.
+    """
+    if not settings.KNOWLEDGE_ENABLED:
+        return None
+    create_semantic_index = None
+    if settings.SEMANTIC_ENABLED:
+        try:
+            from app.services.semantic import create_semantic_index
+        except ImportError as e:
+            raise RuntimeError("SEMANTIC_ENABLED=True requiere el paquete 'numpy' (pip install numpy).") from e
+
+    def rebuild(documents: Dict[str, str], hashes: Dict[str, str]) -> Tuple[KnowledgeIndex, Any]:
+        index = load_or_build_index(documents, hashes, settings.KNOWLEDGE_INDEX_PATH, settings.KNOWLEDGE_CHUNK_CHARS)
+        semantic = create_semantic_index(settings, documents, hashes) if create_semantic_index is not None else None
+        return index, semantic
+
+    documents = load_documents(settings.KNOWLEDGE_PATH)
+    index, semantic = rebuild(documents, content_hashes(documents))
+    return KnowledgeBase(
+        index,
+        settings.KNOWLEDGE_MIN_SCORE,
+        settings.KNOWLEDGE_MAX_ANSWER_CHARS,
+        semantic,
+        settings.SEMANTIC_MIN_SCORE,
+        settings.KNOWLEDGE_PATH,
+        settings.KNOWLEDGE_RELOAD_INTERVAL,
+        rebuild,
+    )
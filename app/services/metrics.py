@@ -0,0 +1,293 @@
+'''
+metrics.py
+Métricas en formato de texto de Prometheus (GET /metrics), sin dependencias externas.
+    + Counter / Histogram / Gauge mínimos: cada serie (combinación de etiquetas) es un entero o una
+      lista de cubetas en un diccionario. Se registran desde el event loop (un solo hilo), así que
+      no usan locks; registrar un valor cuesta una búsqueda en el diccionario y un bisect
+      (presupuesto RECORD_BUDGET_NS, verificado por tests/benchmarks/bench_metrics.py).
+    + Las métricas del camino caliente (webhook, envíos a la Graph API, lag del event loop) se
+      registran al ocurrir; las profundidades de colas, tasas de acierto de cachés y estados se
+      leen de GET /stats recién al exportar (costo cero por mensaje).
+    + El monitor de lag duerme un intervalo fijo y registra cuánto tarda de más en despertar.
+'''
+import asyncio
+import math
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.config_setup.settings import Settings
+from app.schemas.webhook_schema import MessageType, WebhookPayload
+from app.utils.utils import configure_logging
+
+
+# Configuración del logger
+logger = configure_logging(__name__)
+
+# Presupuesto de costo por registro (inc / observe / set), en nanosegundos
+RECORD_BUDGET_NS = 1000
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _labels(self, values: Tuple[str, ...], extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(self.labelnames, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Contador monótono por combinación de etiquetas: inc(("text", "accepted"))."""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, labels: Tuple[str, ...] = (), amount: float = 1) -> None:
+        values = self._values
+        values[labels] = values.get(labels, 0) + amount
+
+    def value(self, labels: Tuple[str, ...] = ()) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        lines += [f"{self.name}{self._labels(labels)} {_format_value(value)}" for labels, value in self._values.items()]
+        return lines
+
+
+class Gauge(_Metric):
+    """Valor instantáneo por combinación de etiquetas."""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, labels: Tuple[str, ...] = ()) -> None:
+        self._values[labels] = value
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        lines += [f"{self.name}{self._labels(labels)} {_format_value(value)}" for labels, value in self._values.items()]
+        return lines
+
+
+class Histogram(_Metric):
+    """
+    Histograma de cubetas fijas. Cada serie es una lista [cubeta_0, ..., cubeta_n, +Inf, suma]
+    con conteos no acumulados; se acumulan recién al exportar.
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, labels: Tuple[str, ...] = ()) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def count(self, labels: Tuple[str, ...] = ()) -> int:
+        series = self._series.get(labels)
+        return int(sum(series[:-1])) if series is not None else 0
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for labels, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), series):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{self._labels(labels, le)} {int(cumulative)}")
+            lines.append(f"{self.name}_sum{self._labels(labels)} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{self._labels(labels)} {int(cumulative)}")
+        return lines
+
+
+# Gauges tomados de GET /stats al exportar: (nombre, ayuda, ruta de claves en el diccionario de /stats)
+STATS_GAUGES: Tuple[Tuple[str, str, Tuple[str, ...]], ...] = (
+    ("whatsapp_job_queue_depth", "Webhooks encolados pendientes de procesar", ("job_queue", "depth")),
+    ("whatsapp_job_queue_maxsize", "Capacidad de la cola de webhooks", ("job_queue", "maxsize")),
+    ("whatsapp_job_queue_rejected", "Webhooks rechazados por cola llena", ("job_queue", "rejected")),
+    ("whatsapp_dispatcher_active", "Conversaciones respondiéndose en este momento", ("dispatcher", "active")),
+    ("whatsapp_outbox_pending", "Mensajes pendientes de reenvío en el outbox", ("outbox", "pending")),
+    ("whatsapp_outbox_dead", "Mensajes descartados por el outbox tras agotar los reintentos", ("outbox", "dead")),
+    ("whatsapp_generation_queued", "Preguntas esperando al generador de respuestas", ("conversation", "generation", "queued")),
+    ("whatsapp_dedupe_hit_ratio", "Proporción de mensajes duplicados descartados", ("dedupe", "hit_ratio")),
+    ("whatsapp_answer_cache_hit_ratio", "Tasa de aciertos de la caché de respuestas", ("conversation", "answer_cache", "hit_rate")),
+    ("whatsapp_answer_cache_entries", "Respuestas guardadas en la caché", ("conversation", "answer_cache", "entries")),
+    ("whatsapp_sessions", "Sesiones de conversación activas", ("conversation", "sessions", "sessions")),
+    ("whatsapp_rate_limiter_global_tokens", "Tokens disponibles en el limitador global de envíos", ("rate_limiter", "global_tokens")),
+    ("whatsapp_http_pool_connections", "Conexiones del pool HTTP hacia la Graph API", ("http_pool", "connections")),
+    ("whatsapp_http_pool_active", "Conexiones del pool HTTP en uso", ("http_pool", "active")),
+)
+
+
+def _lookup(stats: Dict[str, Any], path: Tuple[str, ...]) -> Optional[float]:
+    value: Any = stats
+    for key in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value if isinstance(value, (int, float)) else None
+
+
+class MetricsRegistry:
+    """Conjunto de métricas exportadas por GET /metrics."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Métrica duplicada: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self, stats: Optional[Dict[str, Any]] = None) -> str:
+        """Texto de exportación; con 'stats' (el diccionario de GET /stats) agrega los STATS_GAUGES."""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines += metric.render()
+        if stats is not None:
+            for name, documentation, path in STATS_GAUGES:
+                value = _lookup(stats, path)
+                if value is not None:
+                    lines += [f"# HELP {name} {documentation}", f"# TYPE {name} gauge", f"{name} {_format_value(value)}"]
+            breaker = stats.get("circuit_breaker")
+            if isinstance(breaker, dict):
+                name = "whatsapp_circuit_breaker_open"
+                lines += [f"# HELP {name} 1 si el circuito de la Graph API está abierto (o semiabierto)", f"# TYPE {name} gauge"]
+                lines.append(f"{name} {0 if breaker.get('state') == 'closed' else 1}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# Camino caliente
+WEBHOOK_REQUESTS = REGISTRY.counter(
+    "whatsapp_webhook_requests_total", "Requests de POST /webhook por tipo de mensaje y resultado", ("type", "result"))
+WEBHOOK_LATENCY = REGISTRY.histogram(
+    "whatsapp_webhook_latency_seconds", "Latencia de POST /webhook (lectura, firma, parseo y encolado) por tipo de mensaje", ("type",))
+OUTBOUND_REQUESTS = REGISTRY.counter(
+    "whatsapp_outbound_requests_total", "Envíos a la Graph API por código de estado ('error' = falla de red)", ("status",))
+OUTBOUND_LATENCY = REGISTRY.histogram(
+    "whatsapp_outbound_latency_seconds", "Latencia de cada intento de envío a la Graph API")
+LOOP_LAG = REGISTRY.histogram(
+    "whatsapp_event_loop_lag_seconds", "Demora del event loop en despertar respecto del intervalo programado", buckets=LAG_BUCKETS)
+LOOP_LAG_LAST = REGISTRY.gauge(
+    "whatsapp_event_loop_lag_last_seconds", "Última demora medida del event loop")
+
+
+class LoopLagMonitor:
+    """
+    Mide el lag del event loop: duerme 'interval' segundos y registra cuánto tardó de más.
+
+    Args:
+        interval (float): Segundos entre mediciones.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - start - self.interval)
+            LOOP_LAG.observe(lag)
+            LOOP_LAG_LAST.set(lag)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Valores posibles de la etiqueta 'type' (cardinalidad acotada: lo desconocido se cuenta como 'other')
+MESSAGE_TYPES = frozenset(kind.value for kind in MessageType)
+INTERACTIVE_TYPES = frozenset({"button_reply", "list_reply"})
+
+
+def webhook_type(payload: WebhookPayload) -> str:
+    """
+    Etiqueta 'type' de un webhook: tipo del primer mensaje (button_reply/list_reply si es interactivo), 'status' u 'other'.
+    Los tipos que no están en MessageType (los envía Meta, no se controlan) se cuentan como 'other'.
+    """
+    kind = "other"
+    for entry in payload.entry:
+        for change in entry.changes:
+            value = change.value
+            if value.messages:
+                message = value.messages[0]
+                if message.interactive is not None and message.interactive.type in INTERACTIVE_TYPES:
+                    return message.interactive.type
+                message_type = getattr(message.type, "value", message.type)
+                return message_type if message_type in MESSAGE_TYPES else "other"
+            if value.statuses:
+                kind = "status"
+    return kind
+
+
+def create_loop_lag_monitor(settings: Settings) -> Optional[LoopLagMonitor]:
+    """Crea e inicia el monitor de lag del event loop; None si METRICS_ENABLED es False o el intervalo es 0."""
+    if not settings.METRICS_ENABLED or settings.METRICS_LOOP_LAG_INTERVAL <= 0:
+        return None
+    monitor = LoopLagMonitor(settings.METRICS_LOOP_LAG_INTERVAL)
+    monitor.start()
+    return monitor
@@ -0,0 +1,389 @@
+'''
+outbox.py
+Outbox durable para los mensajes salientes (patrón write-ahead).
+Cada envío se registra en el outbox antes de salir hacia la Graph API y se marca como enviado
+al recibir respuesta. Si el proceso se reinicia o Graph no responde, los mensajes que quedaron
+sin marcar se reenvían desde el archivo SQLite.
+    + Escritura en el camino del webhook: solo se agrega a un buffer en memoria (sub-milisegundo).
+    + Un flusher escribe los buffers en lotes, en una sola transacción (SQLite en modo WAL),
+      en un hilo aparte para no bloquear el event loop.
+    + Si un mensaje se envía antes del flush, su alta y su baja se cancelan en memoria y no tocan disco.
+    + Un worker de replay reenvía periódicamente (y al arrancar) los mensajes pendientes,
+      en orden dentro de cada destinatario.
+    + Cada fila tiene un dueño (claimed_by/claimed_at): el alta queda reclamada por el proceso que
+      la envía y el replay reclama las filas libres en una transacción antes de reenviarlas. Así
+      varios workers (modo prod) pueden compartir el archivo sin reenviar lo que otro está enviando.
+      Un reclamo más viejo que claim_ttl (proceso caído) se considera libre.
+La garantía es at-least-once: un corte entre el envío y el flush de su baja puede reenviar un mensaje.
+'''
+import asyncio
+import os
+import sqlite3
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from app.config_setup.settings import Settings
+from app.services.dispatcher import ReplyDispatcher
+from app.utils.server import shared_by_workers
+from app.utils.utils import configure_logging
+
+
+# Configuración del logger
+logger = configure_logging(__name__)
+
+# Envío real: recibe los bytes del payload y el destinatario
+Sender = Callable[[bytes, Optional[str]], Awaitable[Any]]
+
+
+def is_permanent_rejection(error: BaseException) -> bool:
+    """Un 4xx (salvo 429) es un rechazo definitivo de Meta: reenviarlo no cambia el resultado."""
+    status_code = getattr(error, "status_code", None)
+    return status_code is not None and 400 <= status_code < 500 and status_code != 429
+
+
+class MessageOutbox:
+    """
+    Outbox de mensajes salientes respaldado por SQLite.
+
+    Args:
+        path (str): Archivo SQLite.
+        batch_size (int): Operaciones en buffer que disparan un flush inmediato.
+        flush_interval (float): Segundos máximos entre flushes.
+        replay_interval (float): Segundos entre pasadas del worker de replay.
+        replay_batch (int): Mensajes pendientes que se reenvían por pasada.
+        max_attempts (int): Reenvíos fallidos tras los cuales un mensaje se marca como muerto.
+        replay_concurrency (int): Destinatarios que se reenvían en paralelo.
+        claim_ttl (float): Segundos tras los cuales el reclamo de otro proceso se considera abandonado.
+        exclusive (bool): Único proceso que usa el archivo: al arrancar libera los reclamos de la ejecución anterior.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        batch_size: int = 100,
+        flush_interval: float = 0.05,
+        replay_interval: float = 30.0,
+        replay_batch: int = 100,
+        max_attempts: int = 10,
+        replay_concurrency: int = 8,
+        claim_ttl: float = 120.0,
+        exclusive: bool = True,
+    ):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.replay_interval = replay_interval
+        self.replay_batch = replay_batch
+        self.max_attempts = max_attempts
+        self.claim_ttl = claim_ttl
+        self.exclusive = exclusive
+        # Dueño de los reclamos de este proceso
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._dispatcher = ReplyDispatcher(replay_concurrency)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._sender: Optional[Sender] = None
+        # Buffers en memoria (se vacían en cada flush)
+        self._inserts: Dict[str, Tuple[str, str, float, Optional[str]]] = {}
+        self._deletes: List[str] = []
+        self._failures: List[str] = []
+        self._releases: List[str] = []
+        # Ids con un envío en curso: el replay no los toma
+        self._inflight: Set[str] = set()
+        self._db_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        # Métricas
+        self.added = 0
+        self.sent = 0
+        self.replayed = 0
+        self.flushes = 0
+        self.flush_seconds = 0.0
+
+    # ------------------------------------------------------------------
+    # SQLite (se ejecuta en un hilo con asyncio.to_thread)
+    # ------------------------------------------------------------------
+    def _open(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            " id TEXT PRIMARY KEY, recipient TEXT, payload TEXT NOT NULL, created REAL NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0, dead INTEGER NOT NULL DEFAULT 0,"
+            " claimed_by TEXT, claimed_at REAL)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(outbox)")}
+        if "claimed_by" not in columns:
+            # Archivo de una versión anterior, sin reclamos
+            self._conn.execute("ALTER TABLE outbox ADD COLUMN claimed_by TEXT")
+            self._conn.execute("ALTER TABLE outbox ADD COLUMN claimed_at REAL")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS outbox_pending ON outbox (dead, created)")
+        if self.exclusive:
+            self._conn.execute("UPDATE outbox SET claimed_by = NULL, claimed_at = NULL WHERE claimed_by IS NOT NULL")
+
+    def _write_batch(
+        self,
+        inserts: List[Tuple[str, str, str, float, Optional[str], Optional[float]]],
+        deletes: List[Tuple[str]],
+        failures: List[Tuple[int, str]],
+        releases: List[Tuple[str, str]],
+    ) -> None:
+        conn = self._conn
+        conn.execute("BEGIN")
+        try:
+            if inserts:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO outbox (id, recipient, payload, created, claimed_by, claimed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    inserts,
+                )
+            if failures:
+                conn.executemany(
+                    "UPDATE outbox SET attempts = attempts + 1, dead = (attempts + 1 >= ?), claimed_by = NULL, claimed_at = NULL"
+                    " WHERE id = ?",
+                    failures,
+                )
+            if releases:
+                conn.executemany("UPDATE outbox SET claimed_by = NULL, claimed_at = NULL WHERE id = ? AND claimed_by = ?", releases)
+            if deletes:
+                conn.executemany("DELETE FROM outbox WHERE id = ?", deletes)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _claim_pending(self, limit: int) -> List[Tuple[str, str, str]]:
+        """Reclama para este proceso hasta 'limit' pendientes libres (o con reclamo vencido), en orden de creación."""
+        conn = self._conn
+        now = time.time()
+        # BEGIN IMMEDIATE toma el lock de escritura: dos procesos no pueden reclamar la misma fila
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT id, recipient, payload FROM outbox"
+                " WHERE dead = 0 AND (claimed_by IS NULL OR claimed_at < ?) ORDER BY created LIMIT ?",
+                (now - self.claim_ttl, limit),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE outbox SET claimed_by = ?, claimed_at = ? WHERE id = ?", [(self.owner, now, row[0]) for row in rows]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return rows
+
+    def _count(self) -> Dict[str, int]:
+        pending, dead = self._conn.execute(
+            "SELECT COALESCE(SUM(dead = 0), 0), COALESCE(SUM(dead = 1), 0) FROM outbox"
+        ).fetchone()
+        return {"pending": pending, "dead": dead}
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------------------------------
+    async def start(self, sender: Sender) -> None:
+        """Abre el archivo, lanza el flusher y el worker de replay (que reenvía lo pendiente al arrancar)."""
+        self._sender = sender
+        await asyncio.to_thread(self._open)
+        counts = await asyncio.to_thread(self._count)
+        if counts["pending"]:
+            logger.warning("Outbox: %s mensajes pendientes de una ejecución anterior, se reenviarán.", counts["pending"])
+        self._tasks = [
+            asyncio.create_task(self._flush_loop(), name="outbox-flush"),
+            asyncio.create_task(self._replay_loop(), name="outbox-replay"),
+        ]
+        logger.info("Outbox iniciado en %s", self.path)
+
+    async def stop(self) -> None:
+        """Detiene los workers, escribe lo que quede en buffer y cierra el archivo."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._conn is not None:
+            await self.flush()
+            self._conn.close()
+            self._conn = None
+        logger.info("Outbox detenido.")
+
+    # ------------------------------------------------------------------
+    # Camino del webhook (sin I/O)
+    # ------------------------------------------------------------------
+    def add(self, body: bytes, to: Optional[str]) -> str:
+        """Registra un mensaje saliente (payload ya serializado) en el buffer y retorna su id en el outbox."""
+        outbox_id = uuid.uuid4().hex
+        self._inserts[outbox_id] = (to, body.decode("utf-8"), time.time(), self.owner)
+        self._inflight.add(outbox_id)
+        self.added += 1
+        self._maybe_wakeup()
+        return outbox_id
+
+    def mark_sent(self, outbox_id: str) -> None:
+        """El mensaje llegó a Graph: se borra del outbox (o nunca se escribe si seguía en buffer)."""
+        self._inflight.discard(outbox_id)
+        self.sent += 1
+        if self._inserts.pop(outbox_id, None) is None:
+            self._deletes.append(outbox_id)
+            self._maybe_wakeup()
+
+    def mark_failed(self, outbox_id: str, replay: bool = False) -> None:
+        """El envío falló: el mensaje se libera y queda pendiente para el worker de replay (de cualquier proceso)."""
+        self._inflight.discard(outbox_id)
+        if replay:
+            self._failures.append(outbox_id)
+        else:
+            self._release(outbox_id)
+        self._maybe_wakeup()
+
+    def _release(self, outbox_id: str) -> None:
+        """Suelta el reclamo de este proceso sobre el mensaje (en el buffer si todavía no se escribió)."""
+        buffered = self._inserts.get(outbox_id)
+        if buffered is not None:
+            self._inserts[outbox_id] = (*buffered[:3], None)
+        else:
+            self._releases.append(outbox_id)
+
+    def _buffered(self) -> int:
+        return len(self._inserts) + len(self._deletes) + len(self._failures) + len(self._releases)
+
+    def _maybe_wakeup(self) -> None:
+        if self._buffered() >= self.batch_size:
+            self._wakeup.set()
+
+    # ------------------------------------------------------------------
+    # Workers
+    # ------------------------------------------------------------------
+    async def flush(self) -> None:
+        """Escribe los buffers en una única transacción."""
+        if not self._buffered() or self._conn is None:
+            return
+        inserts = [
+            (oid, to, body, created, owner, created if owner else None)
+            for oid, (to, body, created, owner) in self._inserts.items()
+        ]
+        deletes = [(oid,) for oid in self._deletes]
+        failures = [(self.max_attempts, oid) for oid in self._failures]
+        releases = [(oid, self.owner) for oid in self._releases]
+        pending = (self._inserts, self._deletes, self._failures, self._releases)
+        self._inserts, self._deletes, self._failures, self._releases = {}, [], [], []
+        start = time.perf_counter()
+        try:
+            async with self._db_lock:
+                await asyncio.to_thread(self._write_batch, inserts, deletes, failures, releases)
+        except BaseException:
+            # La transacción se deshizo: el lote vuelve a los buffers (delante de lo que llegó mientras tanto)
+            # para el próximo flush. Una baja de un alta devuelta se escribe después de ella, en la misma transacción.
+            old_inserts, old_deletes, old_failures, old_releases = pending
+            self._inserts = {**old_inserts, **self._inserts}
+            self._deletes = old_deletes + self._deletes
+            self._failures = old_failures + self._failures
+            self._releases = old_releases + self._releases
+            raise
+        self.flushes += 1
+        self.flush_seconds += time.perf_counter() - start
+
+    async def _flush_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error("Outbox: error al escribir el lote: %s", e)
+
+    async def replay_pending(self) -> int:
+        """
+        Reclama y reenvía un lote de mensajes pendientes, en orden por destinatario.
+
+        Returns:
+            int: Mensajes reenviados con éxito.
+        """
+        await self.flush()
+        async with self._db_lock:
+            rows = await asyncio.to_thread(self._claim_pending, self.replay_batch)
+        conversations: Dict[str, List[Tuple[str, Optional[str], bytes]]] = {}
+        for outbox_id, recipient, body in rows:
+            if outbox_id in self._inflight:
+                continue
+            self._inflight.add(outbox_id)
+            conversations.setdefault(recipient or "", []).append((outbox_id, recipient, body.encode("utf-8")))
+        if not conversations:
+            return 0
+
+        replayed_before = self.replayed
+        attempted: Set[str] = set()
+
+        async def resend(item: Tuple[str, Optional[str], bytes]) -> None:
+            outbox_id, recipient, body = item
+            attempted.add(outbox_id)
+            try:
+                await self._sender(body, recipient)
+            except Exception as e:
+                if is_permanent_rejection(e):
+                    # Igual que en el envío en vivo: no vuelve a la cola de replay
+                    logger.warning("Outbox: mensaje %s rechazado por Graph (%s), se descarta.", outbox_id, e.status_code)
+                    self.mark_sent(outbox_id)
+                else:
+                    self.mark_failed(outbox_id, replay=True)
+                raise
+            self.mark_sent(outbox_id)
+            self.replayed += 1
+
+        await self._dispatcher.dispatch(conversations, resend)
+        # Los que no llegaron a intentarse (conversación cortada por un fallo previo) vuelven a quedar libres
+        for items in conversations.values():
+            for outbox_id, _, _ in items:
+                self._inflight.discard(outbox_id)
+                if outbox_id not in attempted:
+                    self._releases.append(outbox_id)
+        await self.flush()
+        return self.replayed - replayed_before
+
+    async def _replay_loop(self) -> None:
+        while True:
+            try:
+                replayed = await self.replay_pending()
+                if replayed:
+                    logger.info("Outbox: %s mensajes pendientes reenviados.", replayed)
+            except Exception as e:
+                logger.error("Outbox: error en el replay: %s", e)
+            await asyncio.sleep(self.replay_interval)
+
+    async def stats(self) -> Dict[str, Any]:
+        counts = {"pending": 0, "dead": 0}
+        if self._conn is not None:
+            async with self._db_lock:
+                counts = await asyncio.to_thread(self._count)
+        return {
+            "buffered": self._buffered(),
+            "inflight": len(self._inflight),
+            "pending": counts["pending"],
+            "dead": counts["dead"],
+            "added": self.added,
+            "sent": self.sent,
+            "replayed": self.replayed,
+            "flushes": self.flushes,
+            "flush_ms_avg": round(self.flush_seconds / self.flushes * 1000, 3) if self.flushes else 0.0,
+        }
+
+
+def create_outbox(settings: Settings) -> Optional[MessageOutbox]:
+    """Construye el outbox desde los Settings, o None si OUTBOX_ENABLED es False."""
+    if not settings.OUTBOX_ENABLED:
+        return None
+    return MessageOutbox(
+        path=settings.OUTBOX_PATH,
+        batch_size=settings.OUTBOX_BATCH_SIZE,
+        flush_interval=settings.OUTBOX_FLUSH_INTERVAL,
+        replay_interval=settings.OUTBOX_REPLAY_INTERVAL,
+        max_attempts=settings.OUTBOX_MAX_ATTEMPTS,
+        claim_ttl=settings.OUTBOX_CLAIM_TTL,
+        exclusive=not shared_by_workers(settings),
+    )
@@ -0,0 +1,172 @@
+'''
+rate_limiter.py
+Limitador de tasa saliente (token bucket) para la Graph API de Meta.
+Una ráfaga de mensajes entrantes no debe convertirse en una ráfaga de POST salientes:
+Meta limita el throughput por número de WhatsApp Business y la frecuencia de mensajes
+hacia un mismo usuario, y los excesos vuelven como 429.
+Cada envío toma un token del balde del destinatario y otro del balde global; si no hay
+tokens, el envío espera (asyncio.sleep) en lugar de rechazarse.
+'''
+import asyncio
+import time
+from collections import OrderedDict
+from itertools import islice
+from typing import Any, Dict, Optional
+
+from app.config_setup.settings import Settings
+from app.utils.utils import configure_logging
+
+
+# Configuración del logger
+logger = configure_logging(__name__)
+
+
+class TokenBucket:
+    """
+    Balde de tokens con recarga continua.
+
+    Args:
+        rate (float): Tokens que se recargan por segundo.
+        capacity (float): Tokens máximos acumulables (ráfaga permitida).
+    """
+
+    __slots__ = ("rate", "capacity", "tokens", "updated", "_lock")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock: Optional[asyncio.Lock] = None
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def level(self) -> float:
+        """Tokens disponibles en este instante."""
+        self._refill()
+        return self.tokens
+
+    @property
+    def idle(self) -> bool:
+        """True si el balde está lleno y nadie espera: puede descartarse sin perder estado."""
+        return self.level() >= self.capacity and not (self._lock and self._lock.locked())
+
+    async def acquire(self, tokens: float = 1.0) -> float:
+        """
+        Toma 'tokens' del balde esperando lo necesario. Los que esperan se atienden en orden (FIFO).
+
+        Returns:
+            float: Segundos esperados.
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        start = time.monotonic()
+        async with self._lock:
+            self._refill()
+            while self.tokens < tokens:
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= tokens
+        return time.monotonic() - start
+
+
+class OutboundRateLimiter:
+    """
+    Limitador con un balde global y un balde por número de destino.
+
+    Args:
+        global_rate (float): Mensajes por segundo para todo el número de WhatsApp Business.
+        global_burst (float): Ráfaga global permitida.
+        per_number_rate (float): Mensajes por segundo hacia un mismo destinatario.
+        per_number_burst (float): Ráfaga permitida hacia un mismo destinatario.
+        max_tracked_numbers (int): Baldes por número que se conservan; los ociosos se descartan al superarlo.
+    """
+
+    def __init__(
+        self,
+        global_rate: float,
+        global_burst: float,
+        per_number_rate: float,
+        per_number_burst: float,
+        max_tracked_numbers: int = 10000,
+    ):
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.per_number_rate = per_number_rate
+        self.per_number_burst = per_number_burst
+        self.max_tracked_numbers = max_tracked_numbers
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        # Métricas
+        self.acquired = 0
+        self.delayed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _bucket_for(self, number: str) -> TokenBucket:
+        bucket = self._buckets.get(number)
+        if bucket is None:
+            bucket = self._buckets[number] = TokenBucket(self.per_number_rate, self.per_number_burst)
+            self._evict_idle()
+        else:
+            self._buckets.move_to_end(number)
+        return bucket
+
+    def _evict_idle(self) -> None:
+        """Descarta los baldes más antiguos que estén llenos (equivalen a uno nuevo)."""
+        excess = len(self._buckets) - self.max_tracked_numbers
+        if excess <= 0:
+            return
+        for number in list(islice(self._buckets, excess * 2)):
+            if excess <= 0:
+                break
+            if self._buckets[number].idle:
+                del self._buckets[number]
+                excess -= 1
+
+    async def acquire(self, number: Optional[str]) -> float:
+        """
+        Espera hasta que haya tokens para enviar a 'number' y en el balde global.
+
+        Returns:
+            float: Segundos esperados.
+        """
+        waited = 0.0
+        if number:
+            waited += await self._bucket_for(number).acquire()
+        waited += await self.global_bucket.acquire()
+        self.acquired += 1
+        if waited > 0.001:
+            self.delayed += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+            logger.debug("Envío a %s demorado %.3fs por el limitador de tasa.", number, waited)
+        return waited
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "global_tokens": round(self.global_bucket.level(), 3),
+            "global_rate": self.global_bucket.rate,
+            "global_burst": self.global_bucket.capacity,
+            "per_number_rate": self.per_number_rate,
+            "per_number_burst": self.per_number_burst,
+            "tracked_numbers": len(self._buckets),
+            "throttled_numbers": sum(1 for b in self._buckets.values() if b.level() < 1),
+            "acquired": self.acquired,
+            "delayed": self.delayed,
+            "wait_ms_avg": round(self.wait_total / self.delayed * 1000, 3) if self.delayed else 0.0,
+            "wait_ms_max": round(self.wait_max * 1000, 3),
+        }
+
+
+def create_rate_limiter(settings: Settings) -> Optional[OutboundRateLimiter]:
+    """Construye el limitador desde los Settings, o None si RATE_LIMIT_ENABLED es False."""
+    if not settings.RATE_LIMIT_ENABLED:
+        return None
+    return OutboundRateLimiter(
+        global_rate=settings.RATE_LIMIT_GLOBAL_PER_SECOND,
+        global_burst=settings.RATE_LIMIT_GLOBAL_BURST,
+        per_number_rate=settings.RATE_LIMIT_PER_NUMBER_PER_SECOND,
+        per_number_burst=settings.RATE_LIMIT_PER_NUMBER_BURST,
+    )
@@ -0,0 +1,183 @@
+'''
+resilience.py
+Políticas de resiliencia para los envíos a la Graph API:
+    + RetryPolicy: reintentos para estados transitorios (429, 5xx) y errores de red, con backoff
+      exponencial acotado, jitter completo y respeto del header Retry-After.
+    + CircuitBreaker: si Graph falla de forma sostenida, el circuito se abre y los envíos fallan
+      de inmediato durante un tiempo, en lugar de acumular tareas esperando conexiones muertas.
+'''
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, FrozenSet, Optional
+
+from app.config_setup.settings import Settings
+from app.utils.utils import configure_logging
+
+
+# Configuración del logger
+logger = configure_logging(__name__)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Interpreta el header Retry-After (segundos o fecha HTTP).
+
+    Returns:
+        Optional[float]: Segundos a esperar, o None si el header no existe o no es válido.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """
+    Backoff exponencial con jitter completo: espera = random(0, min(max_delay, base_delay * 2**intento)).
+
+    Args:
+        max_attempts (int): Intentos totales (1 = sin reintentos).
+        base_delay (float): Espera base en segundos.
+        max_delay (float): Tope de la espera calculada.
+        max_retry_after (float): Retry-After máximo que se acepta esperar; si Meta pide más, no se reintenta.
+        retry_statuses (FrozenSet[int]): Códigos HTTP que se reintentan.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        max_retry_after: float = 30.0,
+        retry_statuses: FrozenSet[int] = frozenset({429, 500, 502, 503, 504}),
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self.retry_statuses = retry_statuses
+        # Métricas
+        self.retries = 0
+        self.gave_up = 0
+
+    def is_retryable_status(self, status_code: int) -> bool:
+        return status_code in self.retry_statuses
+
+    def next_delay(self, attempt: int, retry_after: Optional[float] = None) -> Optional[float]:
+        """
+        Calcula la espera antes del intento 'attempt + 1'.
+
+        Args:
+            attempt (int): Intento que acaba de fallar (desde 1).
+            retry_after (Optional[float]): Segundos pedidos por el servidor, si los hay.
+
+        Returns:
+            Optional[float]: Segundos a esperar, o None si no corresponde reintentar.
+        """
+        if attempt >= self.max_attempts:
+            self.gave_up += 1
+            return None
+        if retry_after is not None:
+            if retry_after > self.max_retry_after:
+                self.gave_up += 1
+                return None
+            delay = retry_after
+        else:
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        self.retries += 1
+        return delay
+
+    def stats(self) -> Dict[str, Any]:
+        return {"max_attempts": self.max_attempts, "retries": self.retries, "gave_up": self.gave_up}
+
+
+class CircuitBreaker:
+    """
+    Circuito de tres estados: closed -> open (tras 'failure_threshold' fallos seguidos)
+    -> half_open (pasado 'reset_timeout', deja pasar un envío de prueba) -> closed u open.
+
+    Args:
+        failure_threshold (int): Fallos consecutivos que abren el circuito.
+        reset_timeout (float): Segundos que el circuito permanece abierto.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._probe_started = 0.0
+        # Métricas
+        self.rejected = 0
+        self.times_opened = 0
+
+    def allow(self) -> bool:
+        """Retorna True si el envío puede intentarse."""
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                self.rejected += 1
+                return False
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+        if self.state == self.HALF_OPEN:
+            # Si el envío de prueba nunca informó resultado (p. ej. tarea cancelada), se permite otro
+            probe_stale = time.monotonic() - self._probe_started >= self.reset_timeout
+            if self._probe_in_flight and not probe_stale:
+                self.rejected += 1
+                return False
+            self._probe_in_flight = True
+            self._probe_started = time.monotonic()
+        return True
+
+    def record_success(self) -> None:
+        if self.state != self.CLOSED:
+            logger.info("Circuito de la Graph API cerrado: el envío de prueba fue exitoso.")
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.times_opened += 1
+                logger.error("Circuito de la Graph API abierto tras %s fallos: se rechazan envíos por %ss.", self.failures, self.reset_timeout)
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+        }
+
+
+def create_retry_policy(settings: Settings) -> RetryPolicy:
+    return RetryPolicy(
+        max_attempts=settings.RETRY_MAX_ATTEMPTS,
+        base_delay=settings.RETRY_BASE_DELAY,
+        max_delay=settings.RETRY_MAX_DELAY,
+        max_retry_after=settings.RETRY_MAX_RETRY_AFTER,
+    )
+
+
+def create_circuit_breaker(settings: Settings) -> CircuitBreaker:
+    return CircuitBreaker(
+        failure_threshold=settings.CIRCUIT_FAILURE_THRESHOLD,
+        reset_timeout=settings.CIRCUIT_RESET_TIMEOUT,
+    )
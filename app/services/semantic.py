@@ -0,0 +1,229 @@
+'''
+semantic.py
+Búsqueda semántica local sobre los documentos de KNOWLEDGE_PATH (complementa el índice BM25 de knowledge.py).
+    + Embeddings por hashing de n-gramas (palabras y n-gramas de caracteres): sin modelo ni red,
+      tolera errores de tipeo y variantes de una palabra ('reservo', 'reserva', 'reservas').
+    + Los embeddings de todos los fragmentos forman una única matriz float32 contigua guardada en
+      un .npy y abierta con mmap: una consulta es un producto matriz-vector y un argpartition.
+    + La caché se invalida por el hash del contenido de cada documento: al cambiar un documento
+      solo se recalculan sus fragmentos; las filas del resto se copian de la matriz anterior.
+Requiere 'numpy'.
+'''
+import json
+import os
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.config_setup.settings import Settings
+from app.services.knowledge import Chunk, SearchHit, chunk_markdown, tokenize
+from app.utils.utils import configure_logging
+
+
+# Configuración del logger
+logger = configure_logging(__name__)
+
+# Se incrementa cuando cambia el embedder o el formato de la caché (invalida los archivos guardados)
+CACHE_VERSION = 1
+MATRIX_FILE = "embeddings.npy"
+MANIFEST_FILE = "manifest.json"
+
+
+class HashedNgramEmbedder:
+    """
+    Embedder por feature hashing: cada palabra y cada n-grama de caracteres se proyecta a una
+    posición (crc32 módulo dim) con signo, con frecuencia sublineal y normalización L2.
+
+    Args:
+        dim (int): Dimensión de los vectores.
+        ngram_range (Tuple[int, int]): Largos mínimo y máximo de los n-gramas de caracteres.
+    """
+
+    def __init__(self, dim: int = 512, ngram_range: Tuple[int, int] = (3, 5)):
+        self.dim = dim
+        self.ngram_range = ngram_range
+
+    def params(self) -> Dict[str, Any]:
+        return {"embedder": "hashed-ngram", "dim": self.dim, "ngram_range": list(self.ngram_range)}
+
+    def features(self, text: str) -> List[str]:
+        low, high = self.ngram_range
+        features = []
+        for word in tokenize(text):
+            features.append(word)
+            padded = f"<{word}>"
+            for n in range(low, high + 1):
+                features.extend(f"#{padded[i:i + n]}" for i in range(len(padded) - n + 1))
+        return features
+
+    def embed(self, text: str) -> np.ndarray:
+        """Vector float32 de norma 1 (o de ceros si el texto no tiene términos)."""
+        features = self.features(text)
+        vector = np.zeros(self.dim, dtype=np.float32)
+        if not features:
+            return vector
+        hashes = np.fromiter((zlib.crc32(feature.encode("utf-8")) for feature in features), dtype=np.uint32, count=len(features))
+        signs = np.where(hashes & 0x80000000, -1.0, 1.0)
+        counts = np.bincount(hashes % self.dim, weights=signs, minlength=self.dim)
+        vector[:] = np.sign(counts) * np.log1p(np.abs(counts))
+        norm = float(np.linalg.norm(vector))
+        if norm > 0:
+            vector /= norm
+        return vector
+
+    def embed_many(self, texts: List[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            matrix[row] = self.embed(text)
+        return matrix
+
+
+class SemanticIndex:
+    """
+    Matriz de embeddings de los fragmentos (una fila por fragmento) y búsqueda por similitud coseno.
+
+    Args:
+        chunks (List[Chunk]): Fragmentos, en el orden de las filas de la matriz.
+        matrix (np.ndarray): Matriz float32 (fragmentos x dim), normalmente abierta con mmap.
+        embedder (HashedNgramEmbedder): Embedder con el que se generó la matriz.
+    """
+
+    def __init__(self, chunks: List[Chunk], matrix: np.ndarray, embedder: HashedNgramEmbedder):
+        self.chunks = chunks
+        self.matrix = matrix
+        self.embedder = embedder
+        # Métricas de la última carga
+        self.reused_documents = 0
+        self.embedded_documents = 0
+
+    def search(self, query: str, top_k: int = 3) -> List[SearchHit]:
+        """Fragmentos más similares a la consulta: un producto matriz-vector y un argpartition."""
+        if not self.chunks:
+            return []
+        vector = self.embedder.embed(query)
+        if not vector.any():
+            return []
+        scores = self.matrix @ vector
+        k = min(top_k, len(scores))
+        best = np.argpartition(scores, -k)[-k:]
+        best = best[np.argsort(scores[best])[::-1]]
+        return [SearchHit(self.chunks[i], float(scores[i])) for i in best]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "chunks": len(self.chunks),
+            "dim": self.embedder.dim,
+            "matrix_bytes": int(self.matrix.nbytes),
+            "reused_documents": self.reused_documents,
+            "embedded_documents": self.embedded_documents,
+        }
+
+
+def _read_cache(cache_dir: str, params: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Optional[np.ndarray]]:
+    """Manifiesto y matriz (mmap) guardados; (None, None) si faltan, están dañados o son de otros parámetros."""
+    try:
+        with open(os.path.join(cache_dir, MANIFEST_FILE), encoding="utf-8") as file:
+            manifest = json.load(file)
+        if manifest.get("params") != params:
+            return None, None
+        matrix = np.load(os.path.join(cache_dir, MATRIX_FILE), mmap_mode="r")
+    except FileNotFoundError:
+        return None, None
+    except Exception as e:
+        logger.warning("Caché semántica inválida en %s: %s", cache_dir, e)
+        return None, None
+    if matrix.ndim != 2 or matrix.shape != (len(manifest["chunks"]), params["dim"]) or matrix.dtype != np.float32:
+        return None, None
+    return manifest, matrix
+
+
+def _write_cache(cache_dir: str, manifest: Dict[str, Any], matrix: np.ndarray) -> None:
+    """Escribe matriz y manifiesto de forma atómica (archivo temporal + os.replace; el manifiesto al final)."""
+    os.makedirs(cache_dir, exist_ok=True)
+    matrix_path = os.path.join(cache_dir, MATRIX_FILE)
+    with open(f"{matrix_path}.tmp", "wb") as file:
+        np.save(file, matrix)
+    os.replace(f"{matrix_path}.tmp", matrix_path)
+    manifest_path = os.path.join(cache_dir, MANIFEST_FILE)
+    with open(f"{manifest_path}.tmp", "w", encoding="utf-8") as file:
+        json.dump(manifest, file, ensure_ascii=False)
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+
+
+def load_or_build_semantic_index(
+    documents: Dict[str, str],
+    hashes: Dict[str, str],
+    cache_dir: str,
+    chunk_chars: int,
+    embedder: Optional[HashedNgramEmbedder] = None,
+) -> SemanticIndex:
+    """
+    Abre la matriz guardada con mmap si ningún documento cambió. Si no, recalcula solo los
+    documentos nuevos o modificados, copia las filas del resto y guarda la matriz nueva.
+    """
+    embedder = embedder or HashedNgramEmbedder()
+    params = {**embedder.params(), "version": CACHE_VERSION, "chunk_chars": chunk_chars}
+    manifest, matrix = _read_cache(cache_dir, params) if cache_dir else (None, None)
+    previous = manifest["documents"] if manifest else {}
+
+    if manifest is not None and {source: meta["hash"] for source, meta in previous.items()} == hashes:
+        index = SemanticIndex([Chunk(*item) for item in manifest["chunks"]], matrix, embedder)
+        index.reused_documents = len(previous)
+        logger.info("Índice semántico cargado de %s (%d fragmentos, mmap).", cache_dir, len(index.chunks))
+        return index
+
+    start = time.perf_counter()
+    chunks: List[Chunk] = []
+    blocks: List[np.ndarray] = []
+    documents_meta: Dict[str, Dict[str, Any]] = {}
+    reused = embedded = 0
+    for source, text in documents.items():
+        old = previous.get(source)
+        if old is not None and old["hash"] == hashes[source]:
+            first, count = old["start"], old["count"]
+            doc_chunks = [Chunk(*item) for item in manifest["chunks"][first:first + count]]
+            rows = np.array(matrix[first:first + count])
+            reused += 1
+        else:
+            doc_chunks = chunk_markdown(source, text, chunk_chars)
+            rows = embedder.embed_many([f"{chunk.title} {chunk.text}" for chunk in doc_chunks])
+            embedded += 1
+        documents_meta[source] = {"hash": hashes[source], "start": len(chunks), "count": len(doc_chunks)}
+        chunks.extend(doc_chunks)
+        blocks.append(rows)
+    # Se libera el mmap anterior antes de reemplazar el archivo
+    matrix = None
+    new_matrix = np.ascontiguousarray(np.concatenate(blocks) if blocks else np.zeros((0, embedder.dim)), dtype=np.float32)
+    logger.info(
+        "Índice semántico actualizado: %d documentos recalculados, %d reutilizados, %d fragmentos en %.1f ms.",
+        embedded, reused, len(chunks), (time.perf_counter() - start) * 1000,
+    )
+
+    if cache_dir:
+        new_manifest = {
+            "params": params,
+            "documents": documents_meta,
+            "chunks": [(chunk.source, chunk.title, chunk.text) for chunk in chunks],
+        }
+        try:
+            _write_cache(cache_dir, new_manifest, new_matrix)
+            new_matrix = np.load(os.path.join(cache_dir, MATRIX_FILE), mmap_mode="r")
+        except OSError as e:
+            logger.warning("No se pudo guardar la caché semántica en %s: %s", cache_dir, e)
+    index = SemanticIndex(chunks, new_matrix, embedder)
+    index.reused_documents = reused
+    index.embedded_documents = embedded
+    return index
+
+
+def create_semantic_index(settings: Settings, documents: Dict[str, str], hashes: Dict[str, str]) -> SemanticIndex:
+    """Construye (o abre de la caché) el índice semántico de los documentos ya leídos de KNOWLEDGE_PATH."""
+    return load_or_build_semantic_index(
+        documents,
+        hashes,
+        settings.SEMANTIC_CACHE_DIR,
+        settings.KNOWLEDGE_CHUNK_CHARS,
+        HashedNgramEmbedder(settings.SEMANTIC_DIM),
+    )
@@ -0,0 +1,410 @@
+'''
+sessions.py
+Almacén de sesiones de conversación: en qué estado del grafo (app/services/conversation.py)
+está cada usuario. Todos los backends cumplen la misma interfaz (SessionStore): una lectura y
+una escritura por mensaje, y get_many/set_many para actualizar un lote en una sola ida.
+Backends disponibles:
+    + memory: registros con __slots__ en un diccionario ordenado por último uso, con TTL y
+      límite de cantidad (LRU). Consulta y actualización O(1). Un solo proceso.
+    + sqlite: archivo local en modo WAL con mmap, compartido entre workers de la misma máquina.
+      Las consultas corren en un hilo (asyncio.to_thread) para no bloquear el event loop.
+    + redis: servidor con protocolo Redis (GET/SET EX, MGET y pipeline), compartido entre
+      máquinas. Requiere 'redis'; en pruebas acepta un cliente local como fakeredis.
+Con más de un worker de uvicorn el backend memory no comparte estado: usar sqlite o redis.
+'''
+import asyncio
+import os
+import sqlite3
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Protocol
+
+from app.config_setup.settings import Settings
+from app.utils.utils import configure_logging
+
+
+# Configuración del logger
+logger = configure_logging(__name__)
+
+
+class Session:
+    """
+    Estado de la conversación de un usuario.
+
+    Args:
+        state (str): Nombre del estado actual en el grafo.
+        expires (Optional[float]): Instante de vencimiento según el reloj del backend
+            (None si el vencimiento lo administra el servidor, como en Redis).
+    """
+
+    __slots__ = ("state", "expires")
+
+    def __init__(self, state: str, expires: Optional[float]):
+        self.state = state
+        self.expires = expires
+
+    def __repr__(self) -> str:
+        return f"Session(state={self.state!r}, expires={self.expires!r})"
+
+
+class SessionStore(Protocol):
+    """Interfaz común de los backends de sesiones."""
+
+    async def get(self, user: str) -> Optional[Session]: ...
+
+    async def set(self, user: str, state: str) -> None: ...
+
+    async def get_many(self, users: Iterable[str]) -> Dict[str, Session]: ...
+
+    async def set_many(self, states: Dict[str, str]) -> None: ...
+
+    async def delete(self, user: str) -> None: ...
+
+    async def stats(self) -> Dict[str, Any]: ...
+
+    async def close(self) -> None: ...
+
+
+class MemorySessionStore:
+    """
+    Sesiones en memoria con TTL deslizante y límite de cantidad (LRU).
+
+    Args:
+        ttl (float): Segundos de inactividad tras los cuales una sesión vence.
+        max_sessions (int): Sesiones máximas; al superarlo se descarta la menos reciente.
+    """
+
+    def __init__(self, ttl: float, max_sessions: int):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        # Métricas
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+
+    async def get(self, user: str) -> Optional[Session]:
+        """Retorna la sesión vigente de 'user', o None si no existe o venció."""
+        session = self._sessions.get(user)
+        if session is None:
+            self.misses += 1
+            return None
+        if session.expires <= time.monotonic():
+            del self._sessions[user]
+            self.expired += 1
+            self.misses += 1
+            return None
+        self.hits += 1
+        return session
+
+    async def set(self, user: str, state: str) -> None:
+        """Guarda el estado de 'user' y renueva su vencimiento."""
+        now = time.monotonic()
+        self._put(user, state, now + self.ttl)
+        self._purge(now)
+
+    async def get_many(self, users: Iterable[str]) -> Dict[str, Session]:
+        """Sesiones vigentes de 'users' (los que no tienen sesión no aparecen)."""
+        sessions = {}
+        for user in users:
+            session = await self.get(user)
+            if session is not None:
+                sessions[user] = session
+        return sessions
+
+    async def set_many(self, states: Dict[str, str]) -> None:
+        now = time.monotonic()
+        for user, state in states.items():
+            self._put(user, state, now + self.ttl)
+        self._purge(now)
+
+    def _put(self, user: str, state: str, expires: float) -> None:
+        session = self._sessions.get(user)
+        if session is None:
+            self._sessions[user] = Session(state, expires)
+        else:
+            session.state = state
+            session.expires = expires
+            self._sessions.move_to_end(user)
+
+    async def delete(self, user: str) -> None:
+        self._sessions.pop(user, None)
+
+    def _purge(self, now: float) -> None:
+        """
+        Descarta las sesiones vencidas y las que excedan 'max_sessions'.
+        El orden por último uso coincide con el orden de vencimiento (TTL deslizante):
+        basta mirar el principio del diccionario, costo amortizado O(1).
+        """
+        sessions = self._sessions
+        while sessions:
+            user, session = next(iter(sessions.items()))
+            if session.expires > now:
+                break
+            del sessions[user]
+            self.expired += 1
+        while len(sessions) > self.max_sessions:
+            sessions.popitem(last=False)
+            self.evicted += 1
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def approx_bytes(self) -> int:
+        """Memoria aproximada: registros, claves y el diccionario (los nombres de estado son compartidos)."""
+        if not self._sessions:
+            return sys.getsizeof(self._sessions)
+        user, session = next(iter(self._sessions.items()))
+        per_session = sys.getsizeof(session) + sys.getsizeof(user) + sys.getsizeof(session.expires)
+        return sys.getsizeof(self._sessions) + per_session * len(self._sessions)
+
+    async def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "memory",
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "ttl_seconds": self.ttl,
+            "approx_bytes": self.approx_bytes(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
+
+    async def close(self) -> None:
+        self._sessions.clear()
+
+
+class SQLiteSessionStore:
+    """
+    Tabla SQLite (WAL, mmap) con el estado y el vencimiento (reloj de pared) de cada usuario.
+    Varios procesos uvicorn de la misma máquina pueden compartir el archivo.
+
+    Args:
+        path (str): Ruta del archivo SQLite.
+        ttl (float): Segundos de inactividad tras los cuales una sesión vence.
+        max_sessions (int): Sesiones máximas; en cada purga se descartan las más antiguas que sobren.
+        mmap_bytes (int): Bytes del archivo mapeados en memoria (lecturas sin copia al buffer de SQLite).
+        purge_every (int): Cada cuántas escrituras se purgan las sesiones vencidas y sobrantes.
+    """
+
+    def __init__(self, path: str, ttl: float, max_sessions: int, mmap_bytes: int = 64 * 1024 * 1024, purge_every: int = 1000):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.purge_every = purge_every
+        self._writes = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(f"PRAGMA mmap_size={int(mmap_bytes)}")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (user TEXT PRIMARY KEY, state TEXT NOT NULL, expires REAL NOT NULL) WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_expires ON sessions (expires)")
+        self._db_lock = asyncio.Lock()
+        # Métricas
+        self.hits = 0
+        self.misses = 0
+        self.purged = 0
+
+    # Las consultas corren en un hilo; el lock ordena el uso de la única conexión
+    # (una transacción de set_many no se mezcla con otra consulta).
+    async def _run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        async with self._db_lock:
+            return await asyncio.to_thread(fn, *args)
+
+    async def get(self, user: str) -> Optional[Session]:
+        row = await self._run(self._select_one, user)
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return Session(row[0], row[1])
+
+    async def set(self, user: str, state: str) -> None:
+        await self._run(self._upsert, {user: state})
+
+    async def get_many(self, users: Iterable[str]) -> Dict[str, Session]:
+        users = list(users)
+        if not users:
+            return {}
+        rows = await self._run(self._select_many, users)
+        self.hits += len(rows)
+        self.misses += len(users) - len(rows)
+        return {user: Session(state, expires) for user, state, expires in rows}
+
+    async def set_many(self, states: Dict[str, str]) -> None:
+        """Todas las actualizaciones en una sola transacción."""
+        if not states:
+            return
+        await self._run(self._upsert, states)
+
+    async def delete(self, user: str) -> None:
+        await self._run(self._delete, user)
+
+    def _select_one(self, user: str) -> Optional[tuple]:
+        return self._conn.execute(
+            "SELECT state, expires FROM sessions WHERE user = ? AND expires > ?", (user, time.time())
+        ).fetchone()
+
+    def _select_many(self, users: List[str]) -> List[tuple]:
+        placeholders = ",".join("?" * len(users))
+        return self._conn.execute(
+            f"SELECT user, state, expires FROM sessions WHERE user IN ({placeholders}) AND expires > ?",
+            (*users, time.time()),
+        ).fetchall()
+
+    def _upsert(self, states: Dict[str, str]) -> None:
+        expires = time.time() + self.ttl
+        conn = self._conn
+        conn.execute("BEGIN")
+        try:
+            conn.executemany(
+                "INSERT INTO sessions (user, state, expires) VALUES (?, ?, ?) "
+                "ON CONFLICT(user) DO UPDATE SET state = excluded.state, expires = excluded.expires",
+                [(user, state, expires) for user, state in states.items()],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._after_writes(len(states))
+
+    def _delete(self, user: str) -> None:
+        self._conn.execute("DELETE FROM sessions WHERE user = ?", (user,))
+
+    def _after_writes(self, count: int) -> None:
+        previous = self._writes
+        self._writes += count
+        if self._writes // self.purge_every != previous // self.purge_every:
+            self._purge()
+
+    def _purge(self) -> None:
+        conn = self._conn
+        purged = conn.execute("DELETE FROM sessions WHERE expires <= ?", (time.time(),)).rowcount
+        excess = conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] - self.max_sessions
+        if excess > 0:
+            purged += conn.execute(
+                "DELETE FROM sessions WHERE user IN (SELECT user FROM sessions ORDER BY expires LIMIT ?)", (excess,)
+            ).rowcount
+        self.purged += purged
+
+    def _count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM sessions WHERE expires > ?", (time.time(),)).fetchone()[0]
+
+    async def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "sqlite",
+            "sessions": await self._run(self._count),
+            "max_sessions": self.max_sessions,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "purged": self.purged,
+        }
+
+    async def close(self) -> None:
+        async with self._db_lock:
+            await asyncio.to_thread(self._conn.close)
+
+
+class RedisSessionStore:
+    """
+    Servidor con protocolo Redis: una clave por usuario con el nombre del estado y TTL (SET EX).
+    El vencimiento y el límite de memoria (maxmemory-policy) los administra el servidor.
+
+    Args:
+        url (str): URL del servidor (redis://host:port/db).
+        ttl (float): Segundos de inactividad tras los cuales una sesión vence.
+        prefix (str): Prefijo de las claves.
+        client: Cliente redis.asyncio ya creado (por ejemplo fakeredis.aioredis.FakeRedis() en pruebas).
+    """
+
+    def __init__(self, url: str, ttl: float, prefix: str = "wa:session:", client: Any = None):
+        if client is None:
+            try:
+                import redis.asyncio as redis_asyncio
+            except ImportError as e:
+                raise RuntimeError("SESSION_BACKEND=redis requiere el paquete 'redis' (pip install redis).") from e
+            client = redis_asyncio.from_url(url)
+        self.ttl = int(ttl)
+        self.prefix = prefix
+        self._redis = client
+        # Métricas
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _decode(value: Any) -> str:
+        return value.decode() if isinstance(value, bytes) else value
+
+    async def get(self, user: str) -> Optional[Session]:
+        value = await self._redis.get(f"{self.prefix}{user}")
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return Session(self._decode(value), None)
+
+    async def set(self, user: str, state: str) -> None:
+        await self._redis.set(f"{self.prefix}{user}", state, ex=self.ttl)
+
+    async def get_many(self, users: Iterable[str]) -> Dict[str, Session]:
+        """Un único MGET para todo el lote."""
+        users = list(users)
+        if not users:
+            return {}
+        values = await self._redis.mget([f"{self.prefix}{user}" for user in users])
+        sessions = {user: Session(self._decode(value), None) for user, value in zip(users, values) if value is not None}
+        self.hits += len(sessions)
+        self.misses += len(users) - len(sessions)
+        return sessions
+
+    async def set_many(self, states: Dict[str, str]) -> None:
+        """Un pipeline (sin MULTI) con un SET EX por usuario: una sola ida y vuelta."""
+        if not states:
+            return
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for user, state in states.items():
+                pipe.set(f"{self.prefix}{user}", state, ex=self.ttl)
+            await pipe.execute()
+
+    async def delete(self, user: str) -> None:
+        await self._redis.delete(f"{self.prefix}{user}")
+
+    async def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "redis",
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+
+def create_session_store(settings: Settings) -> SessionStore:
+    """Construye el almacén de sesiones según SESSION_BACKEND ('memory', 'sqlite' o 'redis')."""
+    backend_name = settings.SESSION_BACKEND.lower()
+    match backend_name:
+        case "memory":
+            store = MemorySessionStore(settings.SESSION_TTL_SECONDS, settings.SESSION_MAX_ENTRIES)
+        case "sqlite":
+            store = SQLiteSessionStore(
+                settings.SESSION_SQLITE_PATH,
+                settings.SESSION_TTL_SECONDS,
+                settings.SESSION_MAX_ENTRIES,
+                mmap_bytes=settings.SESSION_SQLITE_MMAP_BYTES,
+            )
+        case "redis":
+            store = RedisSessionStore(settings.REDIS_URL, settings.SESSION_TTL_SECONDS)
+        case _:
+            raise ValueError(f"SESSION_BACKEND no válido: {settings.SESSION_BACKEND}")
+    logger.info("Sesiones de conversación con backend: %s", backend_name)
+    return store
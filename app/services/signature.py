@@ -0,0 +1,76 @@
+'''
+signature.py
+Verificación de la firma X-Hub-Signature-256 de los webhooks de Meta.
+    + Meta firma el body crudo con HMAC-SHA256 usando el App Secret de la app y envía
+      'sha256=<hex>' en el header X-Hub-Signature-256.
+    + La firma se verifica sobre los bytes recibidos, antes de decodificar el JSON: un request
+      falsificado cuesta un solo hash, sin validación de Pydantic ni envíos a la Graph API.
+    + La comparación es de tiempo constante (hmac.compare_digest).
+'''
+import hashlib
+import hmac
+from typing import Any, Dict, Optional
+
+from app.config_setup.settings import Settings
+from app.utils.utils import configure_logging
+
+
+# Configuración del logger
+logger = configure_logging(__name__)
+
+SIGNATURE_HEADER = "X-Hub-Signature-256"
+_PREFIX = "sha256="
+
+
+def sign(secret: str, body: bytes) -> str:
+    """Valor del header X-Hub-Signature-256 para 'body' (el mismo que envía Meta)."""
+    return _PREFIX + hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+
+
+class SignatureVerifier:
+    """
+    Verifica las firmas HMAC-SHA256 de los webhooks con el App Secret.
+
+    Args:
+        secret (str): App Secret de la app de Meta (Panel de apps > Configuración > Básica).
+    """
+
+    def __init__(self, secret: str):
+        self._key = secret.encode("utf-8")
+        # Métricas
+        self.verified = 0
+        self.rejected = 0
+        self.missing = 0
+
+    def verify(self, body: bytes, header: Optional[str]) -> bool:
+        """True si 'header' es la firma de 'body'; un header ausente o mal formado es inválido."""
+        if not header:
+            self.missing += 1
+            self.rejected += 1
+            return False
+        provided = header[len(_PREFIX):] if header[:len(_PREFIX)].lower() == _PREFIX else None
+        try:
+            signature = bytes.fromhex(provided) if provided is not None else b""
+        except ValueError:
+            signature = b""
+        expected = hmac.digest(self._key, body, "sha256")
+        if hmac.compare_digest(expected, signature):
+            self.verified += 1
+            return True
+        self.rejected += 1
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "verified": self.verified,
+            "rejected": self.rejected,
+            "missing": self.missing,
+        }
+
+
+def create_signature_verifier(settings: Settings) -> Optional[SignatureVerifier]:
+    """Crea el verificador de firmas; None si APP_SECRET no está configurado (no se verifica)."""
+    if not settings.APP_SECRET:
+        logger.warning("APP_SECRET no configurado: POST /webhook acepta requests sin verificar la firma %s.", SIGNATURE_HEADER)
+        return None
+    return SignatureVerifier(settings.APP_SECRET)
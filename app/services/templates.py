@@ -0,0 +1,184 @@
+'''
+templates.py
+Plantillas precompiladas de los payloads salientes.
+Cada tipo de mensaje se serializa a bytes una sola vez (al arrancar), con marcadores en los
+campos dinámicos; en cada envío solo se intercalan el destinatario y los campos dinámicos ya
+codificados en JSON. Los menús fijos (por ejemplo, cada estado del grafo de conversación)
+quedan completos en bytes y por envío solo se agrega el número de destino.
+Se usa la misma codificación que httpx (UTF-8 sin escapes ASCII, separadores compactos),
+de modo que los bytes enviados son idénticos a los de post(json=payload).
+'''
+import json
+from json.encoder import encode_basestring
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.utils.utils import configure_logging
+
+
+# Configuración del logger
+logger = configure_logging(__name__)
+
+_MARKER = "__wa_field_{}__"
+
+# Un único encoder: json.dumps con opciones arma uno nuevo en cada llamada
+_ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), allow_nan=False)
+
+
+def dumps(value: Any) -> bytes:
+    """Serializa como httpx: JSON compacto en UTF-8."""
+    return _ENCODER.encode(value).encode("utf-8")
+
+
+class Field:
+    """Marca un campo dinámico dentro del payload de una plantilla."""
+
+    __slots__ = ("name",)
+
+    def __init__(self, name: str):
+        self.name = name
+
+
+class PayloadTemplate:
+    """
+    Payload serializado con huecos para los campos dinámicos.
+
+    Args:
+        name (str): Nombre de la plantilla.
+        payload (Dict[str, Any]): Payload con los campos dinámicos indicados como Field("nombre").
+    """
+
+    def __init__(self, name: str, payload: Dict[str, Any]):
+        self.name = name
+        self.fields: List[str] = []
+        encoded = dumps(self._mark(payload))
+        # Se corta el JSON en los marcadores: quedan fragmentos fijos y el orden de los campos
+        self._parts: List[bytes] = []
+        self._slots: List[str] = []
+        rest = encoded
+        while True:
+            positions = [(rest.find(self._marker_bytes(f)), f) for f in self.fields]
+            positions = [(pos, f) for pos, f in positions if pos >= 0]
+            if not positions:
+                self._parts.append(rest)
+                break
+            pos, field = min(positions)
+            self._parts.append(rest[:pos])
+            self._slots.append(field)
+            rest = rest[pos + len(self._marker_bytes(field)):]
+        missing = set(self.fields) - set(self._slots)
+        if missing:
+            raise ValueError(f"La plantilla '{name}' no contiene los campos: {missing}")
+
+    @staticmethod
+    def _marker_bytes(field: str) -> bytes:
+        return dumps(_MARKER.format(field))
+
+    def _mark(self, value: Any) -> Any:
+        """Reemplaza cada Field por su marcador y registra el nombre del campo."""
+        if isinstance(value, Field):
+            self.fields.append(value.name)
+            return _MARKER.format(value.name)
+        if isinstance(value, dict):
+            return {key: self._mark(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self._mark(item) for item in value]
+        return value
+
+    def render(self, values: Dict[str, bytes]) -> bytes:
+        """Une los fragmentos fijos con los valores ya codificados en JSON."""
+        parts = self._parts
+        if not self._slots:
+            return parts[0]
+        chunks = [parts[0]]
+        for i, field in enumerate(self._slots, start=1):
+            chunks.append(values[field])
+            chunks.append(parts[i])
+        return b"".join(chunks)
+
+
+class TemplateRegistry:
+    """
+    Registro de plantillas por nombre, con caché de fragmentos para valores constantes.
+    Las listas y diccionarios que se pasan como campos (por ejemplo MENU_BUTTONS) se codifican
+    una sola vez y se reutilizan mientras sean el mismo objeto: se asume que no se modifican.
+
+    Args:
+        max_constants (int): Valores constantes que se guardan codificados; los demás se codifican en cada envío.
+    """
+
+    def __init__(self, max_constants: int = 256):
+        self.max_constants = max_constants
+        self._templates: Dict[str, PayloadTemplate] = {}
+        self._constants: Dict[int, Tuple[Any, bytes]] = {}
+        # Métricas
+        self.renders = 0
+
+    def register(self, name: str, payload: Dict[str, Any]) -> PayloadTemplate:
+        template = self._templates[name] = PayloadTemplate(name, payload)
+        return template
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._templates
+
+    def _encode(self, value: Any) -> bytes:
+        if isinstance(value, str):
+            return encode_basestring(value).encode("utf-8")
+        cached = self._constants.get(id(value))
+        if cached is not None and cached[0] is value:
+            return cached[1]
+        encoded = dumps(value)
+        if len(self._constants) < self.max_constants:
+            # Se guarda la referencia para que el id no se reutilice mientras la entrada exista
+            self._constants[id(value)] = (value, encoded)
+        return encoded
+
+    def render(self, name: str, **values: Any) -> bytes:
+        """
+        Genera los bytes del payload 'name' con los campos dinámicos indicados.
+
+        Raises:
+            KeyError: Si la plantilla no existe o falta un campo.
+        """
+        self.renders += 1
+        return self._templates[name].render({field: self._encode(value) for field, value in values.items()})
+
+    def stats(self) -> Dict[str, Any]:
+        return {"templates": len(self._templates), "cached_constants": len(self._constants), "renders": self.renders}
+
+
+def text_payload(to: Any, body: Any) -> Dict[str, Any]:
+    return {"messaging_product": "whatsapp", "to": to, "type": "text", "text": {"body": body}}
+
+
+def buttons_payload(to: Any, body: Any, buttons: Any) -> Dict[str, Any]:
+    return {
+        "messaging_product": "whatsapp",
+        "to": to,
+        "type": "interactive",
+        "interactive": {
+            "type": "button",
+            "body": {"text": body},
+            "action": {"buttons": buttons},
+        },
+    }
+
+
+def state_template_name(state_name: str) -> str:
+    return f"state:{state_name}"
+
+
+def build_template_registry(graph: Optional[Any] = None) -> TemplateRegistry:
+    """
+    Crea el registro con las plantillas genéricas ('text' y 'buttons') y, si se indica un
+    grafo de conversación, una plantilla fija por cada estado con botones.
+    """
+    registry = TemplateRegistry()
+    registry.register("text", text_payload(Field("to"), Field("body")))
+    registry.register("buttons", buttons_payload(Field("to"), Field("body"), Field("buttons")))
+    if graph is not None:
+        for name, state in graph.states.items():
+            buttons = graph.buttons[name]
+            if buttons:
+                registry.register(state_template_name(name), buttons_payload(Field("to"), state.text, buttons))
+    logger.debug("Plantillas de payload precompiladas: %s", registry.stats())
+    return registry
@@ -5,28 +5,77 @@ Contiene la lógica para enviar mensajes de texto y botones interactivos a trav
 Además, contiene la lógica para procesar solicitudes POST de webhook de WhatsApp Business API.
 """
 
+import asyncio
 import logging
-import json
+import time
 from fastapi import HTTPException
 from app.config_setup.settings import settings
-from app.schemas.webhook_schema import WebhookPayload
+from app.schemas.webhook_schema import WebhookPayload, Message, MessageType
+from app.services.conversation import DEFAULT_GRAPH, ConversationEngine, Reply, create_conversation_engine
+from app.services.dedupe import MessageDeduplicator
+from app.services.dispatcher import ReplyDispatcher
+from app.services.metrics import OUTBOUND_LATENCY, OUTBOUND_REQUESTS
+from app.services.outbox import MessageOutbox, is_permanent_rejection
+from app.services.rate_limiter import OutboundRateLimiter
+from app.services.resilience import CircuitBreaker, RetryPolicy, parse_retry_after
+from app.services.templates import TemplateRegistry, build_template_registry, dumps
 from app.config_setup.config_settings import get_settings
 from app.utils.utils import configure_logging
-from typing import Dict, Any
+from app.utils.http_client import get_http_client
+from typing import Dict, Any, List, Optional, Tuple, Union
 import httpx
 
-# Menú de opciones
-MENU_BUTTONS = [
-    {"type": "reply", "reply": {"id": "pileta", "title": "Pileta"}},
-    {"type": "reply", "reply": {"id": "tenis", "title": "Tenis"}},
-    {"type": "reply", "reply": {"id": "sum", "title": "SUM"}}
-]
+# Menú de opciones (botones del estado inicial del grafo de conversación)
+MENU_BUTTONS = DEFAULT_GRAPH.buttons[DEFAULT_GRAPH.initial]
 
 logger = configure_logging(__name__)
 
+# Despachador por defecto (cuando no se inyecta el de la aplicación)
+_default_dispatcher: Optional[ReplyDispatcher] = None
+
+
+def get_default_dispatcher() -> ReplyDispatcher:
+    """Retorna el despachador del módulo, creándolo con DISPATCH_MAX_CONCURRENCY la primera vez."""
+    global _default_dispatcher
+    if _default_dispatcher is None:
+        _default_dispatcher = ReplyDispatcher(get_settings().DISPATCH_MAX_CONCURRENCY)
+    return _default_dispatcher
+
+
+# Motor de conversación por defecto (cuando no se inyecta el de la aplicación)
+_default_engine: Optional[ConversationEngine] = None
+
+
+def get_default_conversation_engine() -> ConversationEngine:
+    """Retorna el motor de conversación del módulo, creándolo desde los Settings la primera vez."""
+    global _default_engine
+    if _default_engine is None:
+        _default_engine = create_conversation_engine(get_settings())
+    return _default_engine
+
+
 class WhatsAppService:
-    def __init__(self):
+    def __init__(
+        self,
+        client: Optional[httpx.AsyncClient] = None,
+        rate_limiter: Optional[OutboundRateLimiter] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        outbox: Optional[MessageOutbox] = None,
+        templates: Optional[TemplateRegistry] = None,
+    ):
         self.settings = get_settings()
+        # Cliente HTTP inyectado; si no se provee se usa el cliente compartido de la app.
+        self._client = client
+        # Limitador de tasa saliente (None = sin pacing)
+        self.rate_limiter = rate_limiter
+        # Reintentos con backoff y circuito (None = un solo intento, sin circuito)
+        self.retry_policy = retry_policy
+        self.circuit_breaker = circuit_breaker
+        # Outbox durable (None = sin persistencia de los envíos)
+        self.outbox = outbox
+        # Plantillas de payload precompiladas (genéricas y una por estado del grafo de conversación)
+        self.templates = templates or build_template_registry(DEFAULT_GRAPH)
         self.headers = {
             "Authorization": f"Bearer {self.settings.ACCESS_TOKEN}",
             "Content-Type": "application/json",
@@ -44,42 +93,123 @@ class WhatsAppService:
         """
         if from_number == settings.RECIPIENT_WAID_1:
             from_number = settings.RECIPIENT_ITEM_1
-            logger.info(f"RECIPIENT_WAID_1: {settings.RECIPIENT_WAID_1} detectado, cambiando a RECIPIENT_ITEM_1: {settings.RECIPIENT_ITEM_1}")
-        else:
-            logger.info(f"RECIPIENT_WAID_1: {settings.RECIPIENT_WAID_1} no detectado.")
-        return from_number        
+            logger.debug("RECIPIENT_WAID_1: %s detectado, cambiando a RECIPIENT_ITEM_1: %s", settings.RECIPIENT_WAID_1, settings.RECIPIENT_ITEM_1)
+        return from_number
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Cliente HTTP con pool de conexiones keep-alive usado para los envíos."""
+        return self._client if self._client is not None else get_http_client()
 
-    async def send_message(self, payload: Dict[str, Any]) -> Dict:
+    @staticmethod
+    def _encode_payload(payload: Union[Dict[str, Any], bytes], to: Optional[str]) -> Tuple[bytes, Optional[str]]:
+        """Acepta un payload ya serializado (plantillas) o un diccionario, y retorna bytes y destinatario."""
+        if isinstance(payload, bytes):
+            return payload, to
+        return dumps(payload), to or payload.get("to")
+
+    async def send_message(self, payload: Union[Dict[str, Any], bytes], to: Optional[str] = None) -> Dict:
         """
-        Envía una solicitud POST a la API de WhatsApp Business.
+        Envía un mensaje a la API de WhatsApp Business registrándolo antes en el outbox.
+        Si el envío falla (reintentos agotados o circuito abierto), el mensaje queda
+        pendiente en el outbox y el worker de replay lo reenvía más tarde.
 
         Args:
-            payload (Dict[str, Any]): Cuerpo del mensaje a enviar.
+            payload (Dict[str, Any] | bytes): Cuerpo del mensaje, o sus bytes ya generados por una plantilla.
+            to (str, opcional): Destinatario (obligatorio si el payload son bytes).
 
         Returns:
             Dict: Respuesta de la API de WhatsApp Business.
         """
-        async with httpx.AsyncClient() as client:
+        body, to = self._encode_payload(payload, to)
+        if self.outbox is None:
+            return await self.deliver(body, to)
+        outbox_id = self.outbox.add(body, to)
+        try:
+            response = await self.deliver(body, to)
+        except BaseException as e:
+            if is_permanent_rejection(e):
+                self.outbox.mark_sent(outbox_id)
+            else:
+                self.outbox.mark_failed(outbox_id)
+            raise
+        self.outbox.mark_sent(outbox_id)
+        return response
+
+    async def deliver(self, payload: Union[Dict[str, Any], bytes], to: Optional[str] = None) -> Dict:
+        """
+        Envía una solicitud POST a la API de WhatsApp Business (sin pasar por el outbox).
+        Los estados transitorios (429, 5xx) y los errores de red se reintentan según la
+        RetryPolicy; con el circuito abierto el envío falla de inmediato.
+
+        Args:
+            payload (Dict[str, Any] | bytes): Cuerpo del mensaje, o sus bytes ya serializados.
+            to (str, opcional): Destinatario (para el limitador de tasa y los logs).
+
+        Returns:
+            Dict: Respuesta de la API de WhatsApp Business.
+        """
+        body, to = self._encode_payload(payload, to)
+        breaker = self.circuit_breaker
+        max_attempts = self.retry_policy.max_attempts if self.retry_policy is not None else 1
+        for attempt in range(1, max_attempts + 1):
+            # Fail fast: Graph está caído, no se ocupa una conexión ni una tarea esperando
+            if breaker is not None and not breaker.allow():
+                logger.error("Circuito de la Graph API abierto: mensaje no enviado.")
+                raise HTTPException(status_code=503, detail="Graph API no disponible (circuito abierto)")
+
+            # Pacing: espera tokens del destinatario y globales en lugar de provocar un 429
+            if self.rate_limiter is not None:
+                await self.rate_limiter.acquire(to)
+            retry_after = None
+            started = time.perf_counter()
             try:
-                logger.info(f"Enviando mensaje con payload: {json.dumps(payload, indent=2)}")
-                response = await client.post(
-                    self.base_url, headers=self.headers, json=payload
+                # El volcado del payload solo se arma si DEBUG está habilitado
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Enviando mensaje con payload: %s", body.decode("utf-8"))
+                # Se envían los bytes ya serializados (sin volver a codificar JSON por envío)
+                response = await self.client.post(
+                    self.base_url, headers=self.headers, content=body
                 )
+                OUTBOUND_LATENCY.observe(time.perf_counter() - started)
+                OUTBOUND_REQUESTS.inc((str(response.status_code),))
                 response.raise_for_status()
-                logger.info("Mensaje enviado exitosamente.")
+                if breaker is not None:
+                    breaker.record_success()
+                logger.info("Mensaje enviado exitosamente a %s.", to)
                 return response.json()
             except httpx.HTTPStatusError as e:
+                status_code = e.response.status_code
                 logger.error(
-                    f"Error HTTP al enviar el mensaje: {e.response.status_code} - {e.response.text}"
+                    "Error HTTP al enviar el mensaje (intento %d/%d): %s - %s", attempt, max_attempts, status_code, e.response.text
                 )
-                raise HTTPException(status_code=e.response.status_code, detail=e.response.text)
+                # Solo los 5xx indican que Graph está caído; 4xx y 429 no abren el circuito
+                if breaker is not None:
+                    if status_code >= 500:
+                        breaker.record_failure()
+                    else:
+                        breaker.record_success()
+                retryable = self.retry_policy is not None and self.retry_policy.is_retryable_status(status_code)
+                retry_after = parse_retry_after(e.response.headers.get("Retry-After"))
+                error = HTTPException(status_code=status_code, detail=e.response.text)
             except httpx.RequestError as e:
-                logger.error(f"Error de conexión o inesperado: {str(e)}")
-                raise HTTPException(status_code=500, detail="Error al enviar el mensaje")
+                OUTBOUND_LATENCY.observe(time.perf_counter() - started)
+                OUTBOUND_REQUESTS.inc(("error",))
+                logger.error("Error de conexión o inesperado (intento %s/%s): %s", attempt, max_attempts, e)
+                if breaker is not None:
+                    breaker.record_failure()
+                retryable = self.retry_policy is not None
+                error = HTTPException(status_code=500, detail="Error al enviar el mensaje")
+
+            delay = self.retry_policy.next_delay(attempt, retry_after) if retryable else None
+            if delay is None:
+                raise error
+            logger.warning("Reintentando el envío en %.2fs (intento %s/%s).", delay, attempt + 1, max_attempts)
+            await asyncio.sleep(delay)
 
     async def send_text_message_to_user(self, phone_number: str, text: str) -> Dict:
         """
-        Envía un mensaje de texto simple.
+        Envía un mensaje de texto simple (plantilla precompilada 'text').
 
         Args:
             phone_number (str): Número de teléfono del destinatario.
@@ -88,19 +218,14 @@ class WhatsAppService:
         Returns:
             Dict: Respuesta de la API de WhatsApp Business.
         """
-        logger.info(f"Control del formato del número de teléfono del remitente: {phone_number}")
         phone_number = self.re_format_number(phone_number)
-        payload = {
-            "messaging_product": "whatsapp",
-            "to": phone_number,
-            "type": "text",
-            "text": {"body": text},
-        }
-        return await self.send_message(payload)
+        body = self.templates.render("text", to=phone_number, body=text)
+        return await self.send_message(body, phone_number)
 
     async def send_interactive_buttons(self, phone_number: str, body_text: str, buttons: list) -> Dict:
         """
-        Envía botones interactivos.
+        Envía botones interactivos (plantilla precompilada 'buttons'; las listas fijas como
+        MENU_BUTTONS se serializan una sola vez).
 
         Args:
             phone_number (str): Número de teléfono del destinatario.
@@ -111,88 +236,124 @@ class WhatsAppService:
             Dict: Respuesta de la API de WhatsApp Business.
         """
         phone_number = self.re_format_number(phone_number)
-        payload = {
-            "messaging_product": "whatsapp",
-            "to": phone_number,
-            "type": "interactive",
-            "interactive": {
-                "type": "button",
-                "body": {"text": body_text},
-                "action": {"buttons": buttons},
-            },
-        }
-        return await self.send_message(payload)
-    
+        body = self.templates.render("buttons", to=phone_number, body=body_text, buttons=buttons)
+        return await self.send_message(body, phone_number)
 
+    async def send_template(self, phone_number: str, template: str) -> Dict:
+        """
+        Envía un mensaje fijo precompilado (por ejemplo, el menú de un estado de la conversación):
+        por envío solo se intercala el número de destino.
+
+        Args:
+            phone_number (str): Número de teléfono del destinatario.
+            template (str): Nombre de la plantilla registrada.
+
+        Returns:
+            Dict: Respuesta de la API de WhatsApp Business.
+        """
+        phone_number = self.re_format_number(phone_number)
+        body = self.templates.render(template, to=phone_number)
+        return await self.send_message(body, phone_number)
+
+
+def log_incoming_message(message: Message) -> bool:
+    """Registra un mensaje entrante. Retorna False si su tipo no tiene respuesta."""
+    match message.type:
+        case MessageType.TEXT if message.text is not None:
+            logger.info("Mensaje tipo texto recibido: - ID: %s  - De (from_number): %s", message.id, message.from_)
+            logger.debug("Contenido (text:body) de %s: %s", message.id, message.text.body)
+        case MessageType.INTERACTIVE if message.interactive is not None:
+            reply = message.interactive.button_reply or message.interactive.list_reply
+            logger.info("Botón interactivo presionado: %s", (reply.id, reply.title) if reply else message.interactive.type)
+        case _:
+            logger.info("Mensaje no procesado: %s (tipo %s)", message.id, message.type)
+            logger.debug("Mensaje no procesado completo: %s", message)
+            return False
+    return True
 
-async def handle_webhook_POST_logic(payload: WebhookPayload) -> dict:
+
+async def send_reply(wa_service: WhatsAppService, phone_number: str, reply: Reply, engine: Optional[ConversationEngine] = None) -> None:
+    """
+    Envía una respuesta del motor de conversación: plantilla fija del estado, texto con botones o texto simple.
+    Una respuesta diferida (pregunta para el generador) se resuelve antes con engine.complete.
+    """
+    if reply.question is not None and engine is not None:
+        reply = await engine.complete(reply)
+    if reply.template is not None and reply.template in wa_service.templates:
+        response = await wa_service.send_template(phone_number, reply.template)
+    elif reply.buttons:
+        response = await wa_service.send_interactive_buttons(phone_number, reply.text, reply.buttons)
+    else:
+        response = await wa_service.send_text_message_to_user(phone_number, reply.text)
+    logger.debug("Respuesta enviada: \n%s", response)
+
+
+async def handle_webhook_POST_logic(
+    payload: WebhookPayload,
+    wa_service: WhatsAppService,
+    deduplicator: Optional[MessageDeduplicator] = None,
+    dispatcher: Optional[ReplyDispatcher] = None,
+    engine: Optional[ConversationEngine] = None,
+) -> dict:
     """
     Maneja la lógica principal para procesar solicitudes POST de webhook.
+    Agrupa los mensajes del lote por remitente, resuelve las transiciones de todo el lote
+    con una lectura y una escritura de sesiones, y despacha las respuestas en paralelo entre
+    conversaciones, en orden dentro de cada una.
 
     Args:
-        request (Request): Solicitud entrante.
         payload (WebhookPayload): Datos del webhook.
+        wa_service (WhatsAppService): Servicio de WhatsApp de la aplicación (inyectado).
+        deduplicator (MessageDeduplicator, opcional): Descarta los mensajes ya procesados (reenvíos de Meta).
+        dispatcher (ReplyDispatcher, opcional): Despachador concurrente; si no se indica se usa el del módulo.
+        engine (ConversationEngine, opcional): Motor de conversación; si no se indica se usa el del módulo.
 
     Returns:
         dict: Respuesta de estado.
     """
-    # Instanciar el servicio de WhatsApp
-    wa_service = WhatsAppService()
-    
     # Validar el payload
     if payload.validate_payload() == { "success": True }:
-        logger.info(f"Payload validado exitosamente.")
+        logger.debug("Payload validado exitosamente.")
     else:
-        logger.error(f"Error al validar el payload: {payload}")
+        logger.error("Error al validar el payload: %s", payload)
         raise HTTPException(status_code=400, detail="Error al validar el payload")
     
-    # Iterar sobre cada entry
+    # Mensajes nuevos agrupados por remitente, en orden de llegada
+    conversations: Dict[str, List[Message]] = {}
+
+    # Iterar sobre cada entry (el payload ya llega tipado: no se recorren diccionarios)
     for entry in payload.entry:
-        account_id = entry['id']  # ID de la cuenta
-        logger.info(f"Procesando eventos para la cuenta: {account_id}")
+        account_id = entry.id  # ID de la cuenta
+        logger.debug("Procesando eventos para la cuenta: %s", account_id)
         
         # Iterar sobre los cambios dentro de cada entry
-        for change in entry['changes']:
-            value = change['value']
+        for change in entry.changes:
+            value = change.value
             
             # Verificar si hay mensajes
-            if 'messages' in value:
-                for message in value['messages']:
-                    from_number = message['from']
-                    message_id = message['id']
-                    match message['type']:
-                        case 'text':                        
-                            message_body = message['text']['body']
-                            
-                            # Procesar cada mensaje individualmente
-                            logger.info(f"Mensaje tipo texto recibido: - ID: {message_id}  - De (from_number): {from_number}  - Contenido (text:body): {message_body}")
-
-                            # Responder al mensaje del remitente
-                            response1 = await wa_service.send_text_message_to_user(from_number, "Hola!")
-                            response2=  await wa_service.send_interactive_buttons(from_number, "Por favor, elije una opción:", MENU_BUTTONS)
-                            logger.info(f"Respuesta enviada: \n{response1}.\n{response2}")
+            for message in value.messages or ():
+                # Idempotencia: un reenvío de Meta no genera nuevos envíos
+                if deduplicator is not None and await deduplicator.is_duplicate(message.id):
+                    logger.info("Mensaje duplicado ignorado: %s", message.id)
+                    continue
+                if log_incoming_message(message):
+                    conversations.setdefault(message.from_, []).append(message)
                         
-                        case 'interactive':
-                            interactive_type = message['interactive']['type']
-                            match interactive_type:
-                                case 'button_reply':
-                                    button_id = message['interactive']['button_reply']['id']
-                                    button_title = message['interactive']['button_reply']['title']
-                                    logger.info(f"Botón interactivo presionado: {button_id, button_title}")
-                                case 'list_reply':
-                                    button_id = message['interactive']['list_reply']['id']
-                                    button_title = message['interactive']['list_reply']['title']
-                                    logger.info(f"Botón interactivo presionado: {button_id, button_title}")                       
-                        case _: 
-                            logger.info(f"Mensaje no procesado: {message}")
-                            
-                            
             # Verificar si hay estados
-            if 'statuses' in value:
-                for status in value['statuses']:
-                    message_id = status['id']
-                    status = status['status']
-                    logger.info(f"  Estado del mensaje id.{message_id}: {status}")
+            for status in value.statuses or ():
+                logger.debug("  Estado del mensaje id.%s: %s", status.id, status.status)
+
+    engine = engine or get_default_conversation_engine()
+    dispatcher = dispatcher or get_default_dispatcher()
+
+    async def resolve(batch: Dict[str, List[Message]]) -> Dict[str, List[tuple]]:
+        # Transiciones de todo el lote: una lectura y una escritura en el almacén de sesiones
+        replies = await engine.handle_batch(batch)
+        return {user: [(user, reply) for reply in user_replies] for user, user_replies in replies.items() if user_replies}
+
+    # Responder: conversaciones en paralelo, respuestas de cada una en orden. Cada usuario queda
+    # bloqueado desde la lectura de su sesión hasta el último envío (sin carreras entre lotes).
+    await dispatcher.dispatch_batch(conversations, resolve, lambda item: send_reply(wa_service, *item, engine))
                                         
     return {
         "status": "success",
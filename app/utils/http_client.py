@@ -0,0 +1,109 @@
+'''
+http_client.py
+Cliente HTTP compartido para las llamadas salientes a la Graph API de Meta.
+Un único httpx.AsyncClient con keep-alive y HTTP/2 vive mientras vive la aplicación:
+se crea en el lifespan de FastAPI (main.py) y se cierra al apagar el servidor.
+Así cada mensaje saliente reutiliza una conexión TCP/TLS ya abierta en lugar de
+negociar una nueva por envío.
+'''
+import importlib.util
+from typing import Any, Dict, Optional
+
+import httpx
+
+from app.config_setup.config_settings import get_settings
+from app.config_setup.settings import Settings
+from app.utils.utils import configure_logging
+
+
+# Configuración del logger
+logger = configure_logging(__name__)
+
+# Instancia única del cliente (se crea en el arranque de la app)
+_client: Optional[httpx.AsyncClient] = None
+
+
+def http2_available() -> bool:
+    """Indica si el paquete 'h2' está instalado (requerido por httpx para HTTP/2)."""
+    return importlib.util.find_spec("h2") is not None
+
+
+def create_http_client(settings: Settings) -> httpx.AsyncClient:
+    """
+    Construye un httpx.AsyncClient con pool de conexiones keep-alive según los Settings.
+
+    Args:
+        settings (Settings): Configuración de la aplicación.
+
+    Returns:
+        httpx.AsyncClient: Cliente listo para ser compartido por toda la aplicación.
+    """
+    use_http2 = settings.HTTP2_ENABLED
+    if use_http2 and not http2_available():
+        logger.warning("HTTP2_ENABLED=True pero el paquete 'h2' no está instalado. Se usará HTTP/1.1.")
+        use_http2 = False
+
+    limits = httpx.Limits(
+        max_connections=settings.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+    )
+    timeout = httpx.Timeout(settings.HTTP_TIMEOUT, connect=settings.HTTP_CONNECT_TIMEOUT)
+    return httpx.AsyncClient(http2=use_http2, limits=limits, timeout=timeout)
+
+
+async def start_http_client() -> httpx.AsyncClient:
+    """Crea el cliente compartido si aún no existe y lo retorna."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = create_http_client(get_settings())
+        logger.info("Cliente HTTP compartido creado.")
+    return _client
+
+
+async def close_http_client() -> None:
+    """Cierra el cliente compartido y libera las conexiones del pool."""
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+        logger.info("Cliente HTTP compartido cerrado.")
+    _client = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Retorna el cliente compartido.
+    Si la aplicación no pasó por el lifespan (scripts sueltos), lo crea bajo demanda.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = create_http_client(get_settings())
+        logger.info("Cliente HTTP compartido creado bajo demanda.")
+    return _client
+
+
+def get_pool_stats(client: Optional[httpx.AsyncClient] = None) -> Dict[str, Any]:
+    """
+    Retorna estadísticas del pool de conexiones del cliente.
+
+    Returns:
+        Dict[str, Any]: Conexiones totales, activas, ociosas y cuántas usan HTTP/2.
+    """
+    client = client if client is not None else _client
+    if client is None or client.is_closed:
+        return {"status": "closed", "connections": 0, "active": 0, "idle": 0, "http2": 0}
+
+    # httpx no expone el pool públicamente: se consulta el transporte de httpcore.
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    connections = list(getattr(pool, "connections", []))
+    idle = sum(1 for conn in connections if conn.is_idle())
+    http2 = sum(1 for conn in connections if "HTTP/2" in conn.info())
+    return {
+        "status": "open",
+        "connections": len(connections),
+        "active": len(connections) - idle,
+        "idle": idle,
+        "http2": http2,
+        "max_connections": getattr(pool, "_max_connections", None),
+        "max_keepalive_connections": getattr(pool, "_max_keepalive_connections", None),
+    }
@@ -2,141 +2,283 @@
 ngrok_utils.py
 ngrok utilities: necessary functions to manage ngrok tunnels
 Author: @DanielChristello - @Chreinvent - 2025
-Version: 1.0
-Este es un módulo de funciones para el manejo de túneles con ngrok
+Version: 2.0
+Gestor asíncrono del túnel ngrok del modo dev. Corre junto al arranque del servidor (lifespan de
+main.py) en lugar de antes: el servidor atiende requests mientras el túnel se establece.
+    + Lanza el agente con asyncio.create_subprocess_exec (NGROK_COMMAND, sin shell ni terminal
+      nueva; funciona igual en Linux, macOS y Windows). Si ya hay un túnel activo lo reutiliza.
+    + Espera el túnel consultando la API local del agente (NGROK_API_URL/api/tunnels) con el
+      cliente HTTP asíncrono compartido y un backoff corto (0.1 s, 0.2 s... hasta 1 s).
+    + Revisa la salud del túnel cada NGROK_HEALTH_INTERVAL segundos; si el agente terminó o la API
+      falla NGROK_MAX_FAILURES veces seguidas, reinicia el agente (con backoff entre reintentos).
+La API local se puede reemplazar por un sustituto (tests/benchmarks/ngrok_standin.py).
 '''
-import subprocess
-import httpx
+import asyncio
+import os
+import shlex
 import time
-from app.config_setup.config_settings import get_settings
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from app.config_setup.settings import Settings
+from app.utils.http_client import get_http_client
 from app.utils.utils import configure_logging
 
 
 # Configuración del logger
 logger = configure_logging(__name__)
 
-# Configuraciones desde el archivo .env
-settings = get_settings()
-ngr_command = settings.NGROK_COMMAND
-ngrok_timeout = settings.NGROK_TIMEOUT
+# Backoff de la espera del túnel y de los reinicios del agente
+POLL_INITIAL = 0.1
+POLL_MAX = 1.0
+RESTART_BACKOFF_MAX = 30.0
 
 
-def validate_ngrok_config():
-    """
-    Valida las configuraciones de ngrok.
+def parse_ngrok_command(command: str) -> List[str]:
+    """Separa NGROK_COMMAND en argumentos (reglas de comillas de Windows en Windows)."""
+    return shlex.split(command, posix=os.name != "nt")
 
-    Raises:
-        Ngrok Exception: Si las configuraciones de ngrok no son válidas.
-    """
-    if not ngr_command:
-        logger.error("NGROK_COMMAND no puede estar vacío")
-    if ngrok_timeout <= 0:
-        logger.error("NGROK_TIMEOUT tiempo agotado. Debe ser mayor que cero.")
 
-def get_ngrok_tunnel():
+class NgrokTunnelManager:
     """
-    Consulta el estado actual de los túneles activos de ngrok.
-
-    Returns:
-        dict: Contiene la información del primer túnel activo si existe, o None si no hay túneles.
+    Mantiene un túnel ngrok activo en segundo plano.
 
-    Raises:
-        NgrokException: Si ocurre un error al obtener el estado de ngrok.
-    """
-    logger.info(f"{__name__} Consultando la API de ngrok para obtener información de los túneles...")
-    try:
-        response = httpx.get("http://127.0.0.1:4040/api/tunnels")
-        # Si la respuesta es exitosa, se registra el código de estado
-        logger.info(f"{__name__} Respuesta de la API de ngrok: {response.status_code}")
-        response.raise_for_status()  # Esto levantará una excepción si el código de estado es 4xx o 5xx
-        data = response.json()
-        if "tunnels" in data and len(data["tunnels"]) > 0:
-            return data["tunnels"][0]  # Retorna los detalles del primer túnel
-        return None  # Si no hay túneles, retorna None
-    except httpx.RequestError as e:
-        # Captura errores relacionados con la solicitud HTTP (por ejemplo, conexión fallida)
-        logger.error(f"{__name__} Error al realizar la solicitud HTTP: {e}")
-        return None  # No se puede conectar con la API de ngrok, retorna None
-    except httpx.HTTPStatusError as e:
-        # Captura errores relacionados con el estado de la respuesta (4xx, 5xx)
-        logger.error(f"{__name__} Error al obtener datos de ngrok: {e}")
-        return None  # El servidor respondió con un error, pero no se detiene el programa
-
-def wait_for_ngrok(timeout=ngrok_timeout):
+    Args:
+        command (List[str]): Comando del agente (por ejemplo ['ngrok', 'http', '5000']).
+        api_url (str): URL base de la API local del agente.
+        client (Optional[httpx.AsyncClient]): Cliente para la API local (por defecto el compartido).
+        auth_token (Optional[str]): Token de ngrok; se pasa al agente en NGROK_AUTHTOKEN.
+        timeout (float): Segundos máximos de espera del túnel tras lanzar el agente.
+        health_interval (float): Segundos entre revisiones de salud del túnel.
+        max_failures (int): Revisiones fallidas seguidas tras las cuales se reinicia el agente.
     """
-    Espera a que ngrok inicie verificando periódicamente si hay un túnel activo.
 
-    Args:
-        timeout (int): Tiempo máximo de espera en segundos.
+    def __init__(
+        self,
+        command: List[str],
+        api_url: str = "http://127.0.0.1:4040",
+        client: Optional[httpx.AsyncClient] = None,
+        auth_token: Optional[str] = None,
+        timeout: float = 10.0,
+        health_interval: float = 10.0,
+        max_failures: int = 3,
+    ):
+        if not command:
+            raise ValueError("NGROK_COMMAND no puede estar vacío")
+        if timeout <= 0:
+            raise ValueError("NGROK_TIMEOUT debe ser mayor que cero")
+        self.command = command
+        self.api_url = api_url.rstrip("/")
+        self._client = client
+        self.auth_token = auth_token
+        self.timeout = timeout
+        self.health_interval = health_interval
+        self.max_failures = max_failures
+        self.tunnel: Optional[Dict[str, Any]] = None
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._task: Optional[asyncio.Task] = None
+        self._ready = asyncio.Event()
+        # Métricas
+        self.state = "stopped"
+        self.launches = 0
+        self.restarts = 0
+        self.health_checks = 0
+        self.health_failures = 0
+        self.ready_seconds: Optional[float] = None
 
-    Returns:
-        dict: Información del túnel si se encuentra, None si no se encuentra dentro del tiempo límite.
+    @property
+    def client(self) -> httpx.AsyncClient:
+        return self._client if self._client is not None else get_http_client()
 
-    Raises:
-        Exception: Si no se logra establecer un túnel en el tiempo límite.
-    """
-    for i in range(1, timeout + 1):
-        logger.info(f"Esperando... {i}/{timeout} segundos")
-        time.sleep(1)
+    @property
+    def public_url(self) -> Optional[str]:
+        return self.tunnel.get("public_url") if self.tunnel else None
+
+    # ------------------------------------------------------------------
+    # API local del agente
+    # ------------------------------------------------------------------
+    async def get_tunnel(self) -> Optional[Dict[str, Any]]:
+        """Primer túnel activo según la API local del agente; None si no hay o la API no responde."""
         try:
-            tunnel = get_ngrok_tunnel()
-            if tunnel:
+            response = await self.client.get(f"{self.api_url}/api/tunnels", timeout=2.0)
+            response.raise_for_status()
+            tunnels = response.json().get("tunnels") or []
+        except (httpx.HTTPError, ValueError) as e:
+            logger.debug("API de ngrok sin respuesta válida: %s", e)
+            return None
+        return tunnels[0] if tunnels else None
+
+    async def wait_for_tunnel(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """Consulta la API con backoff corto hasta que aparece un túnel o vence 'timeout'."""
+        deadline = time.monotonic() + timeout
+        delay = POLL_INITIAL
+        while True:
+            tunnel = await self.get_tunnel()
+            if tunnel is not None:
                 return tunnel
-        except Exception as e:
-            logger.warning(f"Intento fallido al obtener túnel: {e}")
-    raise ("Tiempo de espera agotado para establecer un túnel ngrok.")
+            if self._process is not None and self._process.returncode is not None:
+                logger.error("El agente ngrok terminó al arrancar (código %s).", self._process.returncode)
+                return None
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * 2, POLL_MAX)
 
-def start_ngrok_tunnel():
-    """
-    Inicia un túnel de ngrok ejecutando el comando correspondiente en un terminal separado.
+    # ------------------------------------------------------------------
+    # Proceso del agente
+    # ------------------------------------------------------------------
+    async def _launch(self) -> bool:
+        """Lanza el agente; False si el ejecutable no existe o no se puede iniciar."""
+        env = dict(os.environ)
+        if self.auth_token:
+            env["NGROK_AUTHTOKEN"] = self.auth_token
+        try:
+            self._process = await asyncio.create_subprocess_exec(
+                *self.command,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL,
+                env=env,
+            )
+        except OSError as e:
+            logger.error("No se pudo lanzar ngrok (%s): %s", " ".join(self.command), e)
+            self._process = None
+            return False
+        self.launches += 1
+        logger.info("Agente ngrok lanzado (pid %s): %s", self._process.pid, " ".join(self.command))
+        return True
 
-    Returns:
-        bool: True si el comando se ejecuta correctamente.
+    async def _terminate(self, timeout: float = 5.0) -> None:
+        """Termina el agente lanzado por este gestor (los agentes ajenos no se tocan)."""
+        process, self._process = self._process, None
+        if process is None or process.returncode is not None:
+            return
+        process.terminate()
+        try:
+            await asyncio.wait_for(process.wait(), timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
 
-    Raises:
-        Ngrok Exception: Si ocurre un error al iniciar el túnel.
-    """
-    subprocess.run(["start", "cmd", "/k", ngr_command], shell=True, check=True)
-    return True
+    async def _connect(self) -> bool:
+        """Reutiliza un túnel existente o lanza el agente y espera el túnel."""
+        self.state = "connecting"
+        started = time.perf_counter()
+        tunnel = await self.get_tunnel()
+        if tunnel is None:
+            await self._terminate()
+            if not await self._launch():
+                self.state = "error"
+                return False
+            tunnel = await self.wait_for_tunnel(self.timeout)
+        if tunnel is None:
+            self.state = "error"
+            logger.error("Tiempo de espera agotado (%.0f s) para establecer el túnel ngrok.", self.timeout)
+            await self._terminate()
+            return False
+        self.tunnel = tunnel
+        self.state = "ready"
+        self.ready_seconds = time.perf_counter() - started
+        self._ready.set()
+        logger.info(
+            "Túnel ngrok activo en %.2f s: %s -> %s (configurar %s/webhook en Meta)",
+            self.ready_seconds, self.public_url, tunnel.get("config", {}).get("addr"), self.public_url,
+        )
+        return True
 
-def test_ngrok_tunnel():
-    """
-    Verifica si existe un túnel activo de ngrok y, si no lo encuentra, intenta crearlo.
+    async def _healthy(self) -> bool:
+        """El agente lanzado sigue vivo y la API informa el mismo túnel."""
+        self.health_checks += 1
+        if self._process is not None and self._process.returncode is not None:
+            logger.warning("El agente ngrok terminó (código %s).", self._process.returncode)
+            return False
+        tunnel = await self.get_tunnel()
+        if tunnel is None:
+            return False
+        if tunnel.get("public_url") != self.public_url:
+            logger.info("El túnel ngrok cambió de URL: %s -> %s", self.public_url, tunnel.get("public_url"))
+        self.tunnel = tunnel
+        return True
 
-    Returns:
-        dict: Contiene el estado del túnel y su información (nombre, URL pública y URL privada) si está activo.
-              En caso de error, incluye un mensaje descriptivo.
-    """
-    logger.info("Consultando túneles activos en ngrok...")
-    
-    tunnel = get_ngrok_tunnel()
-    if tunnel:
+    async def _run(self) -> None:
+        backoff = 1.0
+        while True:
+            if not await self._connect():
+                self.restarts += 1
+                logger.warning("Reintentando el túnel ngrok en %.0f s.", backoff)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, RESTART_BACKOFF_MAX)
+                continue
+            backoff = 1.0
+            failures = 0
+            while failures < self.max_failures:
+                await asyncio.sleep(self.health_interval)
+                if await self._healthy():
+                    failures = 0
+                    continue
+                failures += 1
+                self.health_failures += 1
+                # Un agente que terminó no se recupera solo: se reinicia sin esperar más revisiones
+                if self._process is not None and self._process.returncode is not None:
+                    break
+            self._ready.clear()
+            self.tunnel = None
+            self.restarts += 1
+            logger.warning("Túnel ngrok caído: reiniciando el agente.")
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------------------------------
+    def start(self) -> None:
+        """Inicia el gestor en segundo plano (no bloquea el arranque del servidor)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="ngrok-tunnel")
+
+    async def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """Espera a que el túnel esté activo; False si vence 'timeout'."""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def stop(self) -> None:
+        """Detiene la supervisión y el agente lanzado por el gestor."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._terminate()
+        self.state = "stopped"
+        logger.info("Gestor del túnel ngrok detenido.")
+
+    def stats(self) -> Dict[str, Any]:
         return {
-            "status": "Túnel activo",
-            "name": tunnel.get("name"),
-            "public_url": tunnel.get("public_url"),
-            "private_url": tunnel.get("config", {}).get("addr"),
+            "state": self.state,
+            "public_url": self.public_url,
+            "pid": self._process.pid if self._process is not None else None,
+            "launches": self.launches,
+            "restarts": self.restarts,
+            "health_checks": self.health_checks,
+            "health_failures": self.health_failures,
+            "ready_ms": round(self.ready_seconds * 1000, 1) if self.ready_seconds is not None else None,
         }
 
-    logger.info("No se encontró un túnel activo. Intentando crearlo...")
-    if start_ngrok_tunnel():
-        logger.info("Esperando a que ngrok se inicie...")
-        tunnel = wait_for_ngrok(timeout=10)
-        if tunnel:
-            return {
-                "status": "Túnel creado con éxito",
-                "name": tunnel.get("name"),
-                "public_url": tunnel.get("public_url"),
-                "private_url": tunnel.get("config", {}).get("addr"),
-            }
-
-    return {"status": "Error", "message": "No se pudo detectar ni crear el túnel ngrok"}
-
-def start_ngrok():
-    """
-    Verifica y maneja el estado de un túnel ngrok y lo inicia si es necesario.
 
-    Raises:
-        NgrokException: Si ocurre algún problema al iniciar o verificar el túnel.
-    """
-    test_ngrok_tunnel()
\ No newline at end of file
+def create_ngrok_manager(settings: Settings) -> Optional[NgrokTunnelManager]:
+    """Crea el gestor del túnel; None si NGROK_ENABLED es False o el servidor no está en modo dev."""
+    if not settings.NGROK_ENABLED or settings.SERVER_MODE != "dev":
+        return None
+    return NgrokTunnelManager(
+        parse_ngrok_command(settings.NGROK_COMMAND),
+        api_url=settings.NGROK_API_URL,
+        auth_token=settings.NGROK_AUTH_TOKEN,
+        timeout=settings.NGROK_TIMEOUT,
+        health_interval=settings.NGROK_HEALTH_INTERVAL,
+        max_failures=settings.NGROK_MAX_FAILURES,
+    )
@@ -0,0 +1,98 @@
+'''
+server.py
+Modos de arranque del servidor uvicorn.
+    + dev: como siempre: un proceso, event loop y parser HTTP por defecto, túnel ngrok.
+    + prod: SERVER_WORKERS procesos, uvloop + httptools (si están instalados; si no, asyncio + h11
+      con un aviso), backlog, keep-alive, límite de concurrencia y apagado ordenado configurables,
+      sin ngrok.
+Las opciones de la línea de comandos de main.py se copian a las variables de entorno antes de
+lanzar uvicorn, así los workers (que vuelven a importar main:app) leen la misma configuración.
+'''
+import importlib.util
+import os
+from typing import Any, Dict, Optional
+
+from app.config_setup.settings import Settings
+from app.utils.utils import configure_logging
+
+
+# Configuración del logger
+logger = configure_logging(__name__)
+
+SERVER_MODES = ("dev", "prod")
+
+
+def package_available(name: str) -> bool:
+    """Indica si el paquete 'name' está instalado."""
+    return importlib.util.find_spec(name) is not None
+
+
+def resolve_workers(settings: Settings) -> int:
+    """Cantidad de workers de producción (SERVER_WORKERS; 0 = uno por CPU)."""
+    return settings.SERVER_WORKERS if settings.SERVER_WORKERS > 0 else (os.cpu_count() or 1)
+
+
+def shared_by_workers(settings: Settings) -> bool:
+    """Indica si varios procesos worker comparten los archivos locales (modo prod con más de un worker)."""
+    return settings.SERVER_MODE == "prod" and resolve_workers(settings) > 1
+
+
+def apply_overrides(**overrides: Optional[Any]) -> None:
+    """Copia a os.environ las opciones de la línea de comandos (las None se ignoran) para que las lean los workers."""
+    for name, value in overrides.items():
+        if value is not None:
+            os.environ[name] = str(value)
+
+
+def split_global_rate(settings: Settings, workers: int) -> None:
+    """
+    El limitador de tasa global vive en cada proceso: con N workers cada uno recibe 1/N del
+    límite (RATE_LIMIT_GLOBAL_*) para que el total hacia la Graph API no cambie.
+    """
+    if workers <= 1 or not settings.RATE_LIMIT_ENABLED:
+        return
+    os.environ["RATE_LIMIT_GLOBAL_PER_SECOND"] = str(settings.RATE_LIMIT_GLOBAL_PER_SECOND / workers)
+    os.environ["RATE_LIMIT_GLOBAL_BURST"] = str(max(1.0, settings.RATE_LIMIT_GLOBAL_BURST / workers))
+    logger.info(
+        "Limitador global repartido entre %d workers: %.1f mensajes/s por worker.",
+        workers, settings.RATE_LIMIT_GLOBAL_PER_SECOND / workers,
+    )
+
+
+def uvicorn_options(settings: Settings) -> Dict[str, Any]:
+    """
+    Argumentos de uvicorn.run para SERVER_MODE.
+
+    Returns:
+        Dict[str, Any]: host, puerto y, en modo prod, workers, loop, parser HTTP y límites.
+    """
+    if settings.SERVER_MODE not in SERVER_MODES:
+        raise ValueError(f"SERVER_MODE no válido: {settings.SERVER_MODE} (válidos: {', '.join(SERVER_MODES)})")
+    options: Dict[str, Any] = {"host": settings.SERVER_HOST, "port": settings.SERVER_PORT, "log_level": "info"}
+    if settings.SERVER_MODE == "dev":
+        return options
+
+    workers = resolve_workers(settings)
+    loop = "uvloop" if package_available("uvloop") else "asyncio"
+    http = "httptools" if package_available("httptools") else "h11"
+    if loop != "uvloop" or http != "httptools":
+        logger.warning("Modo prod sin 'uvloop' o 'httptools' instalados: se usará loop=%s y http=%s.", loop, http)
+    if workers > 1:
+        for name in ("SESSION_BACKEND", "DEDUPE_BACKEND"):
+            if getattr(settings, name) == "memory":
+                logger.warning("%s=memory con %d workers: cada proceso tiene su propia memoria; usar sqlite o redis.", name, workers)
+        if settings.OUTBOX_ENABLED:
+            logger.info("Outbox compartido por %d workers: cada reenvío se reclama en %s antes de enviarse.", workers, settings.OUTBOX_PATH)
+    options.update(
+        workers=workers,
+        loop=loop,
+        http=http,
+        backlog=settings.SERVER_BACKLOG,
+        timeout_keep_alive=settings.SERVER_KEEPALIVE_TIMEOUT,
+        limit_concurrency=settings.SERVER_LIMIT_CONCURRENCY or None,
+        timeout_graceful_shutdown=settings.SERVER_GRACEFUL_SHUTDOWN_TIMEOUT,
+        access_log=settings.SERVER_ACCESS_LOG,
+        log_level="warning" if not settings.SERVER_ACCESS_LOG else "info",
+        proxy_headers=True,
+    )
+    return options
@@ -1,22 +1,97 @@
-
 '''
 utils.py
 funciones de utilidad para la aplicación
 utils functions to logging and other stuff
 '''
+import atexit
 import logging
+import logging.handlers
+import queue
+from typing import List, Optional
+
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(name)s - %(message)s"
+
+# Listener que escribe los registros fuera del event loop (LOG_QUEUE_ENABLED=True)
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def _logging_options():
+    """
+    Lee LOG_LEVEL (DEBUG=True lo fuerza a DEBUG), LOG_QUEUE_ENABLED y LOG_FILE de los Settings.
+
+    Raises:
+        ImportError: Si no se pueden importar los Settings.
+        ValueError: Si las variables de entorno no son válidas (incluye ValidationError de pydantic).
+    """
+    from app.config_setup.config_settings import get_settings
+    settings = get_settings()
+    level = "DEBUG" if settings.DEBUG else settings.LOG_LEVEL.upper()
+    return level, settings.LOG_QUEUE_ENABLED, settings.LOG_FILE
+
+
+def setup_logging(level="INFO", use_queue: bool = False, log_file: str = "") -> List[logging.Handler]:
+    """
+    Configura el logger raíz.
+
+    Args:
+        level: Nivel mínimo de los registros (los niveles menores se descartan sin formatearse).
+        use_queue (bool): Si es True, los handlers de consola y archivo corren en un hilo
+            (QueueHandler/QueueListener) y el event loop solo encola el registro.
+        log_file (str): Archivo de log adicional a la consola ("" = solo consola).
+
+    Returns:
+        List[logging.Handler]: Handlers que escriben (consola y archivo).
+    """
+    global _listener
+    stop_logging()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers: List[logging.Handler] = [logging.StreamHandler()]
+    if log_file:
+        handlers.append(logging.FileHandler(log_file, encoding="utf-8"))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    root.setLevel(level)
+    if use_queue:
+        log_queue = queue.SimpleQueue()
+        root.addHandler(logging.handlers.QueueHandler(log_queue))
+        _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+    else:
+        for handler in handlers:
+            root.addHandler(handler)
+    return handlers
+
+
+def stop_logging() -> None:
+    """Detiene el QueueListener (si existe) escribiendo antes los registros pendientes."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
+
 
 # Función de configuración del logger
 def configure_logging(name=None):
     if not logging.getLogger().hasHandlers():  # Evita reconfiguración
-        log_format = "%(asctime)s - %(levelname)s - %(name)s - %(message)s"  # Definir formato correctamente
+        try:
+            level, use_queue, log_file = _logging_options()
+        except (ImportError, ValueError) as e:
+            # Sin un .env válido se usan los valores por defecto, pero el error queda registrado
+            setup_logging()
+            logging.getLogger(__name__).warning("No se pudo leer la configuración de logging; se usan los valores por defecto: %s", e)
+        else:
+            setup_logging(level, use_queue, log_file)
 
-        logging.basicConfig(
-            level=logging.INFO,
-            format=log_format 
-        )
-    
     return logging.getLogger(name)
 
 # Configuración del logger
-logger = configure_logging(__name__)
\ No newline at end of file
+logger = configure_logging(__name__)
@@ -3,13 +3,23 @@ main: Se encarga de arrancar inicializar y comenzar la aplicación:
     + Configurar el logger.
     + Registrar las rutas.
     + Generar una instancia de FastAPI y configurar el servidor y el tunel ngrok.
-        + Iniciar el servidor uvicorn para FastAPI y el tunel ngrok para exponer el servidor local a internet.
+        + Iniciar el servidor uvicorn para FastAPI y, en segundo plano, el tunel ngrok para exponer el servidor local a internet.
+        + Modo prod (--mode prod o SERVER_MODE=prod): varios workers con uvloop/httptools y sin ngrok.
 Author: @DanielChristello - @Chreinvent - 2025
 Version: 1.0
 '''
+import argparse
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from app.utils.ngrok_utils import start_ngrok
+from app.utils.ngrok_utils import create_ngrok_manager
 from app.utils.utils import configure_logging
+from app.utils.server import SERVER_MODES, apply_overrides, split_global_rate, uvicorn_options
+from app.utils.http_client import start_http_client, close_http_client
+from app.services.dependencies import create_whatsapp_service, create_job_queue, start_outbox, start_warm_up
+from app.services.dedupe import create_deduplicator
+from app.services.metrics import create_loop_lag_monitor
+from app.services.signature import create_signature_verifier
+from app.services.conversation import create_conversation_engine
 from app.routes.webhook_routes import router as webhook_router
 from app.config_setup.config_settings import get_settings
 
@@ -20,6 +30,55 @@ logger = configure_logging(__name__)
 # Carga de configuración
 settings = get_settings()
 
+# -------------------------------------------------------------------------------
+# Ciclo de vida de la aplicación (recursos compartidos)
+# --------------------------------------------------------------------------------
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Crea los recursos compartidos al arrancar el servidor y los libera al apagarlo.
+        + Cliente HTTP con pool keep-alive/HTTP2 hacia la Graph API.
+        + Instancia única de WhatsAppService (inyectada en los handlers).
+        + Cola de trabajos con workers que procesan los webhooks en segundo plano.
+        + Deduplicador de mensajes (idempotencia ante reenvíos de Meta).
+        + Outbox durable de envíos (reenvía al arrancar lo que quedó pendiente).
+        + Motor de conversación con las sesiones de los usuarios.
+        + Verificador de la firma X-Hub-Signature-256 de los webhooks (si APP_SECRET está configurado).
+        + Monitor del lag del event loop para GET /metrics.
+        + Warm-up en segundo plano de parser, motor de conversación y modelo (GET /ready).
+        + Túnel ngrok en segundo plano en modo dev (se establece mientras el servidor ya atiende).
+    """
+    app.state.http_client = await start_http_client()
+    create_whatsapp_service(app)
+    app.state.deduplicator = create_deduplicator(settings)
+    app.state.conversation_engine = create_conversation_engine(settings)
+    app.state.conversation_engine.start()
+    app.state.signature_verifier = create_signature_verifier(settings)
+    await start_outbox(app)
+    await create_job_queue(app)
+    app.state.loop_lag_monitor = create_loop_lag_monitor(settings)
+    logger.info("Recursos compartidos iniciados: [http_client: OK, whatsapp_service: OK, deduplicator: OK, conversation_engine: OK, outbox: OK, job_queue: OK]")
+    warmup_task = start_warm_up(app)
+    app.state.ngrok = create_ngrok_manager(settings)
+    if app.state.ngrok is not None:
+        app.state.ngrok.start()
+    try:
+        yield
+    finally:
+        if app.state.ngrok is not None:
+            await app.state.ngrok.stop()
+        if warmup_task is not None and not warmup_task.done():
+            warmup_task.cancel()
+        if app.state.loop_lag_monitor is not None:
+            await app.state.loop_lag_monitor.stop()
+        await app.state.job_queue.stop(drain_timeout=settings.WEBHOOK_QUEUE_DRAIN_TIMEOUT)
+        await app.state.deduplicator.close()
+        await app.state.conversation_engine.close()
+        if app.state.outbox is not None:
+            await app.state.outbox.stop()
+        await close_http_client()
+        logger.info("Recursos compartidos liberados.")
+
 # -------------------------------------------------------------------------------
 # Crear la instancia de FastAPI
 # --------------------------------------------------------------------------------
@@ -27,6 +86,7 @@ app = FastAPI(
     title="WhatsApp Chatbot API",
     description="API para manejar interacciones con WhatsApp y Meta",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Registrar las rutas
@@ -36,39 +96,44 @@ app.include_router(webhook_router)
 logger.info("Creación de instancias: [logger: OK, app: OK, rutas: OK, API Router: {webhook_router} - OK]")
 
 #---------------------------------------------------------------------------------
-# Función de arranque de la aplicación propiamente dicha
+# Opciones de arranque
 #---------------------------------------------------------------------------------
-def start_application():
-    """
-    Inicia el túnel ngrok y el servidor Uvicorn para exponer la aplicación FastAPI.
-    """
-    try:
-        logger.info("Iniciando el túnel ngrok...")
-        start_ngrok()
-    except Exception as e:
-        logger.critical(f"Error crítico al iniciar ngrok: {e}")
-        raise  # Mantén este error para detener el flujo de la aplicación si ngrok no arranca.
+def parse_args() -> argparse.Namespace:
+    """Opciones de arranque; las que no se indican se toman de los Settings (SERVER_*)."""
+    parser = argparse.ArgumentParser(description="Servidor del bot de WhatsApp")
+    parser.add_argument("--mode", choices=SERVER_MODES, default=None, help="dev: un proceso + ngrok; prod: varios workers sin ngrok")
+    parser.add_argument("--workers", type=int, default=None, help="workers en modo prod (0 = uno por CPU)")
+    parser.add_argument("--host", default=None)
+    parser.add_argument("--port", type=int, default=None)
+    parser.add_argument("--no-ngrok", action="store_true", help="no mantener el túnel ngrok en modo dev (NGROK_ENABLED=false)")
+    return parser.parse_args()
 
 
 #---------------------------------------------------------------------------------
 # main: Inicio de la aplicación
 #---------------------------------------------------------------------------------
 if __name__ == "__main__":
-    
-    # Iniciar la aplicación
-    try:
-        start_application()
-    except Exception as e:
-        logger.critical(f"No se pudo iniciar la aplicación: {e}")
-        raise
-    
+    args = parse_args()
+    # Los workers vuelven a importar main:app: las opciones viajan en el entorno
+    apply_overrides(
+        SERVER_MODE=args.mode,
+        SERVER_WORKERS=args.workers,
+        SERVER_HOST=args.host,
+        SERVER_PORT=args.port,
+        NGROK_ENABLED="false" if args.no_ngrok else None,
+    )
+    get_settings.cache_clear()
+    settings = get_settings()
+    options = uvicorn_options(settings)
+    split_global_rate(settings, options.get("workers", 1))
+
     try:
         import uvicorn
-        logger.info("Iniciando el servidor FastAPI con Uvicorn...")
+        logger.info(f"Iniciando el servidor FastAPI con Uvicorn en modo {settings.SERVER_MODE}: {options}")
 
-        uvicorn.run("main:app", port=5000, log_level="info")
+        uvicorn.run("main:app", **options)
         logger.info("uvicorn.run se ha ejecutado y finalizado correctamente.")
     
     except Exception as e:
         logger.critical(f"Error crítico al iniciar el servidor FastAPI: {e}")
-        raise
\ No newline at end of file
+        raise
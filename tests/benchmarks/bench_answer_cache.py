@@ -0,0 +1,128 @@
+'''
+bench_answer_cache.py
+Mide la caché de respuestas (app/services/answer_cache.py) en el motor de conversación con un
+flujo de preguntas repetidas: pocas preguntas frecuentes (distribución tipo Zipf) escritas con
+variantes de mayúsculas, acentos, espacios y signos, como las envían los socios.
+    + µs por pregunta respondida por el motor sin caché y con caché, y tasa de aciertos.
+    + Con --generate-ms simula un generador de respuestas con ese costo por pregunta y cuenta
+      cuántas generaciones evita la caché.
+Uso:
+    python tests/benchmarks/bench_answer_cache.py [--docs ./docs] [--messages 20000] [--generate-ms 200]
+'''
+import argparse
+import asyncio
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from app.schemas.webhook_schema import Message  # noqa: E402
+from app.services.answer_cache import AnswerCache  # noqa: E402
+from app.services.conversation import DEFAULT_GRAPH, ConversationEngine  # noqa: E402
+from app.services.knowledge import KnowledgeBase, KnowledgeIndex, load_documents  # noqa: E402
+from app.services.sessions import MemorySessionStore  # noqa: E402
+
+QUESTIONS = (
+    "¿Cómo configuro el token de verificación?",
+    "qué es ngrok",
+    "cuántos reintentos hace",
+    "dónde se guardan las sesiones",
+    "cómo funciona la deduplicación de mensajes",
+    "qué variables de entorno son obligatorias",
+    "¿Se puede llevar invitados a la pileta?",
+    "¿Hay clases de tenis para chicos?",
+)
+
+
+def variant(question: str, rng: random.Random) -> str:
+    """Misma pregunta con otra forma de escribirla."""
+    text = question
+    if rng.random() < 0.5:
+        text = text.upper() if rng.random() < 0.3 else text.lower()
+    if rng.random() < 0.5:
+        text = text.replace("ó", "o").replace("á", "a").replace("é", "e").replace("í", "i")
+    if rng.random() < 0.3:
+        text = text.replace(" ", "  ")
+    if rng.random() < 0.5:
+        text = text.strip("¿?") + "?"
+    return text
+
+
+class FakeGenerator:
+    """Generador que solo cuenta llamadas y tarda --generate-ms (para estimar el tiempo evitado)."""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.calls = 0
+
+    async def generate(self, question: str, context: str = "") -> str:
+        self.calls += 1
+        await asyncio.sleep(self.seconds)
+        return "Respuesta generada."
+
+    def stats(self):
+        return {"calls": self.calls}
+
+    def close(self) -> None:
+        pass
+
+
+def make_messages(count: int, seed: int = 7):
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(len(QUESTIONS))]
+    messages = []
+    for i in range(count):
+        question = rng.choices(QUESTIONS, weights)[0]
+        messages.append(Message.model_validate({
+            "from": f"54911{i % 200:08d}", "id": f"wamid.{i}", "timestamp": "1", "type": "text",
+            "text": {"body": variant(question, rng)},
+        }))
+    return messages
+
+
+async def run(engine: ConversationEngine, messages) -> float:
+    """µs por mensaje (motor + resolución de respuestas diferidas)."""
+    # Sesiones ya iniciadas: se mide la pregunta, no el saludo
+    await engine.store.set_many({message.from_: "menu" for message in messages})
+    start = time.perf_counter()
+    for message in messages:
+        for reply in await engine.handle(message):
+            if reply.question is not None:
+                await engine.complete(reply)
+    return (time.perf_counter() - start) / len(messages) * 1e6
+
+
+async def main_async(args) -> None:
+    index = KnowledgeIndex.build(load_documents(args.docs))
+    messages = make_messages(args.messages)
+    generation_messages = messages[: max(args.messages // 50, 100)]
+
+    print(f"{'variante':<28}{'µs/pregunta':>12}{'aciertos':>10}{'generaciones':>14}")
+    for label, cache in (("sin caché", None), ("con caché", AnswerCache(3600, 1000))):
+        engine = ConversationEngine(DEFAULT_GRAPH, MemorySessionStore(3600, 100000), KnowledgeBase(index), None, cache)
+        per_message = await run(engine, messages)
+        hit_rate = f"{cache.stats()['hit_rate'] * 100:.1f}%" if cache else "-"
+        print(f"{'documentos, ' + label:<28}{per_message:>12.1f}{hit_rate:>10}{'-':>14}")
+
+    for label, cache in (("sin caché", None), ("con caché", AnswerCache(3600, 1000))):
+        generator = FakeGenerator(args.generate_ms / 1000)
+        # min_score inalcanzable: todas las preguntas van al generador
+        engine = ConversationEngine(DEFAULT_GRAPH, MemorySessionStore(3600, 100000), KnowledgeBase(index, min_score=1e9), generator, cache)
+        per_message = await run(engine, generation_messages)
+        hit_rate = f"{cache.stats()['hit_rate'] * 100:.1f}%" if cache else "-"
+        print(f"{'generador, ' + label:<28}{per_message:>12.1f}{hit_rate:>10}{generator.calls:>8}/{len(generation_messages)}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", default="./docs")
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--generate-ms", type=float, default=200.0)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+'''
+bench_generation.py
+Mide el generador de respuestas (app/services/generation.py) con N preguntas concurrentes:
+    + preguntas/s, latencia por pregunta (percentiles), tamaño medio de lote y tiempo en cola,
+      sin micro-lotes (GENERATION_MAX_BATCH=1) y con micro-lotes.
+    + lag del event loop mientras el modelo genera (debe mantenerse en milisegundos).
+Por defecto usa un modelo sintético cuyo costo imita a un seq2seq en CPU: un costo fijo por
+pasada más un costo por pregunta (--batch-ms, --item-ms), liberando el GIL como PyTorch.
+Con --real usa MODEL_NAME desde MODELS_PATH (requiere 'transformers' y 'torch').
+Uso:
+    python tests/benchmarks/bench_generation.py [--questions 64] [--concurrency 16] [--max-batch 8] [--real]
+'''
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from app.services.generation import AnswerGenerator  # noqa: E402
+
+QUESTIONS = (
+    "¿Se puede llevar invitados a la pileta?",
+    "¿Hasta qué hora está abierto el club los domingos?",
+    "¿Cuánto cuesta alquilar el SUM para un cumpleaños?",
+    "¿Hay clases de tenis para chicos?",
+)
+
+
+class SyntheticModel:
+    """Costo por pasada + costo por pregunta; time.sleep libera el GIL como la inferencia de PyTorch."""
+
+    def __init__(self, batch_ms: float, item_ms: float, tokens: int = 32):
+        self.batch_s = batch_ms / 1000
+        self.item_s = item_ms / 1000
+        self.tokens = tokens
+
+    def generate(self, prompts: List[str]) -> List[Tuple[str, int]]:
+        time.sleep(self.batch_s + self.item_s * len(prompts))
+        return [("Respuesta generada.", self.tokens) for _ in prompts]
+
+
+async def measure_lag(stop: asyncio.Event, samples: List[float], interval: float = 0.005) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(time.perf_counter() - start - interval)
+
+
+async def run(generator: AnswerGenerator, questions: int, concurrency: int) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    async def ask(i: int) -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            await generator.generate(QUESTIONS[i % len(QUESTIONS)])
+            latencies.append(time.perf_counter() - start)
+
+    # Carga del modelo fuera de la medición
+    await generator.generate(QUESTIONS[0])
+    lag: List[float] = []
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_lag(stop, lag))
+    start = time.perf_counter()
+    await asyncio.gather(*(ask(i) for i in range(questions)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await lag_task
+    generator.close()
+
+    latencies.sort()
+    lag.sort()
+    p = lambda values, q: values[int(q * (len(values) - 1))] * 1000 if values else 0.0  # noqa: E731
+    stats = generator.stats()
+    print(
+        f"max_batch {generator.max_batch:>2}  {questions / elapsed:7.1f} preguntas/s  "
+        f"p50 {p(latencies, 0.5):7.1f} ms  p99 {p(latencies, 0.99):7.1f} ms  "
+        f"lote medio {stats['batch_size_avg']:5.2f}  cola media {stats['queue_ms_avg']:7.1f} ms  "
+        f"{stats['tokens_per_second']:8.1f} tokens/s  lag del loop p99 {p(lag, 0.99):5.2f} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--max-batch", type=int, default=8)
+    parser.add_argument("--batch-window", type=float, default=0.02)
+    parser.add_argument("--batch-ms", type=float, default=60.0)
+    parser.add_argument("--item-ms", type=float, default=10.0)
+    parser.add_argument("--real", action="store_true")
+    args = parser.parse_args()
+
+    if args.real:
+        from app.config_setup.config_settings import get_settings
+        from app.services.generation import TransformersModel
+        settings = get_settings()
+        model = TransformersModel(settings.MODEL_NAME, settings.MODELS_PATH, settings.HUGGINGFACE_TOKEN, settings.GENERATION_MAX_NEW_TOKENS)
+        load_model = lambda: model  # noqa: E731
+    else:
+        load_model = lambda: SyntheticModel(args.batch_ms, args.item_ms)  # noqa: E731
+
+    for max_batch in (1, args.max_batch):
+        generator = AnswerGenerator(load_model, max_batch=max_batch, batch_window=args.batch_window, timeout=600)
+        asyncio.run(run(generator, args.questions, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+'''
+bench_intents.py
+Evaluación offline y benchmark del clasificador de intenciones (app/services/intents.py).
+    + Evaluación: sobre un conjunto etiquetado (distinto de los ejemplos de entrenamiento) reporta
+      cobertura (textos enrutados), precisión de los enrutados y exactitud total, con y sin el
+      modelo lineal, y lista los errores. 'None' = el texto no debe enrutarse.
+    + Benchmark: µs por texto del autómata, del modelo y del clasificador completo.
+Uso:
+    python tests/benchmarks/bench_intents.py [--iterations 20000] [--errors]
+'''
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from app.services.conversation import DEFAULT_GRAPH  # noqa: E402
+from app.services.intents import TRAINING_EXAMPLES, IntentRouter, NaiveBayesModel  # noqa: E402
+from app.services.knowledge import fold  # noqa: E402
+
+# (texto, estado actual, estado esperado o None)
+EVAL_SET = (
+    ("¿A qué hora abre la pileta?", None, "pileta_horarios"),
+    ("horarios de la piscina", None, "pileta_horarios"),
+    ("hasta que hora esta abierta la pile", None, "pileta_horarios"),
+    ("quiero reservar un turno en la pileta", None, "pileta_reservar"),
+    ("me anoto para nadar el sabado", None, "pileta_reservar"),
+    ("info de la pileta", None, "pileta"),
+    ("el agua está climatizada en invierno?", None, "pileta"),
+    ("hay guardavidas los domingos", None, "pileta"),
+    ("quiero alquilar una cancha", None, "tenis_reservar"),
+    ("reserva de cancha de tenis para mañana", None, "tenis_reservar"),
+    ("a que hora cierran las canchas", None, "tenis_horarios"),
+    ("tenis", None, "tenis"),
+    ("busco con quién jugar un partido el sábado", None, "tenis"),
+    ("se puede jugar de noche con luz?", None, "tenis"),
+    ("quiero reservar el SUM", None, "sum_reservar"),
+    ("alquiler del salón para un cumpleaños", None, "sum_reservar"),
+    ("reglamento del salon de usos multiples", None, "sum_reglamento"),
+    ("se puede poner música en el SUM?", None, "sum_reglamento"),
+    ("quiero festejar el cumple de mi hijo", None, "sum"),
+    ("para cuántas personas es el salón", None, "sum"),
+    ("quiero reservar", "tenis", "tenis_reservar"),
+    ("los horarios?", "pileta", "pileta_horarios"),
+    ("y el reglamento", "sum", "sum_reglamento"),
+    ("quiero reservar", None, None),
+    ("cuánto sale la cuota social", None, None),
+    ("dónde pago las expensas", None, None),
+    ("gracias!", None, None),
+    ("ok", None, None),
+    ("pileta o tenis, cuál conviene?", None, None),
+    ("me quiero hacer socio", None, None),
+    ("sumar puntos", None, None),
+    ("hay estacionamiento para visitas", None, None),
+)
+
+
+def evaluate(router: IntentRouter, show_errors: bool) -> str:
+    routed = correct_routed = correct = 0
+    errors = []
+    for text, current, expected in EVAL_SET:
+        intent = router.classify(text, current)
+        target = intent.target if intent else None
+        if target is not None:
+            routed += 1
+            correct_routed += target == expected
+        correct += target == expected
+        if target != expected:
+            errors.append(f"    {text!r} (estado {current}) -> {target}, esperado {expected}")
+    should_route = sum(1 for _, _, expected in EVAL_SET if expected is not None)
+    summary = (
+        f"exactitud {correct / len(EVAL_SET) * 100:5.1f}%   "
+        f"precisión de enrutados {correct_routed / routed * 100 if routed else 0:5.1f}%   "
+        f"cobertura {correct_routed / should_route * 100:5.1f}% de {should_route} enrutables"
+    )
+    if show_errors and errors:
+        summary += "\n" + "\n".join(errors)
+    return summary
+
+
+def per_call_us(func, texts, iterations: int) -> float:
+    start = time.perf_counter()
+    for i in range(iterations):
+        func(texts[i % len(texts)])
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--errors", action="store_true", help="listar los textos mal clasificados")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    model = NaiveBayesModel(TRAINING_EXAMPLES)
+    with_model = IntentRouter(DEFAULT_GRAPH.states, model)
+    build_ms = (time.perf_counter() - start) * 1000
+    keywords_only = IntentRouter(DEFAULT_GRAPH.states)
+
+    print(f"compilación (autómata {len(with_model.automaton)} nodos + modelo {len(model.table)} términos): {build_ms:.2f} ms")
+    print(f"solo palabras clave  {evaluate(keywords_only, args.errors)}")
+    print(f"con modelo lineal    {evaluate(with_model, args.errors)}")
+
+    texts = [text for text, _, _ in EVAL_SET]
+    folded = [fold(text) for text in texts]
+    print(f"autómata             {per_call_us(with_model.automaton.find, folded, args.iterations):6.2f} µs/texto (ya normalizado)")
+    print(f"modelo lineal        {per_call_us(model.predict, texts, args.iterations):6.2f} µs/texto")
+    print(f"clasificador         {per_call_us(with_model.classify, texts, args.iterations):6.2f} µs/texto (normalización incluida)")
+
+
+if __name__ == "__main__":
+    main()
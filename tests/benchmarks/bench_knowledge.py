@@ -0,0 +1,74 @@
+'''
+bench_knowledge.py
+Mide la base de conocimiento (app/services/knowledge.py) sobre los documentos de DOCS_PATH:
+    + build: fragmentar e indexar todos los documentos (lo que cuesta un arranque sin índice guardado).
+    + load: cargar el índice guardado (lo que cuesta un reinicio con los mismos documentos).
+    + query: latencia por consulta (percentiles en ms) con preguntas de texto libre.
+Con --replicate N el corpus se repite N veces (como documentos distintos) para ver cómo escala.
+Uso:
+    python tests/benchmarks/bench_knowledge.py [--docs ./docs] [--replicate 1] [--queries 5000]
+'''
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from app.services.knowledge import KnowledgeBase, KnowledgeIndex, load_documents  # noqa: E402
+
+QUESTIONS = (
+    "¿Cómo configuro el token de verificación del webhook?",
+    "qué es ngrok y para qué se usa",
+    "cuántos reintentos hace si Meta devuelve 429",
+    "dónde se guardan las sesiones",
+    "cómo funciona la deduplicación de mensajes",
+    "qué variables de entorno son obligatorias",
+    "ok gracias",
+    "cuál es el límite de mensajes por segundo",
+)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", default="./docs")
+    parser.add_argument("--replicate", type=int, default=1)
+    parser.add_argument("--queries", type=int, default=5000)
+    parser.add_argument("--chunk-chars", type=int, default=800)
+    args = parser.parse_args()
+
+    base = load_documents(args.docs)
+    documents = {f"{i}/{source}": text for i in range(args.replicate) for source, text in base.items()}
+
+    start = time.perf_counter()
+    index = KnowledgeIndex.build(documents, args.chunk_chars)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = str(Path(directory) / "knowledge_index.pkl")
+        index.save(path)
+        size_kb = Path(path).stat().st_size / 1024
+        start = time.perf_counter()
+        loaded = KnowledgeIndex.load(path)
+        load_ms = (time.perf_counter() - start) * 1000
+
+    print(f"documentos {len(documents)}  fragmentos {len(index.chunks)}  términos {len(index.postings)}  índice {size_kb:.0f} KB")
+    print(f"build  {build_ms:8.1f} ms")
+    print(f"load   {load_ms:8.1f} ms  ({build_ms / load_ms:.1f}x más rápido que reconstruir)")
+
+    knowledge = KnowledgeBase(loaded)
+    samples = []
+    for i in range(args.queries):
+        question = QUESTIONS[i % len(QUESTIONS)]
+        start = time.perf_counter()
+        knowledge.answer(question)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    p = lambda q: samples[int(q * (len(samples) - 1))] * 1000  # noqa: E731
+    print(f"query  p50 {p(0.50):.3f} ms   p95 {p(0.95):.3f} ms   p99 {p(0.99):.3f} ms   max {samples[-1] * 1000:.3f} ms")
+    print(f"respondidas {knowledge.answered}/{knowledge.queries}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+'''
+bench_logging.py
+Compara el costo de logging por request en el hilo del event loop, para un mensaje de texto
+respondido con saludo + menú (los mismos registros que emiten log_incoming_message, send_reply
+y WhatsAppService):
+    + legacy: f-strings armadas siempre, json.dumps(indent=2) de cada payload y re_format_number
+      registrando en cada llamada.
+    + lazy: argumentos diferidos (%s), volcados guardados por isEnabledFor y detalle en DEBUG.
+Cada variante se mide con nivel INFO y WARNING, escribiendo a un archivo de forma directa
+o a través de QueueHandler/QueueListener (LOG_QUEUE_ENABLED=True), con un archivo local rápido
+y con una salida lenta (--slow-io-ms por registro, como una consola o un pipe que bloquea).
+Uso:
+    python tests/benchmarks/bench_logging.py [--requests 5000] [--slow-io-ms 0.2]
+'''
+import argparse
+import json
+import logging
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from app.utils.utils import setup_logging, stop_logging  # noqa: E402
+
+logger = logging.getLogger("bench.wa_services")
+
+SENDER = "5491100000000"
+WAID = "5491111111111"
+BODY = "Hola, quisiera reservar la pileta para el sábado a la tarde. ¿Hay lugar?"
+MENU_BUTTONS = [
+    {"type": "reply", "reply": {"id": "pileta", "title": "Pileta"}},
+    {"type": "reply", "reply": {"id": "tenis", "title": "Tenis"}},
+    {"type": "reply", "reply": {"id": "sum", "title": "SUM"}},
+]
+RESPONSE = {"messaging_product": "whatsapp", "contacts": [{"input": SENDER, "wa_id": SENDER}], "messages": [{"id": "wamid.HBgN"}]}
+
+
+def payloads():
+    text = {"messaging_product": "whatsapp", "to": SENDER, "type": "text", "text": {"body": "Hola!"}}
+    buttons = {
+        "messaging_product": "whatsapp", "to": SENDER, "type": "interactive",
+        "interactive": {"type": "button", "body": {"text": "Por favor, elije una opción:"}, "action": {"buttons": MENU_BUTTONS}},
+    }
+    return text, buttons
+
+
+def legacy_request() -> None:
+    logger.info(f"Payload validado exitosamente.")
+    logger.info(f"Procesando eventos para la cuenta: {'102290129340398'}")
+    logger.info(f"Mensaje tipo texto recibido: - ID: {'wamid.ID'}  - De (from_number): {SENDER}  - Contenido (text:body): {BODY}")
+    for payload in payloads():
+        logger.info(f"Control del formato del número de teléfono del remitente: {SENDER}")
+        logger.info(f"RECIPIENT_WAID_1: {WAID} no detectado.")
+        logger.info(f"Enviando mensaje con payload: {json.dumps(payload, indent=2)}")
+        logger.info("Mensaje enviado exitosamente.")
+    logger.info(f"Respuesta enviada: \n{RESPONSE}.\n{RESPONSE}")
+
+
+def lazy_request() -> None:
+    logger.debug("Payload validado exitosamente.")
+    logger.debug("Procesando eventos para la cuenta: %s", "102290129340398")
+    logger.info("Mensaje tipo texto recibido: - ID: %s  - De (from_number): %s", "wamid.ID", SENDER)
+    logger.debug("Contenido (text:body) de %s: %s", "wamid.ID", BODY)
+    for payload in payloads():
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Enviando mensaje con payload: %s", json.dumps(payload, indent=2))
+        logger.info("Mensaje enviado exitosamente a %s (tipo %s).", payload.get("to"), payload.get("type"))
+    logger.debug("Respuesta enviada: \n%s.\n%s", RESPONSE, RESPONSE)
+
+
+def measure(func, requests: int) -> float:
+    """Retorna microsegundos por request en el hilo que registra (el event loop)."""
+    for _ in range(min(requests, 200)):  # calentamiento
+        func()
+    start = time.perf_counter()
+    for _ in range(requests):
+        func()
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+def slow_emit(emit, delay: float):
+    def emit_with_delay(record):
+        time.sleep(delay)
+        emit(record)
+    return emit_with_delay
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--slow-io-ms", type=float, default=0.2)
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        log_file = str(Path(directory) / "bench.log")
+        for level in ("INFO", "WARNING"):
+            for io in ("rápida", "lenta"):
+                for use_queue in (False, True):
+                    handlers = setup_logging(level, use_queue, log_file)
+                    for handler in handlers:
+                        if isinstance(handler, logging.FileHandler):
+                            if io == "lenta":
+                                handler.emit = slow_emit(handler.emit, args.slow_io_ms / 1000)
+                        else:
+                            # Solo archivo: la consola ensuciaría la salida del benchmark
+                            handler.setLevel(logging.CRITICAL + 1)
+                    requests = args.requests if io == "rápida" else max(args.requests // 10, 100)
+                    legacy = measure(legacy_request, requests)
+                    lazy = measure(lazy_request, requests)
+                    stop_logging()
+                    results.append((level, io, "queue" if use_queue else "directo", legacy, lazy))
+        setup_logging("WARNING")
+
+    print(f"{'nivel':<9}{'salida':<8}{'escritura':<10}{'legacy µs':>11}{'lazy µs':>10}{'ahorro':>9}")
+    for level, io, mode, legacy, lazy in results:
+        print(f"{level:<9}{io:<8}{mode:<10}{legacy:>11.2f}{lazy:>10.2f}{(1 - lazy / legacy) * 100:>8.1f}%")
+
+
+if __name__ == "__main__":
+    main()
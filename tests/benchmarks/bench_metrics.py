@@ -0,0 +1,79 @@
+'''
+bench_metrics.py
+Microbenchmark del costo de registrar métricas (app/services/metrics.py) en el camino caliente:
+Counter.inc, Histogram.observe y Gauge.set, con y sin etiquetas, más la etiqueta de tipo del
+webhook. Cada operación debe costar menos que RECORD_BUDGET_NS; si alguna lo supera el script
+termina con código 1 (sirve como verificación en CI).
+También informa cuánto tarda exportar GET /metrics (render) con las series medidas.
+Uso:
+    python tests/benchmarks/bench_metrics.py [--iterations 200000] [--budget-ns 1000]
+'''
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from app.schemas.webhook_schema import WebhookPayload  # noqa: E402
+from app.services.metrics import RECORD_BUDGET_NS, MetricsRegistry, webhook_type  # noqa: E402
+from tests.benchmarks.payload_samples import interactive_payload  # noqa: E402
+
+
+def per_call_ns(func, iterations: int) -> float:
+    """Nanosegundos por llamada (mejor de 3 repeticiones, descontando el costo del lazo)."""
+    def loop(f):
+        start = time.perf_counter_ns()
+        for _ in range(iterations):
+            f()
+        return time.perf_counter_ns() - start
+
+    baseline = min(loop(lambda: None) for _ in range(3))
+    best = min(loop(func) for _ in range(3))
+    return max(0.0, (best - baseline) / iterations)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200000)
+    parser.add_argument("--budget-ns", type=float, default=RECORD_BUDGET_NS)
+    args = parser.parse_args()
+
+    registry = MetricsRegistry()
+    counter = registry.counter("bench_requests_total", "Requests", ("type", "result"))
+    plain_counter = registry.counter("bench_plain_total", "Requests")
+    histogram = registry.histogram("bench_latency_seconds", "Latencia", ("type",))
+    plain_histogram = registry.histogram("bench_plain_seconds", "Latencia")
+    gauge = registry.gauge("bench_depth", "Profundidad")
+    labels = ("text", "accepted")
+    payload = WebhookPayload.model_validate_json(json.dumps(interactive_payload("button_reply")))
+
+    operations = (
+        ("Counter.inc (sin etiquetas)", lambda: plain_counter.inc()),
+        ("Counter.inc (2 etiquetas)", lambda: counter.inc(labels)),
+        ("Histogram.observe (sin etiquetas)", lambda: plain_histogram.observe(0.0123)),
+        ("Histogram.observe (1 etiqueta)", lambda: histogram.observe(0.0123, ("text",))),
+        ("Gauge.set", lambda: gauge.set(12)),
+        ("webhook_type", lambda: webhook_type(payload)),
+    )
+    over_budget = []
+    print(f"{'operación':<36}{'ns/llamada':>12}   presupuesto {args.budget_ns:.0f} ns")
+    for name, func in operations:
+        cost = per_call_ns(func, args.iterations)
+        flag = "  EXCEDE" if cost > args.budget_ns else ""
+        print(f"{name:<36}{cost:>12.1f}{flag}")
+        if flag:
+            over_budget.append(name)
+
+    start = time.perf_counter()
+    text = registry.render()
+    print(f"render de {len(text.splitlines())} líneas: {(time.perf_counter() - start) * 1e6:.1f} µs")
+
+    if over_budget:
+        print(f"Fuera de presupuesto: {', '.join(over_budget)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
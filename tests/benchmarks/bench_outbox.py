@@ -0,0 +1,127 @@
+'''
+bench_outbox.py
+Mide el costo del outbox durable de envíos (app/services/outbox.py):
+    + add: latencia de registrar un envío en el camino del webhook (percentiles en µs).
+    + durable: mensajes/s cuando cada alta y su baja llegan a disco (el envío tarda más que el flush),
+      frente a una escritura por mensaje con su propio COMMIT.
+    + replay: mensajes/s reenviados desde el archivo con un sender que responde al instante.
+Uso:
+    python tests/benchmarks/bench_outbox.py [--messages 20000] [--batch-size 100]
+'''
+import argparse
+import asyncio
+import json
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from app.services.outbox import MessageOutbox  # noqa: E402
+
+
+def make_payload(i: int) -> Tuple[bytes, str]:
+    """Payload ya serializado (como lo genera una plantilla) y su destinatario."""
+    to = f"54911{i % 500:08d}"
+    return json.dumps({"messaging_product": "whatsapp", "to": to, "type": "text", "text": {"body": "Hola!"}}).encode(), to
+
+
+def new_outbox(directory: str, name: str, batch_size: int) -> MessageOutbox:
+    # replay_interval alto: el benchmark dispara el replay a mano
+    return MessageOutbox(str(Path(directory) / name), batch_size=batch_size, replay_interval=3600)
+
+
+async def noop_sender(body: bytes, to: str) -> dict:
+    return {"messages": [{"id": "wamid.bench"}]}
+
+
+async def bench_add(directory: str, messages: int, batch_size: int) -> None:
+    outbox = new_outbox(directory, "add.sqlite3", batch_size)
+    await outbox.start(noop_sender)
+    samples = []
+    for i in range(messages):
+        payload = make_payload(i)
+        start = time.perf_counter()
+        outbox_id = outbox.add(*payload)
+        samples.append(time.perf_counter() - start)
+        outbox.mark_sent(outbox_id)
+        if i % batch_size == 0:
+            await asyncio.sleep(0)  # deja correr al flusher como lo haría el event loop
+    await outbox.stop()
+    samples.sort()
+    p = lambda q: samples[int(q * (len(samples) - 1))] * 1e6  # noqa: E731
+    print(f"add          p50 {p(0.50):7.2f} µs   p99 {p(0.99):7.2f} µs   max {samples[-1] * 1e6:8.2f} µs")
+
+
+async def bench_durable(directory: str, messages: int, batch_size: int) -> None:
+    outbox = new_outbox(directory, "durable.sqlite3", batch_size)
+    await outbox.start(noop_sender)
+    start = time.perf_counter()
+    ids = [outbox.add(*make_payload(i)) for i in range(messages)]
+    await outbox.flush()
+    for outbox_id in ids:
+        outbox.mark_sent(outbox_id)
+    await outbox.flush()
+    elapsed = time.perf_counter() - start
+    flushes = (await outbox.stats())["flushes"]
+    await outbox.stop()
+    print(f"durable      {messages / elapsed:10.0f} msg/s  (alta + baja en disco, {flushes} transacciones)")
+
+
+def bench_naive(directory: str, messages: int) -> None:
+    conn = sqlite3.connect(str(Path(directory) / "naive.sqlite3"), isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("CREATE TABLE outbox (id TEXT PRIMARY KEY, recipient TEXT, payload TEXT, created REAL)")
+    start = time.perf_counter()
+    for i in range(messages):
+        body, to = make_payload(i)
+        conn.execute("INSERT INTO outbox VALUES (?, ?, ?, ?)", (str(i), to, body.decode(), time.time()))
+        conn.execute("DELETE FROM outbox WHERE id = ?", (str(i),))
+    elapsed = time.perf_counter() - start
+    conn.close()
+    print(f"por mensaje  {messages / elapsed:10.0f} msg/s  (un COMMIT por operación, {elapsed / messages * 1e6:.1f} µs bloqueando el loop)")
+
+
+async def bench_replay(directory: str, messages: int, batch_size: int) -> None:
+    outbox = new_outbox(directory, "replay.sqlite3", batch_size)
+    await outbox.start(noop_sender)
+    for i in range(messages):
+        outbox_id = outbox.add(*make_payload(i))
+        outbox.mark_failed(outbox_id)
+    await outbox.flush()
+    outbox.replay_batch = 1000
+    start = time.perf_counter()
+    replayed = 0
+    while True:
+        done = await outbox.replay_pending()
+        if not done:
+            break
+        replayed += done
+    elapsed = time.perf_counter() - start
+    pending = (await outbox.stats())["pending"]
+    await outbox.stop()
+    print(f"replay       {replayed / elapsed:10.0f} msg/s  ({replayed} reenviados, {pending} pendientes)")
+
+
+async def run(messages: int, batch_size: int) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        await bench_add(directory, messages, batch_size)
+        await bench_durable(directory, messages, batch_size)
+        bench_naive(directory, min(messages, 5000))
+        await bench_replay(directory, messages, batch_size)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(run(args.messages, args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
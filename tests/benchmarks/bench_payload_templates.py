@@ -0,0 +1,75 @@
+'''
+bench_payload_templates.py
+Compara el costo de serialización por envío de los payloads salientes:
+    + dict: armar el diccionario y codificarlo como lo hace httpx con post(json=payload).
+    + plantilla: intercalar destinatario y campos dinámicos en los bytes precompilados
+      (app/services/templates.py), como hace WhatsAppService.
+Se miden un texto simple, el menú principal con la plantilla genérica 'buttons' (MENU_BUTTONS
+se codifica una sola vez) y el menú como plantilla fija del estado (solo se intercala 'to').
+Antes de medir se verifica que ambos caminos generan exactamente los mismos bytes.
+Uso:
+    python tests/benchmarks/bench_payload_templates.py [--sends 100000]
+'''
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from app.services.conversation import DEFAULT_GRAPH  # noqa: E402
+from app.services.templates import buttons_payload, build_template_registry, state_template_name, text_payload  # noqa: E402
+
+TO = "5491100000000"
+MENU = DEFAULT_GRAPH.states[DEFAULT_GRAPH.initial]
+MENU_BUTTONS = DEFAULT_GRAPH.buttons[DEFAULT_GRAPH.initial]
+
+
+def httpx_dumps(payload: dict) -> bytes:
+    # Misma codificación que httpx para post(json=...)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"), allow_nan=False).encode("utf-8")
+
+
+def measure(func, sends: int) -> float:
+    """Retorna microsegundos por envío."""
+    for _ in range(min(sends, 1000)):  # calentamiento
+        func()
+    start = time.perf_counter()
+    for _ in range(sends):
+        func()
+    return (time.perf_counter() - start) / sends * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sends", type=int, default=100000)
+    args = parser.parse_args()
+
+    registry = build_template_registry(DEFAULT_GRAPH)
+    menu_template = state_template_name(DEFAULT_GRAPH.initial)
+    cases = (
+        ("texto",
+         lambda: httpx_dumps(text_payload(TO, "Hola!")),
+         lambda: registry.render("text", to=TO, body="Hola!")),
+        ("menú (buttons)",
+         lambda: httpx_dumps(buttons_payload(TO, MENU.text, MENU_BUTTONS)),
+         lambda: registry.render("buttons", to=TO, body=MENU.text, buttons=MENU_BUTTONS)),
+        ("menú (estado)",
+         lambda: httpx_dumps(buttons_payload(TO, MENU.text, MENU_BUTTONS)),
+         lambda: registry.render(menu_template, to=TO)),
+    )
+
+    for name, build_dict, build_template in cases:
+        if build_dict() != build_template():
+            raise SystemExit(f"Los bytes de '{name}' no coinciden entre dict y plantilla.")
+
+    print(f"{'mensaje':<16}{'dict µs':>9}{'plantilla µs':>14}{'ahorro':>9}")
+    for name, build_dict, build_template in cases:
+        legacy = measure(build_dict, args.sends)
+        template = measure(build_template, args.sends)
+        print(f"{name:<16}{legacy:>9.2f}{template:>14.2f}{(1 - template / legacy) * 100:>8.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+'''
+bench_semantic.py
+Mide el índice semántico (app/services/semantic.py) sobre los documentos de DOCS_PATH:
+    + build: calcular los embeddings de todos los fragmentos y guardar la matriz (caché vacía).
+    + load: abrir la matriz guardada con mmap (reinicio sin cambios en los documentos).
+    + update: un documento modificado; solo se recalculan sus fragmentos.
+    + query: latencia por consulta (embedding + producto matriz-vector + argpartition), frente a
+      puntuar fila por fila en Python.
+Con --replicate N el corpus se repite N veces (como documentos distintos) para ver cómo escala.
+Uso:
+    python tests/benchmarks/bench_semantic.py [--docs ./docs] [--replicate 1] [--queries 2000]
+'''
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from app.services.knowledge import content_hashes, load_documents  # noqa: E402
+from app.services.semantic import HashedNgramEmbedder, load_or_build_semantic_index  # noqa: E402
+
+QUESTIONS = (
+    "¿Cómo configuro el token de verificación del webhook?",
+    "qué es ngrok y para qué se usa",
+    "cuantos reintentos hace",
+    "deduplicasion de mensajes",
+    "que hago si se cae el servidor",
+    "ok gracias",
+)
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    p = lambda q: samples[int(q * (len(samples) - 1))] * 1000  # noqa: E731
+    return f"p50 {p(0.50):.3f} ms   p95 {p(0.95):.3f} ms   p99 {p(0.99):.3f} ms"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", default="./docs")
+    parser.add_argument("--replicate", type=int, default=1)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--chunk-chars", type=int, default=800)
+    args = parser.parse_args()
+
+    base = load_documents(args.docs)
+    documents = {f"{i}/{source}": text for i in range(args.replicate) for source, text in base.items()}
+    embedder = HashedNgramEmbedder(args.dim)
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        build = lambda docs: load_or_build_semantic_index(docs, content_hashes(docs), cache_dir, args.chunk_chars, embedder)  # noqa: E731
+        index, build_ms = timed(lambda: build(documents))
+        index, load_ms = timed(lambda: build(documents))
+        changed = dict(documents)
+        first = next(iter(changed))
+        changed[first] += "\n\n## Nueva sección\nTexto agregado para el benchmark.\n"
+        updated, update_ms = timed(lambda: build(changed))
+
+        print(f"documentos {len(documents)}  fragmentos {len(index.chunks)}  matriz {index.matrix.shape} {index.matrix.nbytes / 1024:.0f} KB")
+        print(f"build   {build_ms:9.1f} ms")
+        print(f"load    {load_ms:9.1f} ms  (mmap)")
+        print(f"update  {update_ms:9.1f} ms  ({updated.embedded_documents} recalculado, {updated.reused_documents} reutilizados)")
+
+        vectorized, embed_only, loop = [], [], []
+        rows = [row for row in index.matrix]
+        for i in range(args.queries):
+            question = QUESTIONS[i % len(QUESTIONS)]
+            _, elapsed = timed(lambda: index.search(question, top_k=3))
+            vectorized.append(elapsed / 1000)
+            vector, elapsed = timed(lambda: embedder.embed(question))
+            embed_only.append(elapsed / 1000)
+            if i < max(args.queries // 10, 50):
+                _, elapsed = timed(lambda: sorted(((float(row @ vector), n) for n, row in enumerate(rows)), reverse=True)[:3])
+                loop.append(elapsed / 1000)
+        print(f"query (embedding + matriz)   {percentiles(vectorized)}")
+        print(f"  solo embedding             {percentiles(embed_only)}")
+        print(f"  puntaje fila por fila      {percentiles(loop)}  (sin el embedding)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+'''
+bench_server_modes.py
+Compara los modos de arranque de main.py con la misma carga de load_webhook.py:
+    + dev: `python main.py --mode dev --no-ngrok` (un proceso, loop y parser HTTP por defecto).
+    + prod: `python main.py --mode prod --workers N` (N procesos, uvloop/httptools si están instalados).
+Cada modo se levanta como subproceso con META_URL apuntando a la Graph API simulada de
+load_webhook.py (--graph-port), se espera a que GET /ready responda 200 (warm-up completo) y se
+corre la carga contra él. Al final se imprime la comparación prod contra dev.
+Requiere las variables de entorno de Settings (igual que main.py).
+Uso:
+    python tests/benchmarks/bench_server_modes.py [--workers 4] [--rps 300 | --concurrency 64]
+        [--duration 10] [--graph-latency-ms 80] [--port 5070] [--graph-port 9070] [--output-dir .]
+'''
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+import httpx
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT))
+
+from tests.benchmarks.load_webhook import compare  # noqa: E402
+
+
+def wait_ready(url: str, process: subprocess.Popen, timeout: float) -> float:
+    """Espera a que GET /ready responda 200; retorna los segundos desde el arranque."""
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f"El servidor terminó al arrancar (código {process.returncode})")
+        try:
+            if httpx.get(f"{url}/ready", timeout=1.0).status_code == 200:
+                return time.perf_counter() - started
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise TimeoutError(f"{url}/ready no respondió 200 en {timeout:.0f} s")
+
+
+def run_mode(name: str, server_args: List[str], args, output: Path) -> dict:
+    """Levanta main.py con 'server_args', corre load_webhook.py contra él y retorna el reporte."""
+    url = f"http://127.0.0.1:{args.port}"
+    # Outbox propio y vacío: los pendientes de otra corrida se reenviarían antes de que exista la Graph API simulada
+    outbox = output.with_suffix(".outbox.sqlite3")
+    outbox.unlink(missing_ok=True)
+    env = {
+        **os.environ,
+        "META_URL": f"http://127.0.0.1:{args.graph_port}",
+        "OUTBOX_PATH": str(outbox),
+        "LOG_LEVEL": "WARNING",
+    }
+    server = subprocess.Popen(
+        [sys.executable, "main.py", *server_args, "--host", "127.0.0.1", "--port", str(args.port)],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        ready = wait_ready(url, server, args.ready_timeout)
+        print(f"\n== {name}: {' '.join(server_args)} (listo en {ready:.1f} s)")
+        load = [sys.executable, "tests/benchmarks/load_webhook.py", "--url", url, "--graph-port", str(args.graph_port),
+                "--duration", str(args.duration), "--graph-latency-ms", str(args.graph_latency_ms), "--output", str(output)]
+        load += ["--rps", str(args.rps)] if args.rps else ["--concurrency", str(args.concurrency)]
+        subprocess.run(load, cwd=ROOT, check=True)
+    finally:
+        server.send_signal(signal.SIGINT)
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+    return json.loads(output.read_text(encoding="utf-8"))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--rps", type=float, default=0.0, help="lazo abierto: requests por segundo")
+    mode.add_argument("--concurrency", type=int, default=64, help="lazo cerrado: clientes simultáneos")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="workers del modo prod")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--graph-latency-ms", type=float, default=80.0)
+    parser.add_argument("--port", type=int, default=5070)
+    parser.add_argument("--graph-port", type=int, default=9070)
+    parser.add_argument("--ready-timeout", type=float, default=120.0, help="segundos máximos de arranque + warm-up")
+    parser.add_argument("--output-dir", default=".", help="carpeta de los JSON de cada modo")
+    args = parser.parse_args()
+
+    output_dir = Path(args.output_dir).resolve()
+    output_dir.mkdir(parents=True, exist_ok=True)
+    dev = run_mode("dev", ["--mode", "dev", "--no-ngrok"], args, output_dir / "server_dev.json")
+    prod = run_mode("prod", ["--mode", "prod", "--workers", str(args.workers)], args, output_dir / "server_prod.json")
+
+    print(f"\nprod ({args.workers} workers) contra dev (base):")
+    compare(prod, dev, threshold=float("inf"))
+
+
+if __name__ == "__main__":
+    main()
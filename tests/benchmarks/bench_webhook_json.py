@@ -0,0 +1,51 @@
+'''
+bench_webhook_json.py
+Microbenchmark de la decodificación del body de POST /webhook (bytes -> WebhookPayload)
+sobre los payloads reales de docs/WA_Payload_Notification.md.
+Compara el camino actual de FastAPI ('standard': json.loads + validación) con los modos
+de WEBHOOK_JSON_MODE: 'pydantic' (model_validate_json), 'orjson' y 'ujson' si están instalados.
+Uso:
+    python tests/benchmarks/bench_webhook_json.py [--iterations 20000]
+'''
+import argparse
+import importlib.util
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from app.schemas.webhook_schema import JSON_MODES, get_webhook_parser  # noqa: E402
+from tests.benchmarks.payload_samples import all_samples  # noqa: E402
+
+
+def measure(parser, body: bytes, iterations: int) -> float:
+    """Retorna microsegundos de CPU por body decodificado y validado."""
+    for _ in range(min(iterations, 500)):  # calentamiento
+        parser(body)
+    start = time.process_time()
+    for _ in range(iterations):
+        parser(body)
+    return (time.process_time() - start) / iterations * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    modes = [m for m in JSON_MODES if m in ("standard", "pydantic") or importlib.util.find_spec(m)]
+    parsers = {mode: get_webhook_parser(mode) for mode in modes}
+
+    print(f"{'payload':<14}{'bytes':>7}" + "".join(f"{m + ' µs':>14}" for m in modes))
+    for name, raw in all_samples().items():
+        body = json.dumps(raw, ensure_ascii=False).encode("utf-8")
+        results = {mode: measure(p, body, args.iterations) for mode, p in parsers.items()}
+        row = "".join(f"{results[m]:>14.2f}" for m in modes)
+        best = min(results, key=results.get)
+        print(f"{name:<14}{len(body):>7}{row}   mejor: {best} ({(1 - results[best] / results['standard']) * 100:.1f}% vs standard)")
+
+
+if __name__ == "__main__":
+    main()
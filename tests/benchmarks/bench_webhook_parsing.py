@@ -0,0 +1,112 @@
+'''
+bench_webhook_parsing.py
+Compara el costo de CPU por request del parseo del webhook, usando en ambos casos la misma
+secuencia que un consumidor del payload: validate_payload, get_message_type,
+get_sender_phone_number y el recorrido de mensajes y estados del handler.
+    + legacy: 'entry' como lista de diccionarios, validación manual y Message(**dict) en cada consulta.
+    + typed: WebhookPayload con Entry/Change/Value/Message validado una sola vez por Pydantic.
+Uso:
+    python tests/benchmarks/bench_webhook_parsing.py [--iterations 20000]
+'''
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from pydantic import BaseModel  # noqa: E402
+from app.schemas.webhook_schema import Message, WebhookPayload  # noqa: E402
+from tests.benchmarks.payload_samples import all_samples  # noqa: E402
+
+
+class LegacyWebhookPayload(BaseModel):
+    """Réplica del esquema anterior: las entradas quedan como diccionarios sin tipar."""
+    object: str
+    entry: List[Dict[str, Any]]
+
+    def validate_payload(self):
+        for entry in self.entry:
+            if "changes" not in entry or not isinstance(entry["changes"], list):
+                raise ValueError("Cada entrada debe contener una lista 'changes'.")
+            for change in entry["changes"]:
+                if not isinstance(change, dict) or not isinstance(change.get("value"), dict):
+                    raise ValueError("Cada cambio debe contener un diccionario 'value'.")
+                for message in change["value"].get("messages", []):
+                    if not isinstance(message, dict):
+                        raise ValueError("Cada mensaje debe ser un diccionario.")
+        return {"success": True}
+
+    def is_message_event(self) -> bool:
+        return any("messages" in change.get("value", {}) for entry in self.entry for change in entry.get("changes", []))
+
+    def get_first_message(self) -> Optional[Message]:
+        if self.is_message_event():
+            return Message(**self.entry[0]["changes"][0]["value"]["messages"][0])
+        return None
+
+    def get_message_type(self):
+        message = self.get_first_message()
+        return message.type if message else None
+
+    def get_sender_phone_number(self) -> Optional[str]:
+        if self.is_message_event():
+            message = self.get_first_message()
+            return message.from_ if message else None
+        return None
+
+
+def legacy_path(raw: Dict[str, Any]) -> int:
+    payload = LegacyWebhookPayload(**raw)
+    payload.validate_payload()
+    payload.get_message_type()
+    payload.get_sender_phone_number()
+    handled = 0
+    for entry in payload.entry:
+        for change in entry["changes"]:
+            value = change["value"]
+            for message in value.get("messages", []):
+                handled += bool(message["from"] and message["id"] and message["type"])
+            for status in value.get("statuses", []):
+                handled += bool(status["status"])
+    return handled
+
+
+def typed_path(raw: Dict[str, Any]) -> int:
+    payload = WebhookPayload.model_validate(raw)
+    payload.validate_payload()
+    payload.get_message_type()
+    payload.get_sender_phone_number()
+    handled = 0
+    for message in payload.iter_messages():
+        handled += bool(message.from_ and message.id and message.type)
+    for status in payload.iter_statuses():
+        handled += bool(status.status)
+    return handled
+
+
+def measure(func, raw: Dict[str, Any], iterations: int) -> float:
+    """Retorna microsegundos de CPU por llamada."""
+    for _ in range(min(iterations, 500)):  # calentamiento
+        func(raw)
+    start = time.process_time()
+    for _ in range(iterations):
+        func(raw)
+    return (time.process_time() - start) / iterations * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    print(f"{'payload':<14}{'legacy µs':>12}{'typed µs':>12}{'ahorro':>10}")
+    for name, raw in all_samples().items():
+        legacy = measure(legacy_path, raw, args.iterations)
+        typed = measure(typed_path, raw, args.iterations)
+        print(f"{name:<14}{legacy:>12.2f}{typed:>12.2f}{(1 - typed / legacy) * 100:>9.1f}%")
+
+
+if __name__ == "__main__":
+    main()
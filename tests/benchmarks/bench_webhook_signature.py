@@ -0,0 +1,64 @@
+'''
+bench_webhook_signature.py
+Mide el costo de CPU de la verificación de X-Hub-Signature-256 (app/services/signature.py) en
+POST /webhook sobre los payloads de docs/WA_Payload_Notification.md:
+    + rechazo: firma inválida, solo el HMAC (lo que cuesta un request falsificado).
+    + aceptado: HMAC + decodificación y validación con WEBHOOK_JSON_MODE.
+    + sin firma: solo la decodificación (como antes de verificar firmas).
+Uso:
+    python tests/benchmarks/bench_webhook_signature.py [--iterations 20000] [--json-mode pydantic]
+'''
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from app.schemas.webhook_schema import get_webhook_parser  # noqa: E402
+from app.services.signature import SignatureVerifier, sign  # noqa: E402
+from tests.benchmarks.payload_samples import all_samples  # noqa: E402
+
+SECRET = "app-secret-de-prueba"
+
+
+def measure(func, iterations: int) -> float:
+    """Retorna microsegundos de CPU por llamada."""
+    for _ in range(min(iterations, 500)):  # calentamiento
+        func()
+    start = time.process_time()
+    for _ in range(iterations):
+        func()
+    return (time.process_time() - start) / iterations * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--json-mode", default="pydantic")
+    args = parser.parse_args()
+
+    decode = get_webhook_parser(args.json_mode)
+    verifier = SignatureVerifier(SECRET)
+    forged = "sha256=" + "0" * 64
+
+    def accepted(body: bytes, header: str):
+        if verifier.verify(body, header):
+            return decode(body)
+
+    print(f"{'payload':<14}{'bytes':>7}{'rechazo µs':>13}{'aceptado µs':>14}{'sin firma µs':>15}")
+    for name, raw in all_samples().items():
+        body = json.dumps(raw, ensure_ascii=False).encode("utf-8")
+        header = sign(SECRET, body)
+        rejected_us = measure(lambda: verifier.verify(body, forged), args.iterations)
+        accepted_us = measure(lambda: accepted(body, header), args.iterations)
+        unsigned_us = measure(lambda: decode(body), args.iterations)
+        print(
+            f"{name:<14}{len(body):>7}{rejected_us:>13.2f}{accepted_us:>14.2f}{unsigned_us:>15.2f}"
+            f"   rechazo = {rejected_us / unsigned_us * 100:.0f}% de decodificar"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,442 @@
+'''
+graph_simulator.py
+Simulador local de la Graph API de WhatsApp (POST /{versión}/{phone_number_id}/messages) para
+pruebas de integración y benchmarks sin llamar a Meta.
+    + App ASGI: valida el payload como la Graph API (messaging_product, to, type y el objeto del
+      tipo, largo del texto y de los botones) y responde 200 con contacts[] y messages[].id
+      ('wamid.…'), o 400/401 con el formato de error de Graph.
+    + Fallas inyectables: latencia (fija, uniforme o lognormal), 429 con Retry-After (al azar o al
+      superar --max-mps), 5xx y conexiones cortadas a mitad de la respuesta.
+    + Con --webhook-url envía a nuestro POST /webhook las notificaciones 'statuses' (sent,
+      delivered, read) de cada mensaje aceptado, firmadas con --app-secret si se indica.
+    + En proceso: WhatsAppService(client=simulator.client()); una conexión cortada se ve como
+      httpx.RemoteProtocolError, igual que contra el servidor real.
+    + Standalone (uvicorn): levantar el bot con META_URL=http://127.0.0.1:<puerto>.
+    + GET /_simulator/stats y POST /_simulator/reset.
+    + No importa el código del bot: corre sin las variables de entorno de Settings.
+Uso:
+    python tests/benchmarks/graph_simulator.py [--port 9000] [--latency-ms 80] [--latency-dist lognormal]
+        [--rate-429 0.01] [--rate-5xx 0.01] [--drop-rate 0.005] [--max-mps 80]
+        [--webhook-url http://127.0.0.1:5000/webhook] [--app-secret ...]
+'''
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import math
+import random
+import secrets
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import httpx
+
+MESSAGE_TYPES = {
+    "text", "interactive", "template", "image", "audio", "video", "document", "sticker",
+    "location", "contacts", "reaction",
+}
+
+
+@dataclass
+class SimulatorConfig:
+    """
+    Comportamiento del simulador.
+
+    Args:
+        latency_ms (float): Latencia media de cada respuesta.
+        latency_dist (str): 'fixed', 'uniform' (± latency_jitter · media) o 'lognormal' (sigma = latency_jitter).
+        latency_jitter (float): Dispersión de la latencia.
+        rate_429 (float): Probabilidad de responder 429 con Retry-After.
+        retry_after (int): Segundos del header Retry-After.
+        rate_5xx (float): Probabilidad de responder 500/503.
+        drop_rate (float): Probabilidad de cortar la conexión a mitad de la respuesta.
+        max_mps (float): Mensajes por segundo aceptados antes de responder 429 (0 = sin tope).
+        access_token (str, opcional): Token esperado en Authorization (None = cualquier Bearer).
+        phone_number_id (str, opcional): phone_number_id esperado en la ruta (None = cualquiera).
+        webhook_url (str, opcional): POST /webhook del bot al que se envían los estados.
+        app_secret (str, opcional): Secreto con el que se firman los estados (X-Hub-Signature-256).
+        status_delays (Tuple[float, ...]): Segundos hasta 'sent', 'delivered' y 'read'.
+        seed (int, opcional): Semilla de las fallas y latencias (resultados reproducibles).
+    """
+    latency_ms: float = 0.0
+    latency_dist: str = "fixed"
+    latency_jitter: float = 0.5
+    rate_429: float = 0.0
+    retry_after: int = 1
+    rate_5xx: float = 0.0
+    drop_rate: float = 0.0
+    max_mps: float = 0.0
+    access_token: Optional[str] = None
+    phone_number_id: Optional[str] = None
+    webhook_url: Optional[str] = None
+    app_secret: Optional[str] = None
+    status_delays: Tuple[float, ...] = (0.05, 0.2, 1.0)
+    seed: Optional[int] = None
+
+
+def graph_error(message: str, code: int, error_type: str = "OAuthException", details: Optional[str] = None) -> Dict[str, Any]:
+    """Cuerpo de error con el formato de la Graph API."""
+    error: Dict[str, Any] = {"message": message, "type": error_type, "code": code, "fbtrace_id": secrets.token_urlsafe(12)}
+    if details is not None:
+        error["error_data"] = {"messaging_product": "whatsapp", "details": details}
+    return {"error": error}
+
+
+def validate_message(payload: Any) -> Optional[str]:
+    """Motivo por el que la Graph API rechazaría el payload; None si es válido."""
+    if not isinstance(payload, dict):
+        return "El body debe ser un objeto JSON"
+    if payload.get("messaging_product") != "whatsapp":
+        return "messaging_product debe ser 'whatsapp'"
+    to = payload.get("to")
+    if not isinstance(to, str) or not to.lstrip("+").isdigit():
+        return "'to' debe ser un número de teléfono"
+    kind = payload.get("type", "text")
+    if kind not in MESSAGE_TYPES:
+        return f"Tipo de mensaje no soportado: {kind}"
+    content = payload.get(kind)
+    if not isinstance(content, dict):
+        return f"Falta el objeto '{kind}'"
+    if kind == "text":
+        body = content.get("body")
+        if not isinstance(body, str) or not body.strip():
+            return "text.body es obligatorio"
+        if len(body) > 4096:
+            return "text.body supera los 4096 caracteres"
+    elif kind == "interactive":
+        body = (content.get("body") or {}).get("text")
+        if not isinstance(body, str) or not body.strip():
+            return "interactive.body.text es obligatorio"
+        if len(body) > 1024:
+            return "interactive.body.text supera los 1024 caracteres"
+        if content.get("type") == "button":
+            buttons = (content.get("action") or {}).get("buttons")
+            if not isinstance(buttons, list) or not 1 <= len(buttons) <= 3:
+                return "interactive.action.buttons debe tener entre 1 y 3 botones"
+            ids, titles = set(), set()
+            for button in buttons:
+                reply = button.get("reply") if isinstance(button, dict) else None
+                if not isinstance(reply, dict) or button.get("type") != "reply":
+                    return "Cada botón debe ser de tipo 'reply'"
+                title = reply.get("title")
+                if not isinstance(title, str) or not 1 <= len(title) <= 20:
+                    return "El título de un botón debe tener entre 1 y 20 caracteres"
+                if not reply.get("id") or reply["id"] in ids or title in titles:
+                    return "Los botones deben tener id y título únicos"
+                ids.add(reply["id"])
+                titles.add(title)
+    return None
+
+
+def new_wamid(to: str) -> str:
+    """Id de mensaje con la forma de los de WhatsApp ('wamid.' + base64)."""
+    raw = b"\x1c\x18" + bytes([len(to)]) + to.encode() + b"\x15\x02\x00\x11\x18\x12" + secrets.token_hex(9).upper().encode()
+    return "wamid." + base64.b64encode(raw).decode()
+
+
+class GraphSimulator:
+    """
+    App ASGI que simula el endpoint de mensajes de la Graph API.
+
+    Args:
+        config (SimulatorConfig): Latencias, fallas y envío de estados.
+        webhook_client (httpx.AsyncClient, opcional): Cliente para enviar los estados (por ejemplo
+            con httpx.ASGITransport hacia la app del bot en proceso). Por defecto se crea uno.
+        on_message (Callable, opcional): Se llama con cada payload aceptado (por ejemplo para medir
+            la demora entre el webhook entrante y el envío saliente).
+    """
+
+    def __init__(
+        self,
+        config: Optional[SimulatorConfig] = None,
+        webhook_client: Optional[httpx.AsyncClient] = None,
+        on_message: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ):
+        self.config = config or SimulatorConfig()
+        self.on_message = on_message
+        self._rng = random.Random(self.config.seed)
+        self._webhook_client = webhook_client
+        self._owns_webhook_client = webhook_client is None
+        self._tasks: Set[asyncio.Task] = set()
+        # Ventana de un segundo para --max-mps
+        self._window_start = 0.0
+        self._window_count = 0
+        self.reset()
+
+    def reset(self) -> None:
+        """Pone a cero las métricas."""
+        self.counters: Dict[str, int] = dict.fromkeys(
+            ("requests", "accepted", "invalid", "unauthorized", "throttled", "server_errors", "dropped",
+             "statuses_sent", "statuses_failed"), 0)
+        self.latencies: List[float] = []
+
+    # --- Comportamiento ---
+
+    def sample_latency(self) -> float:
+        """Segundos de latencia de la próxima respuesta según latency_dist."""
+        mean = self.config.latency_ms / 1000
+        if mean <= 0:
+            return 0.0
+        dist, jitter = self.config.latency_dist, self.config.latency_jitter
+        if dist == "uniform":
+            return max(0.0, self._rng.uniform(mean * (1 - jitter), mean * (1 + jitter)))
+        if dist == "lognormal":
+            # mu elegido para que la media de la distribución sea latency_ms
+            return self._rng.lognormvariate(math.log(mean) - jitter ** 2 / 2, jitter)
+        return mean
+
+    def _over_rate(self) -> bool:
+        if self.config.max_mps <= 0:
+            return False
+        now = time.monotonic()
+        if now - self._window_start >= 1.0:
+            self._window_start, self._window_count = now, 0
+        self._window_count += 1
+        return self._window_count > self.config.max_mps
+
+    def handle(self, path: str, headers: Dict[str, str], body: bytes) -> Tuple[int, Dict[str, Any], Dict[str, str]]:
+        """Resuelve un POST a 'path': (status, cuerpo JSON, headers extra). status 0 = cortar la conexión."""
+        parts = path.strip("/").split("/")
+        if len(parts) != 3 or parts[2] != "messages" or not parts[0].startswith("v"):
+            return 404, graph_error("Unknown path components", 2500), {}
+        if self.config.phone_number_id is not None and parts[1] != self.config.phone_number_id:
+            return 400, graph_error(f"Unsupported post request. Object with ID '{parts[1]}' does not exist", 100, "GraphMethodException"), {}
+        token = headers.get("authorization", "")
+        if not token.startswith("Bearer ") or (self.config.access_token is not None and token[7:] != self.config.access_token):
+            self.counters["unauthorized"] += 1
+            return 401, graph_error("Invalid OAuth access token - Cannot parse access token", 190), {}
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            self.counters["invalid"] += 1
+            return 400, graph_error("(#100) Invalid parameter", 100, details="El body no es JSON válido"), {}
+        reason = validate_message(payload)
+        if reason is not None:
+            self.counters["invalid"] += 1
+            return 400, graph_error("(#131009) Parameter value is not valid", 131009, details=reason), {}
+
+        roll = self._rng.random()
+        config = self.config
+        if self._over_rate() or roll < config.rate_429:
+            self.counters["throttled"] += 1
+            return 429, graph_error("(#130429) Rate limit hit", 130429), {"retry-after": str(config.retry_after)}
+        roll -= config.rate_429
+        if roll < config.rate_5xx:
+            self.counters["server_errors"] += 1
+            status = self._rng.choice((500, 503))
+            return status, graph_error("An unknown error has occurred.", 1 if status == 500 else 2, "OAuthException"), {}
+        roll -= config.rate_5xx
+        if roll < config.drop_rate:
+            self.counters["dropped"] += 1
+            return 0, {}, {}
+
+        self.counters["accepted"] += 1
+        if self.on_message is not None:
+            self.on_message(payload)
+        to = payload["to"]
+        wamid = new_wamid(to)
+        if config.webhook_url:
+            self._spawn(self._emit_statuses(wamid, to, parts[1]))
+        return 200, {
+            "messaging_product": "whatsapp",
+            "contacts": [{"input": to, "wa_id": to}],
+            "messages": [{"id": wamid}],
+        }, {}
+
+    # --- Webhooks de estado ---
+
+    def status_payload(self, wamid: str, to: str, phone_number_id: str, status: str) -> Dict[str, Any]:
+        """Notificación 'statuses' como la que envía Meta al webhook del bot."""
+        entry: Dict[str, Any] = {"id": wamid, "status": status, "timestamp": str(int(time.time())), "recipient_id": to}
+        if status != "read":
+            entry["conversation"] = {"id": secrets.token_hex(16), "origin": {"type": "service"}}
+            entry["pricing"] = {"billable": False, "pricing_model": "CBP", "category": "service"}
+        return {
+            "object": "whatsapp_business_account",
+            "entry": [{
+                "id": "0",
+                "changes": [{
+                    "value": {
+                        "messaging_product": "whatsapp",
+                        "metadata": {"display_phone_number": "15550000000", "phone_number_id": phone_number_id},
+                        "statuses": [entry],
+                    },
+                    "field": "messages",
+                }],
+            }],
+        }
+
+    async def _emit_statuses(self, wamid: str, to: str, phone_number_id: str) -> None:
+        if self._webhook_client is None:
+            self._webhook_client = httpx.AsyncClient(timeout=10.0)
+        elapsed = 0.0
+        for status, delay in zip(("sent", "delivered", "read"), self.config.status_delays):
+            await asyncio.sleep(max(0.0, delay - elapsed))
+            elapsed = delay
+            body = json.dumps(self.status_payload(wamid, to, phone_number_id, status)).encode()
+            headers = {"Content-Type": "application/json"}
+            if self.config.app_secret:
+                digest = hmac.new(self.config.app_secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+                headers["X-Hub-Signature-256"] = f"sha256={digest}"
+            try:
+                response = await self._webhook_client.post(self.config.webhook_url, content=body, headers=headers)
+                response.raise_for_status()
+                self.counters["statuses_sent"] += 1
+            except httpx.HTTPError:
+                self.counters["statuses_failed"] += 1
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def drain(self, timeout: Optional[float] = None) -> None:
+        """Espera a que se envíen los estados pendientes."""
+        if self._tasks:
+            await asyncio.wait(set(self._tasks), timeout=timeout)
+
+    async def aclose(self) -> None:
+        """Cancela los estados pendientes y cierra el cliente de webhooks propio."""
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._owns_webhook_client and self._webhook_client is not None:
+            await self._webhook_client.aclose()
+            self._webhook_client = None
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+        p = lambda q: round(latencies[int(q * (len(latencies) - 1))] * 1000, 2) if latencies else 0.0  # noqa: E731
+        return {**self.counters, "pending_statuses": len(self._tasks), "latency_ms_p50": p(0.5), "latency_ms_p99": p(0.99)}
+
+    # --- ASGI ---
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await self.aclose()
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        if scope["type"] != "http":
+            return
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+        path, method = scope["path"], scope["method"]
+        if path == "/_simulator/stats" and method == "GET":
+            return await self._respond(send, 200, self.stats(), {})
+        if path == "/_simulator/reset" and method == "POST":
+            self.reset()
+            return await self._respond(send, 200, {"success": True}, {})
+        if method != "POST":
+            return await self._respond(send, 405, graph_error("Unsupported request method", 100), {})
+
+        self.counters["requests"] += 1
+        headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+        status, content, extra = self.handle(path, headers, body)
+        latency = self.sample_latency()
+        self.latencies.append(latency)
+        if latency:
+            await asyncio.sleep(latency)
+        if status == 0:
+            # Headers enviados y body nunca completado: el servidor cierra la conexión
+            await send({"type": "http.response.start", "status": 200, "headers": [
+                (b"content-type", b"application/json"), (b"content-length", b"64"),
+            ]})
+            return
+        await self._respond(send, status, content, extra)
+
+    @staticmethod
+    async def _respond(send, status: int, content: Dict[str, Any], extra: Dict[str, str]) -> None:
+        body = json.dumps(content).encode()
+        headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        headers += [(key.encode(), value.encode()) for key, value in extra.items()]
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+    # --- En proceso ---
+
+    def transport(self) -> httpx.AsyncBaseTransport:
+        """Transporte httpx que atiende las peticiones con este simulador, sin red."""
+        return SimulatorTransport(self)
+
+    def client(self, **kwargs) -> httpx.AsyncClient:
+        """Cliente httpx hacia el simulador en proceso (para WhatsAppService(client=...))."""
+        return httpx.AsyncClient(transport=self.transport(), **kwargs)
+
+
+class ConnectionDropped(Exception):
+    """El simulador dejó la respuesta incompleta (conexión cortada)."""
+
+
+class SimulatorTransport(httpx.ASGITransport):
+    """httpx.ASGITransport hacia el simulador; una respuesta cortada se ve como httpx.RemoteProtocolError."""
+
+    def __init__(self, simulator: GraphSimulator):
+        super().__init__(app=self._app)
+        self.simulator = simulator
+
+    async def _app(self, scope, receive, send) -> None:
+        completed = False
+
+        async def tracking_send(message) -> None:
+            nonlocal completed
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                completed = True
+            await send(message)
+
+        await self.simulator(scope, receive, tracking_send)
+        if not completed:
+            raise ConnectionDropped()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        try:
+            return await super().handle_async_request(request)
+        except ConnectionDropped:
+            raise httpx.RemoteProtocolError("peer closed connection without sending complete message body", request=request)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--latency-dist", choices=("fixed", "uniform", "lognormal"), default="fixed")
+    parser.add_argument("--latency-jitter", type=float, default=0.5)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--rate-5xx", type=float, default=0.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--max-mps", type=float, default=0.0)
+    parser.add_argument("--access-token", default=None)
+    parser.add_argument("--phone-number-id", default=None)
+    parser.add_argument("--webhook-url", default=None)
+    parser.add_argument("--app-secret", default=None)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    import uvicorn
+    config = SimulatorConfig(
+        latency_ms=args.latency_ms, latency_dist=args.latency_dist, latency_jitter=args.latency_jitter,
+        rate_429=args.rate_429, retry_after=args.retry_after, rate_5xx=args.rate_5xx, drop_rate=args.drop_rate,
+        max_mps=args.max_mps, access_token=args.access_token, phone_number_id=args.phone_number_id,
+        webhook_url=args.webhook_url, app_secret=args.app_secret, seed=args.seed,
+    )
+    print(f"Graph API simulada en http://{args.host}:{args.port} (META_URL del bot); estadísticas en /_simulator/stats")
+    uvicorn.run(GraphSimulator(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+'''
+load_webhook.py
+Generador de carga de punta a punta para POST /webhook con payloads reales de Meta (text,
+button_reply, list_reply, statuses y lotes de varios mensajes), cada uno con remitentes e ids
+únicos para no chocar con la deduplicación.
+    + Lazo abierto (--rps): los requests se programan a tasa fija y la latencia se mide desde el
+      instante programado (sin omisión coordinada). Lazo cerrado (--concurrency): N clientes
+      envían uno tras otro.
+    + Métricas: requests/s logrados, latencia p50/p95/p99/máx de la respuesta del webhook, errores
+      por código y demora entrante → saliente (webhook recibido → mensaje aceptado por la Graph API
+      simulada de graph_simulator.py), por remitente.
+    + En proceso (por defecto): la app de main.py con su lifespan y el WhatsAppService apuntando al
+      simulador; requiere las variables de entorno de Settings. Con --url se carga un servidor ya
+      levantado y el simulador escucha en --graph-port (el servidor debe usar META_URL=http://127.0.0.1:<puerto>).
+    + --output guarda los resultados en JSON; --baseline compara con una corrida anterior y termina
+      con código 1 si alguna métrica empeora más que --threshold.
+Uso:
+    python tests/benchmarks/load_webhook.py [--rps 200 | --concurrency 32] [--duration 10]
+        [--mix text=50,button_reply=20,list_reply=10,status=15,batch=5] [--graph-latency-ms 80]
+        [--url http://127.0.0.1:5000] [--output run.json] [--baseline base.json --threshold 0.1]
+'''
+import argparse
+import asyncio
+import copy
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from tests.benchmarks.graph_simulator import GraphSimulator, SimulatorConfig  # noqa: E402
+from tests.benchmarks.payload_samples import batch_payload, interactive_payload, status_payload, text_payload  # noqa: E402
+
+DEFAULT_MIX = "text=50,button_reply=20,list_reply=10,status=15,batch=5"
+# (métrica, True si más alto es mejor)
+COMPARED_METRICS = (
+    ("requests_per_second", True),
+    ("latency_ms.p50", False),
+    ("latency_ms.p95", False),
+    ("latency_ms.p99", False),
+    ("outbound_delay_ms.p50", False),
+    ("outbound_delay_ms.p95", False),
+    ("outbound_delay_ms.p99", False),
+)
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    """p50/p95/p99/máx en milisegundos de una lista de segundos."""
+    if not values:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    values = sorted(values)
+    p = lambda q: round(values[int(q * (len(values) - 1))] * 1000, 3)  # noqa: E731
+    return {"p50": p(0.5), "p95": p(0.95), "p99": p(0.99), "max": round(values[-1] * 1000, 3)}
+
+
+def parse_mix(mix: str) -> Tuple[List[str], List[float]]:
+    kinds, weights = [], []
+    for item in mix.split(","):
+        kind, _, weight = item.partition("=")
+        if kind not in PAYLOAD_KINDS:
+            raise SystemExit(f"Tipo de payload desconocido en --mix: {kind} (válidos: {', '.join(PAYLOAD_KINDS)})")
+        kinds.append(kind)
+        weights.append(float(weight or 1))
+    return kinds, weights
+
+
+PAYLOAD_KINDS: Dict[str, Callable[[], Dict[str, Any]]] = {
+    "text": text_payload,
+    "button_reply": lambda: interactive_payload("button_reply", "pileta"),
+    "list_reply": lambda: interactive_payload("list_reply", "tenis"),
+    "status": status_payload,
+    "batch": lambda: batch_payload(10, 5),
+}
+
+
+class PayloadFactory:
+    """
+    Bodies de webhook listos para enviar: cada request usa remitentes e ids de mensaje nuevos.
+
+    Args:
+        kinds / weights: Tipos de payload y su peso en la mezcla.
+        seed (int): Semilla de la mezcla.
+    """
+
+    def __init__(self, kinds: List[str], weights: List[float], seed: int = 7):
+        self.kinds = kinds
+        self.weights = weights
+        self.templates = {kind: PAYLOAD_KINDS[kind]() for kind in kinds}
+        self._rng = random.Random(seed)
+        self._run = f"{int(time.time())}"
+        self._sequence = 0
+        self._sender = 0
+
+    def _next_sender(self) -> str:
+        self._sender += 1
+        return f"549{self._sender % 10**9:09d}"
+
+    def build(self) -> Tuple[str, bytes, List[str]]:
+        """(tipo, body, remitentes que deberían recibir una respuesta)."""
+        kind = self._rng.choices(self.kinds, self.weights)[0]
+        payload = copy.deepcopy(self.templates[kind])
+        value = payload["entry"][0]["changes"][0]["value"]
+        senders: Dict[str, str] = {}
+        for message in value.get("messages") or ():
+            # Los lotes conservan varios mensajes por remitente
+            original = message["from"]
+            if original not in senders:
+                senders[original] = self._next_sender()
+            message["from"] = senders[original]
+            self._sequence += 1
+            message["id"] = f"wamid.load.{self._run}.{self._sequence}"
+        for contact in value.get("contacts") or ():
+            contact["wa_id"] = senders.get(contact.get("wa_id"), contact.get("wa_id"))
+        for status in value.get("statuses") or ():
+            self._sequence += 1
+            status["id"] = f"wamid.load.{self._run}.{self._sequence}"
+        return kind, json.dumps(payload).encode(), list(senders.values())
+
+
+class OutboundTracker:
+    """Demora entre el envío de un webhook y el primer mensaje saliente hacia cada remitente."""
+
+    def __init__(self):
+        self.pending: Dict[str, float] = {}
+        self.delays: List[float] = []
+
+    def expect(self, senders: List[str], sent_at: float) -> None:
+        for sender in senders:
+            self.pending.setdefault(sender, sent_at)
+
+    def on_message(self, payload: Dict[str, Any]) -> None:
+        sent_at = self.pending.pop(payload.get("to"), None)
+        if sent_at is not None:
+            self.delays.append(time.perf_counter() - sent_at)
+
+
+class LoadRun:
+    """Ejecuta la carga y acumula latencias, errores y conteos por tipo."""
+
+    def __init__(self, client: httpx.AsyncClient, factory: PayloadFactory, tracker: OutboundTracker, app_secret: Optional[str]):
+        self.client = client
+        self.factory = factory
+        self.tracker = tracker
+        self.app_secret = app_secret
+        self.latencies: List[float] = []
+        self.errors: Counter = Counter()
+        self.kinds: Counter = Counter()
+
+    async def fire(self, scheduled: Optional[float] = None) -> None:
+        kind, body, senders = self.factory.build()
+        headers = {"Content-Type": "application/json"}
+        if self.app_secret:
+            from app.services.signature import SIGNATURE_HEADER, sign
+            headers[SIGNATURE_HEADER] = sign(self.app_secret, body)
+        start = time.perf_counter()
+        self.tracker.expect(senders, start)
+        try:
+            response = await self.client.post("/webhook", content=body, headers=headers)
+            if response.status_code >= 400:
+                self.errors[str(response.status_code)] += 1
+        except httpx.HTTPError as e:
+            self.errors[type(e).__name__] += 1
+        # Lazo abierto: la latencia cuenta desde el instante programado
+        self.latencies.append(time.perf_counter() - (scheduled if scheduled is not None else start))
+        self.kinds[kind] += 1
+
+    async def open_loop(self, rps: float, duration: float) -> float:
+        tasks = set()
+        interval = 1.0 / rps
+        start = time.perf_counter()
+        i = 0
+        while i * interval < duration:
+            scheduled = start + i * interval
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            task = asyncio.create_task(self.fire(scheduled))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            i += 1
+        if tasks:
+            await asyncio.gather(*tasks)
+        return time.perf_counter() - start
+
+    async def closed_loop(self, concurrency: int, duration: float) -> float:
+        start = time.perf_counter()
+        deadline = start + duration
+
+        async def worker() -> None:
+            while time.perf_counter() < deadline:
+                await self.fire()
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return time.perf_counter() - start
+
+
+async def wait_outbound(tracker: OutboundTracker, timeout: float) -> None:
+    """Espera a que lleguen al simulador las respuestas todavía pendientes."""
+    deadline = time.perf_counter() + timeout
+    while tracker.pending and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+
+
+async def run_in_process(args, factory: PayloadFactory, tracker: OutboundTracker, simulator: GraphSimulator) -> Tuple[LoadRun, float]:
+    """Carga la app de main.py dentro de este proceso, con WhatsAppService apuntando al simulador."""
+    # La carga en proceso no usa el túnel ngrok del modo dev
+    os.environ.setdefault("NGROK_ENABLED", "false")
+    from app.config_setup.config_settings import get_settings
+    from app.services.dependencies import get_whatsapp_service
+    from app.services.rate_limiter import create_rate_limiter
+    from app.services.resilience import create_circuit_breaker, create_retry_policy
+    from app.services.wa_services import WhatsAppService
+    from main import app
+
+    settings = get_settings()
+    async with app.router.lifespan_context(app):
+        service = WhatsAppService(
+            client=simulator.client(),
+            rate_limiter=create_rate_limiter(settings),
+            retry_policy=create_retry_policy(settings),
+            circuit_breaker=create_circuit_breaker(settings),
+        )
+        app.dependency_overrides[get_whatsapp_service] = lambda: service
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bot", timeout=30.0) as client:
+            run = LoadRun(client, factory, tracker, args.app_secret or settings.APP_SECRET)
+            elapsed = await execute(run, args)
+            await wait_outbound(tracker, args.drain)
+        app.dependency_overrides.pop(get_whatsapp_service, None)
+    return run, elapsed
+
+
+async def run_remote(args, factory: PayloadFactory, tracker: OutboundTracker, simulator: GraphSimulator) -> Tuple[LoadRun, float]:
+    """Carga un servidor ya levantado (--url); el simulador escucha en --graph-port dentro de este proceso."""
+    import uvicorn
+    server = uvicorn.Server(uvicorn.Config(simulator, host="127.0.0.1", port=args.graph_port, log_level="warning", lifespan="off"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    limits = httpx.Limits(max_connections=max(args.concurrency, 100), max_keepalive_connections=max(args.concurrency, 100))
+    try:
+        async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=30.0) as client:
+            run = LoadRun(client, factory, tracker, args.app_secret)
+            elapsed = await execute(run, args)
+            await wait_outbound(tracker, args.drain)
+    finally:
+        server.should_exit = True
+        await server_task
+    return run, elapsed
+
+
+async def execute(run: LoadRun, args) -> float:
+    # Calentamiento fuera de la medición (modelo de intenciones, conexiones, sesiones)
+    for _ in range(args.warmup):
+        await run.fire()
+    run.latencies.clear()
+    run.errors.clear()
+    run.kinds.clear()
+    run.tracker.delays.clear()
+    if args.rps:
+        return await run.open_loop(args.rps, args.duration)
+    return await run.closed_loop(args.concurrency, args.duration)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def metric(results: Dict[str, Any], path: str) -> Optional[float]:
+    value: Any = results
+    for key in path.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Imprime la comparación y retorna las métricas que empeoraron más que 'threshold'."""
+    regressions = []
+    print(f"\n{'métrica':<26}{'base':>12}{'actual':>12}{'cambio':>10}")
+    for path, higher_is_better in COMPARED_METRICS:
+        old, new = metric(baseline["results"], path), metric(current["results"], path)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        worse = -change if higher_is_better else change
+        flag = "  REGRESIÓN" if worse > threshold else ""
+        print(f"{path:<26}{old:>12.2f}{new:>12.2f}{change * 100:>9.1f}%{flag}")
+        if flag:
+            regressions.append(path)
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--rps", type=float, default=0.0, help="lazo abierto: requests por segundo")
+    mode.add_argument("--concurrency", type=int, default=32, help="lazo cerrado: clientes simultáneos")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--url", default=None, help="servidor ya levantado (por defecto: la app en proceso)")
+    parser.add_argument("--graph-port", type=int, default=9000)
+    parser.add_argument("--graph-latency-ms", type=float, default=80.0)
+    parser.add_argument("--graph-latency-dist", choices=("fixed", "uniform", "lognormal"), default="lognormal")
+    parser.add_argument("--app-secret", default=None, help="firma los webhooks (por defecto APP_SECRET en proceso)")
+    parser.add_argument("--drain", type=float, default=10.0, help="segundos de espera de las respuestas pendientes")
+    parser.add_argument("--output", default=None, help="archivo JSON de resultados")
+    parser.add_argument("--baseline", default=None, help="JSON de una corrida anterior para comparar")
+    parser.add_argument("--threshold", type=float, default=0.10, help="empeoramiento relativo tolerado (0.10 = 10%%)")
+    args = parser.parse_args()
+
+    kinds, weights = parse_mix(args.mix)
+    factory = PayloadFactory(kinds, weights)
+    tracker = OutboundTracker()
+    simulator = GraphSimulator(
+        SimulatorConfig(latency_ms=args.graph_latency_ms, latency_dist=args.graph_latency_dist, seed=7),
+        on_message=tracker.on_message,
+    )
+    runner = run_remote if args.url else run_in_process
+    run, elapsed = asyncio.run(runner(args, factory, tracker, simulator))
+
+    requests = len(run.latencies)
+    results = {
+        "requests": requests,
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_second": round(requests / elapsed, 2) if elapsed else 0.0,
+        "errors": dict(run.errors),
+        "kinds": dict(run.kinds),
+        "latency_ms": percentiles(run.latencies),
+        "outbound_delay_ms": percentiles(tracker.delays),
+        "outbound_delivered": len(tracker.delays),
+        "outbound_missing": len(tracker.pending),
+        "graph": simulator.stats(),
+    }
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "config": {
+            "mode": "open" if args.rps else "closed",
+            "rps": args.rps or None,
+            "concurrency": None if args.rps else args.concurrency,
+            "duration_s": args.duration,
+            "mix": args.mix,
+            "target": args.url or "in-process",
+            "graph_latency_ms": args.graph_latency_ms,
+            "graph_latency_dist": args.graph_latency_dist,
+        },
+        "results": results,
+    }
+
+    loop_label = f"lazo abierto {args.rps:g} rps" if args.rps else f"lazo cerrado {args.concurrency} clientes"
+    latency, delay = results["latency_ms"], results["outbound_delay_ms"]
+    print(f"{loop_label}, {args.duration:g}s contra {report['config']['target']}")
+    print(f"  requests        {requests} ({results['requests_per_second']:.1f}/s), errores {results['errors'] or 0}")
+    print(f"  latencia        p50 {latency['p50']:.2f} ms  p95 {latency['p95']:.2f} ms  p99 {latency['p99']:.2f} ms  máx {latency['max']:.2f} ms")
+    print(
+        f"  entrante→saliente p50 {delay['p50']:.2f} ms  p95 {delay['p95']:.2f} ms  p99 {delay['p99']:.2f} ms "
+        f"({results['outbound_delivered']} respondidos, {results['outbound_missing']} sin respuesta)"
+    )
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"Resultados guardados en {args.output}")
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"Regresión mayor a {args.threshold * 100:.0f}% en: {', '.join(regressions)}")
+            sys.exit(1)
+        print(f"Sin regresiones mayores a {args.threshold * 100:.0f}%.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+'''
+ngrok_standin.py
+Sustituto local del agente ngrok y de su API (GET /api/tunnels) para probar el gestor del túnel
+(app/utils/ngrok_utils.py) sin ngrok ni conexión a internet.
+    + Como agente: escucha en --port y, pasado --startup-delay, informa un túnel con --public-url.
+      Con --die-after termina solo a los N segundos (simula una caída del agente).
+    + --check: lanza NgrokTunnelManager con este mismo script como NGROK_COMMAND, mide el tiempo
+      hasta el túnel activo, mata el agente y mide el tiempo hasta que el gestor lo reinicia.
+      Termina con código 1 si el túnel no se establece o no se recupera dentro de --timeout.
+      Requiere las variables de entorno de Settings (importa app/utils/ngrok_utils.py).
+Uso:
+    python tests/benchmarks/ngrok_standin.py [--port 4041] [--startup-delay 0.5] [--die-after 0]
+    python tests/benchmarks/ngrok_standin.py --check [--port 4041] [--startup-delay 0.5] [--timeout 10]
+'''
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+
+class AgentStandIn:
+    """App ASGI que imita la API local del agente (solo GET /api/tunnels)."""
+
+    def __init__(self, public_url: str, addr: str, startup_delay: float):
+        self.public_url = public_url
+        self.addr = addr
+        self.ready_at = time.monotonic() + startup_delay
+
+    def tunnels(self) -> dict:
+        if time.monotonic() < self.ready_at:
+            return {"tunnels": [], "uri": "/api/tunnels"}
+        tunnel = {
+            "name": "command_line",
+            "uri": "/api/tunnels/command_line",
+            "public_url": self.public_url,
+            "proto": "https",
+            "config": {"addr": self.addr, "inspect": True},
+        }
+        return {"tunnels": [tunnel], "uri": "/api/tunnels"}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return
+        if scope["method"] == "GET" and scope["path"] == "/api/tunnels":
+            status, body = 200, json.dumps(self.tunnels()).encode()
+        else:
+            status, body = 404, b'{"error_code":100,"msg":"not found"}'
+        await send({"type": "http.response.start", "status": status, "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": body})
+
+
+def serve(args) -> None:
+    import uvicorn
+
+    app = AgentStandIn(args.public_url, args.addr, args.startup_delay)
+    if args.die_after > 0:
+        # Caída abrupta, como un agente que se cierra: sin apagado ordenado
+        threading.Timer(args.die_after, os._exit, (1,)).start()
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning", lifespan="off")
+
+
+async def check(args) -> bool:
+    from app.utils.ngrok_utils import NgrokTunnelManager
+
+    command = [sys.executable, str(Path(__file__).resolve()), "--port", str(args.port), "--startup-delay", str(args.startup_delay)]
+    async with httpx.AsyncClient() as client:
+        manager = NgrokTunnelManager(
+            command,
+            api_url=f"http://127.0.0.1:{args.port}",
+            client=client,
+            timeout=args.timeout,
+            health_interval=args.health_interval,
+            max_failures=2,
+        )
+        started = time.perf_counter()
+        manager.start()
+        ok = await manager.wait_ready(args.timeout)
+        print(f"túnel activo:        {ok} en {(time.perf_counter() - started) * 1000:.0f} ms ({manager.public_url})")
+        if ok:
+            pid = manager.stats()["pid"]
+            manager._process.kill()
+            started = time.perf_counter()
+            # La caída se detecta en la próxima revisión de salud; se espera el túnel del agente nuevo
+            while time.perf_counter() - started < args.timeout:
+                stats = manager.stats()
+                if stats["state"] == "ready" and stats["pid"] not in (None, pid):
+                    break
+                await asyncio.sleep(0.02)
+            stats = manager.stats()
+            ok = stats["state"] == "ready" and stats["pid"] != pid
+            print(f"recuperado tras caída: {ok} en {(time.perf_counter() - started) * 1000:.0f} ms (pid {pid} -> {stats['pid']})")
+        await manager.stop()
+        print(json.dumps(manager.stats(), indent=2))
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=4041)
+    parser.add_argument("--startup-delay", type=float, default=0.5, help="segundos hasta que el túnel aparece en la API")
+    parser.add_argument("--die-after", type=float, default=0.0, help="termina el agente a los N segundos (0 = nunca)")
+    parser.add_argument("--public-url", default="https://standin.ngrok-free.app")
+    parser.add_argument("--addr", default="http://localhost:5000")
+    parser.add_argument("--check", action="store_true", help="prueba el gestor del túnel contra este sustituto")
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--health-interval", type=float, default=0.2)
+    args = parser.parse_args()
+
+    if args.check:
+        sys.exit(0 if asyncio.run(check(args)) else 1)
+    serve(args)
+
+
+if __name__ == "__main__":
+    main()
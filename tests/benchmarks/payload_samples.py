@@ -0,0 +1,71 @@
+'''
+payload_samples.py
+Payloads reales de webhook para los benchmarks.
+Se extraen de los bloques JSON de docs/WA_Payload_Notification.md y, a partir del ejemplo
+de mensaje de texto, se derivan variantes interactivas y lotes con varios mensajes.
+'''
+import copy
+import json
+import re
+from pathlib import Path
+from typing import Any, Dict, List
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+PAYLOAD_DOC = ROOT_DIR / "docs" / "WA_Payload_Notification.md"
+
+_JSON_BLOCK = re.compile(r"```json\s*\n(.*?)```", re.DOTALL)
+
+
+def load_doc_payloads(path: Path = PAYLOAD_DOC) -> List[Dict[str, Any]]:
+    """Retorna los payloads de webhook (bloques JSON con 'object') documentados en 'path'."""
+    payloads = []
+    for block in _JSON_BLOCK.findall(path.read_text(encoding="utf-8")):
+        data = json.loads(block)
+        if isinstance(data, dict) and "object" in data:
+            payloads.append(data)
+    return payloads
+
+
+def text_payload() -> Dict[str, Any]:
+    """Ejemplo de mensaje de texto de la documentación."""
+    return copy.deepcopy(load_doc_payloads()[0])
+
+
+def status_payload() -> Dict[str, Any]:
+    """Ejemplo de notificación de estado de la documentación."""
+    return copy.deepcopy(load_doc_payloads()[1])
+
+
+def interactive_payload(kind: str = "button_reply", option: str = "pileta") -> Dict[str, Any]:
+    """Variante del ejemplo de texto con una respuesta interactiva ('button_reply' o 'list_reply')."""
+    payload = text_payload()
+    message = payload["entry"][0]["changes"][0]["value"]["messages"][0]
+    message.pop("text")
+    message["type"] = "interactive"
+    message["interactive"] = {"type": kind, kind: {"id": option, "title": option.capitalize()}}
+    return payload
+
+
+def batch_payload(messages: int = 10, senders: int = 5) -> Dict[str, Any]:
+    """Lote con 'messages' mensajes de texto repartidos entre 'senders' remitentes."""
+    payload = text_payload()
+    value = payload["entry"][0]["changes"][0]["value"]
+    template = value["messages"][0]
+    value["messages"] = []
+    for i in range(messages):
+        message = copy.deepcopy(template)
+        message["id"] = f"{template['id']}-{i}"
+        message["from"] = str(int(template["from"]) + i % senders)
+        value["messages"].append(message)
+    return payload
+
+
+def all_samples() -> Dict[str, Dict[str, Any]]:
+    """Conjunto de payloads con nombre, usado por los benchmarks."""
+    return {
+        "text": text_payload(),
+        "status": status_payload(),
+        "button_reply": interactive_payload("button_reply"),
+        "list_reply": interactive_payload("list_reply"),
+        "batch_10": batch_payload(10),
+    }
@@ -0,0 +1,78 @@
+'''
+conftest.py
+Configuración común de las pruebas con pytest.
+    + Variables de entorno mínimas de Settings (se instancian al importar app/config_setup) y
+      archivos locales (SQLite, índices) en un directorio temporal, no en ./data.
+    + Las pruebas asíncronas usan el plugin de anyio (@pytest.mark.anyio) sobre asyncio.
+Uso:
+    python -m pytest -q
+'''
+import os
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+# Scripts de prueba manual de las primeras versiones (importan módulos por ruta relativa a su carpeta)
+collect_ignore = ["start", "version_backup"]
+
+DATA_DIR = tempfile.mkdtemp(prefix="wa-tests-")
+
+for name, value in {
+    "VERIFY_TOKEN": "verify-token",
+    "ACCESS_TOKEN": "access-token",
+    "PHONE_NUMBER_ID": "1234567890",
+    "META_API_VER": "v22.0",
+    "META_URL": "http://graph.test",
+    "APP_ID": "1",
+    "NGROK_AUTH_TOKEN": "ngrok-token",
+    "NGROK_COMMAND": "ngrok http 5000",
+    "NGROK_TIMEOUT": "5",
+    "NGROK_ENABLED": "false",
+    "RECIPIENT_WAID_1": "111",
+    "RECIPIENT_ITEM_1": "222",
+    "DEBUG": "false",
+    "DEDUPE_SQLITE_PATH": os.path.join(DATA_DIR, "dedupe.sqlite3"),
+    "SESSION_SQLITE_PATH": os.path.join(DATA_DIR, "sessions.sqlite3"),
+    "OUTBOX_PATH": os.path.join(DATA_DIR, "outbox.sqlite3"),
+    "KNOWLEDGE_INDEX_PATH": os.path.join(DATA_DIR, "knowledge_index.pkl"),
+    "SEMANTIC_CACHE_DIR": os.path.join(DATA_DIR, "semantic"),
+}.items():
+    os.environ.setdefault(name, value)
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    return "asyncio"
+
+
+@pytest.fixture
+def make_webhook() -> Callable[..., Dict[str, Any]]:
+    """Arma un webhook de Meta con los mensajes indicados como (remitente, id, texto o ('button_reply', id))."""
+
+    def build(*messages: tuple, statuses: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        items = []
+        for sender, message_id, content in messages:
+            message: Dict[str, Any] = {"from": sender, "id": message_id, "timestamp": "1672531200"}
+            if isinstance(content, tuple):
+                kind, option = content
+                message.update(type="interactive", interactive={"type": kind, kind: {"id": option, "title": option.title()}})
+            else:
+                message.update(type="text", text={"body": content})
+            items.append(message)
+        value: Dict[str, Any] = {
+            "messaging_product": "whatsapp",
+            "metadata": {"display_phone_number": "15551234567", "phone_number_id": "1234567890"},
+        }
+        if items:
+            value["messages"] = items
+        if statuses:
+            value["statuses"] = statuses
+        return {"object": "whatsapp_business_account", "entry": [{"id": "1", "changes": [{"value": value, "field": "messages"}]}]}
+
+    return build
@@ -0,0 +1,51 @@
+'''
+test_dedupe.py
+Pruebas del deduplicador de message.id: duplicados dentro del TTL, renovación de ids vencidos
+y la cantidad de entradas informada en /stats sin recorrer la tabla en cada consulta.
+'''
+import asyncio
+
+import pytest
+
+from app.services.dedupe import MemoryDedupeBackend, MessageDeduplicator, SQLiteDedupeBackend
+
+pytestmark = pytest.mark.anyio
+
+
+def make_backend(backend: str, tmp_path, ttl: float = 60.0):
+    if backend == "memory":
+        return MemoryDedupeBackend(ttl, max_entries=100)
+    return SQLiteDedupeBackend(str(tmp_path / "dedupe.sqlite3"), ttl, purge_every=2)
+
+
+@pytest.mark.parametrize("backend", ("memory", "sqlite"))
+async def test_duplicates_are_detected_within_ttl(backend, tmp_path):
+    deduplicator = MessageDeduplicator(make_backend(backend, tmp_path))
+
+    results = await asyncio.gather(*(deduplicator.is_duplicate(key) for key in ("wamid.1", "wamid.2", "wamid.1")))
+
+    assert results == [False, False, True]
+    stats = deduplicator.stats()
+    assert (stats["entries"], stats["hits"], stats["misses"]) == (2, 1, 2)
+    await deduplicator.close()
+
+
+async def test_sqlite_purges_expired_ids_and_recounts(tmp_path):
+    backend = make_backend("sqlite", tmp_path, ttl=0.05)
+    assert await backend.check_and_add("wamid.1") is False
+    await asyncio.sleep(0.1)
+
+    # Un id vencido se renueva; la segunda inserción dispara la purga y el recuento
+    assert await backend.check_and_add("wamid.1") is False
+    assert await backend.check_and_add("wamid.2") is False
+    assert backend.entries() == 2
+    await asyncio.sleep(0.1)
+    assert await backend.check_and_add("wamid.3") is False
+    assert await backend.check_and_add("wamid.4") is False
+    assert backend.entries() == 2
+    await backend.close()
+
+    # Otro worker que abre el mismo archivo parte del recuento real
+    reopened = SQLiteDedupeBackend(str(tmp_path / "dedupe.sqlite3"), 60)
+    assert reopened.entries() == 2
+    await reopened.close()
@@ -0,0 +1,45 @@
+'''
+test_dispatcher.py
+Pruebas del despachador de respuestas: lotes concurrentes del mismo usuario (dos workers de la
+cola) se resuelven y se envían en orden, sin partir de la misma sesión.
+'''
+import asyncio
+
+import pytest
+
+from app.schemas.webhook_schema import WebhookPayload
+from app.services.conversation import DEFAULT_GRAPH, ConversationEngine
+from app.services.dispatcher import ReplyDispatcher
+from app.services.sessions import SQLiteSessionStore
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_batches_of_the_same_user_are_serialized(tmp_path, make_webhook):
+    engine = ConversationEngine(DEFAULT_GRAPH, SQLiteSessionStore(str(tmp_path / "sessions.sqlite3"), 60, 100))
+    dispatcher = ReplyDispatcher()
+    sent = []
+
+    def batch(message_id: str, text: str):
+        payload = WebhookPayload.model_validate(make_webhook(("111", message_id, text)))
+        return {"111": payload.entry[0].changes[0].value.messages}
+
+    async def resolve(conversations):
+        replies = await engine.handle_batch(conversations)
+        return {user: [reply.text for reply in user_replies] for user, user_replies in replies.items()}
+
+    async def send(text):
+        await asyncio.sleep(0.01)
+        sent.append(text)
+
+    # El segundo lote lee la sesión que dejó el primero ('menu'), así 'tenis' es una opción válida
+    failed = await asyncio.gather(
+        dispatcher.dispatch_batch(batch("wamid.1", "hola"), resolve, send),
+        dispatcher.dispatch_batch(batch("wamid.2", "tenis"), resolve, send),
+    )
+
+    assert failed == [0, 0]
+    assert sent == ["Hola!", "Por favor, elije una opción:", "Tenis: ¿qué necesitás?"]
+    assert (await engine.store.get("111")).state == "tenis"
+    assert dispatcher._locks == {}
+    await engine.close()
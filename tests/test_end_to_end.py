@@ -0,0 +1,146 @@
+'''
+test_end_to_end.py
+Pruebas de punta a punta: la app de main.py con su lifespan (cola, deduplicación, motor de
+conversación y outbox reales) recibe POST /webhook y responde a la Graph API simulada
+(tests/benchmarks/graph_simulator.py), que registra los mensajes aceptados.
+Cubren reintentos ante 429 y 5xx, la apertura del circuito y el reenvío desde el outbox.
+'''
+import asyncio
+import json
+import time
+from typing import Any, Callable, Dict, List
+
+import httpx
+import pytest
+
+from app.config_setup.config_settings import get_settings
+from app.services.dependencies import get_whatsapp_service
+from app.services.resilience import CircuitBreaker, RetryPolicy
+from app.services.wa_services import WhatsAppService
+from main import app
+from tests.benchmarks.graph_simulator import GraphSimulator, SimulatorConfig
+
+pytestmark = pytest.mark.anyio
+
+USER = "5491100000010"
+
+
+class ScriptedGraph(GraphSimulator):
+    """Simulador que responde primero los códigos de 'failures' (429 o 5xx, con el formato de Graph) y después normalmente."""
+
+    def __init__(self, *failures: int):
+        self.sent: List[Dict[str, Any]] = []
+        super().__init__(SimulatorConfig(retry_after=0), on_message=self.sent.append)
+        self.failures = list(failures)
+
+    def handle(self, path, headers, body):
+        if not self.failures:
+            return super().handle(path, headers, body)
+        throttle = self.failures.pop(0) == 429
+        config = self.config
+        config.rate_429, config.rate_5xx = (1.0, 0.0) if throttle else (0.0, 1.0)
+        try:
+            return super().handle(path, headers, body)
+        finally:
+            config.rate_429 = config.rate_5xx = 0.0
+
+
+async def wait_for(condition: Callable[[], bool], timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("La condición no se cumplió a tiempo")
+        await asyncio.sleep(0.01)
+
+
+@pytest.fixture
+async def graph():
+    simulator = ScriptedGraph()
+    yield simulator
+    await simulator.aclose()
+
+
+@pytest.fixture
+async def bot(graph, tmp_path, monkeypatch):
+    """App con su lifespan; el WhatsAppService (y el reenvío del outbox) apuntan al simulador."""
+    monkeypatch.setattr(get_settings(), "OUTBOX_PATH", str(tmp_path / "outbox.sqlite3"))
+    async with app.router.lifespan_context(app), graph.client() as graph_client:
+        outbox = app.state.outbox
+        service = WhatsAppService(
+            client=graph_client,
+            retry_policy=RetryPolicy(max_attempts=3, base_delay=0.01, max_delay=0.01),
+            circuit_breaker=CircuitBreaker(failure_threshold=3, reset_timeout=0.2),
+            outbox=outbox,
+        )
+        await outbox.stop()
+        await outbox.start(service.deliver)
+        app.dependency_overrides[get_whatsapp_service] = lambda: service
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bot") as client:
+            yield client, service
+        app.dependency_overrides.pop(get_whatsapp_service, None)
+
+
+async def post(client: httpx.AsyncClient, webhook: Dict[str, Any]) -> None:
+    response = await client.post("/webhook", content=json.dumps(webhook), headers={"Content-Type": "application/json"})
+    assert response.status_code == 200
+
+
+async def test_replies_reach_the_graph_api_in_order(bot, graph, make_webhook):
+    client, _ = bot
+    await post(client, make_webhook((USER, "wamid.e2e.1", "hola")))
+    await wait_for(lambda: len(graph.sent) == 2)
+    await post(client, make_webhook((USER, "wamid.e2e.2", ("button_reply", "pileta"))))
+    await wait_for(lambda: len(graph.sent) == 3)
+
+    greeting, menu, pileta = graph.sent
+    assert {message["to"] for message in graph.sent} == {USER}
+    assert greeting["text"]["body"] == "Hola!"
+    assert menu["type"] == "interactive"
+    assert [b["reply"]["id"] for b in menu["interactive"]["action"]["buttons"]] == ["pileta", "tenis", "sum"]
+    assert pileta["interactive"]["body"]["text"] == "Pileta: ¿qué necesitás?"
+
+
+async def test_429_and_5xx_are_retried(bot, graph, make_webhook):
+    client, service = bot
+    graph.failures = [429, 503]
+    await post(client, make_webhook((USER, "wamid.e2e.3", "hola")))
+    await wait_for(lambda: len(graph.sent) == 2)
+
+    counters = graph.stats()
+    assert (counters["throttled"], counters["server_errors"], counters["accepted"]) == (1, 1, 2)
+    assert service.retry_policy.stats()["retries"] == 2
+    assert service.circuit_breaker.state == CircuitBreaker.CLOSED
+    await service.outbox.flush()
+    assert (await service.outbox.stats())["pending"] == 0
+
+
+async def test_circuit_opens_and_outbox_replays_after_recovery(bot, graph, make_webhook):
+    client, service = bot
+    graph.config.rate_5xx = 1.0
+    await post(client, make_webhook((USER, "wamid.e2e.4", "hola")))
+    await wait_for(lambda: service.circuit_breaker.state == CircuitBreaker.OPEN)
+    # Con el circuito abierto el envío falla sin llegar a Graph
+    requests = graph.stats()["requests"]
+    await post(client, make_webhook(("5491100000011", "wamid.e2e.5", "hola")))
+    await wait_for(lambda: service.circuit_breaker.rejected >= 1)
+    assert graph.stats()["requests"] == requests
+
+    outbox = service.outbox
+    await outbox.flush()
+    pending = (await outbox.stats())["pending"]
+    assert pending == 2
+    assert graph.sent == []
+
+    # Graph se recupera: pasado reset_timeout el reenvío hace de prueba y cierra el circuito
+    graph.config.rate_5xx = 0.0
+    await asyncio.sleep(service.circuit_breaker.reset_timeout)
+    replayed = await outbox.replay_pending()
+    if replayed < pending:
+        # El circuito semiabierto deja pasar un solo envío de prueba a la vez
+        replayed += await outbox.replay_pending()
+    assert replayed == pending
+    assert sorted(message["to"] for message in graph.sent) == [USER, "5491100000011"]
+    assert all(message["text"]["body"] == "Hola!" for message in graph.sent)
+    assert service.circuit_breaker.stats()["times_opened"] == 1
+    assert service.circuit_breaker.state == CircuitBreaker.CLOSED
+    assert (await outbox.stats())["pending"] == 0
@@ -0,0 +1,54 @@
+'''
+test_generation.py
+Pruebas del generador de respuestas con un modelo sintético: micro-lotes en el hilo de inferencia
+y, si la carga del modelo falla, respuesta inmediata con None (menú) sin reintentar la carga.
+'''
+import asyncio
+
+import pytest
+
+from app.services.generation import AnswerGenerator
+
+pytestmark = pytest.mark.anyio
+
+
+class EchoModel:
+    def generate(self, prompts):
+        return [(prompt.rsplit("Pregunta: ", 1)[-1], 3) for prompt in prompts]
+
+
+async def test_questions_are_answered_in_micro_batches():
+    generator = AnswerGenerator(EchoModel, batch_window=0.05, timeout=5)
+    try:
+        answers = await asyncio.gather(*(generator.generate(f"pregunta {i}") for i in range(3)))
+    finally:
+        generator.close()
+
+    assert answers == ["pregunta 0", "pregunta 1", "pregunta 2"]
+    stats = generator.stats()
+    assert (stats["model_loaded"], stats["completed"], stats["tokens"]) == (True, 3, 9)
+
+
+async def test_failed_load_is_not_retried_until_retry_after():
+    loads = []
+
+    def load_model():
+        loads.append(1)
+        if len(loads) == 1:
+            raise ImportError("No module named 'transformers'")
+        return EchoModel()
+
+    generator = AnswerGenerator(load_model, timeout=5, load_retry_after=0.2)
+    try:
+        assert await generator.generate("¿hay clases de natación?") is None
+        # Dentro de la ventana: None inmediato, sin encolar ni volver a cargar
+        assert await asyncio.gather(*(generator.generate("¿y de tenis?") for _ in range(5))) == [None] * 5
+        assert len(loads) == 1
+        await asyncio.sleep(0.25)
+        assert await generator.generate("¿y de tenis?") == "¿y de tenis?"
+    finally:
+        generator.close()
+
+    stats = generator.stats()
+    assert len(loads) == 2
+    assert (stats["load_failures"], stats["unavailable"], stats["errors"]) == (1, 5, 1)
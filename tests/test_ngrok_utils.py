@@ -0,0 +1,119 @@
+'''
+test_ngrok_utils.py
+Pruebas del gestor del túnel ngrok (app/utils/ngrok_utils.py) contra el sustituto del agente
+(tests/benchmarks/ngrok_standin.py): backoff de la espera del túnel, reutilización de un túnel
+existente, reinicio del agente cuando termina y detención ordenada.
+'''
+import asyncio
+import os
+import socket
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+from app.utils import ngrok_utils
+from app.utils.ngrok_utils import NgrokTunnelManager
+from tests.benchmarks.ngrok_standin import AgentStandIn
+
+pytestmark = pytest.mark.anyio
+
+STANDIN = Path(__file__).resolve().parent / "benchmarks" / "ngrok_standin.py"
+PUBLIC_URL = "https://standin.ngrok-free.app"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def standin_client(startup_delay: float) -> httpx.AsyncClient:
+    """Cliente hacia la API del agente sustituto en proceso (sin red ni subproceso)."""
+    agent = AgentStandIn(PUBLIC_URL, "http://localhost:5000", startup_delay)
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=agent))
+
+
+def standin_command(port: int, *extra: str) -> list:
+    return [sys.executable, str(STANDIN), "--port", str(port), "--startup-delay", "0.1", "--public-url", PUBLIC_URL, *extra]
+
+
+def pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+async def test_wait_for_tunnel_backs_off_until_the_tunnel_appears(monkeypatch):
+    delays = []
+    sleep = asyncio.sleep
+
+    async def recording_sleep(delay):
+        delays.append(round(delay, 3))
+        await sleep(delay)
+
+    monkeypatch.setattr(ngrok_utils.asyncio, "sleep", recording_sleep)
+    async with standin_client(startup_delay=0.5) as client:
+        manager = NgrokTunnelManager(["ngrok", "http", "5000"], api_url="http://agent", client=client)
+        tunnel = await manager.wait_for_tunnel(timeout=5)
+
+    assert tunnel["public_url"] == PUBLIC_URL
+    assert delays == [ngrok_utils.POLL_INITIAL, ngrok_utils.POLL_INITIAL * 2, ngrok_utils.POLL_INITIAL * 4]
+
+
+async def test_wait_for_tunnel_gives_up_at_the_timeout():
+    async with standin_client(startup_delay=60) as client:
+        manager = NgrokTunnelManager(["ngrok", "http", "5000"], api_url="http://agent", client=client)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        assert await manager.wait_for_tunnel(timeout=0.3) is None
+        assert loop.time() - started < 1.0
+
+
+async def test_existing_tunnel_is_reused_without_launching_the_agent():
+    async with standin_client(startup_delay=0) as client:
+        manager = NgrokTunnelManager(["ngrok-que-no-existe"], api_url="http://agent", client=client, health_interval=0.05)
+        manager.start()
+        assert await manager.wait_ready(2)
+        await manager.stop()
+
+    stats = manager.stats()
+    assert manager.tunnel["public_url"] == PUBLIC_URL
+    assert (stats["launches"], stats["restarts"], stats["pid"]) == (0, 0, None)
+
+
+async def test_agent_is_restarted_after_it_exits_and_stopped_cleanly():
+    port = free_port()
+    async with httpx.AsyncClient() as client:
+        manager = NgrokTunnelManager(
+            standin_command(port, "--die-after", "1.5"),
+            api_url=f"http://127.0.0.1:{port}",
+            client=client,
+            timeout=10,
+            health_interval=0.1,
+            max_failures=2,
+        )
+        manager.start()
+        try:
+            assert await manager.wait_ready(15)
+            first_pid = manager.stats()["pid"]
+            # El agente termina solo: el gestor lo detecta en la revisión de salud y lanza otro
+            for _ in range(300):
+                stats = manager.stats()
+                if stats["state"] == "ready" and stats["pid"] not in (None, first_pid):
+                    break
+                await asyncio.sleep(0.05)
+            stats = manager.stats()
+            assert stats["pid"] not in (None, first_pid)
+            assert stats["launches"] == 2 and stats["restarts"] >= 1
+            assert stats["public_url"] == PUBLIC_URL
+            second_pid = stats["pid"]
+        finally:
+            await manager.stop()
+
+    assert manager.stats()["state"] == "stopped"
+    assert manager.stats()["pid"] is None
+    assert not pid_alive(second_pid)
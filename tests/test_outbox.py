@@ -0,0 +1,36 @@
+'''
+test_outbox.py
+Pruebas del reenvío del outbox: un fallo transitorio deja el mensaje pendiente para otra pasada
+y un rechazo definitivo de Graph (4xx salvo 429) lo saca de la cola, como en el envío en vivo.
+'''
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.services.outbox import MessageOutbox
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.mark.parametrize("status_code, pending", [(400, 0), (429, 1), (503, 1)])
+async def test_replay_drops_only_permanent_rejections(tmp_path, status_code, pending):
+    calls = []
+
+    async def sender(body, to):
+        calls.append(to)
+        raise HTTPException(status_code=status_code, detail="Graph")
+
+    outbox = MessageOutbox(str(tmp_path / "outbox.sqlite3"), replay_interval=3600, max_attempts=5)
+    await outbox.start(sender)
+    await asyncio.sleep(0.05)  # Deja terminar la pasada inicial del worker de replay (outbox vacío)
+    outbox_id = outbox.add(b'{"to": "111"}', "111")
+    outbox.mark_failed(outbox_id)
+
+    for _ in range(2):
+        assert await outbox.replay_pending() == 0
+    stats = await outbox.stats()
+    await outbox.stop()
+
+    assert (stats["pending"], stats["dead"]) == (pending, 0)
+    assert calls == ["111"] * (2 if pending else 1)
@@ -0,0 +1,96 @@
+'''
+test_sessions.py
+Pruebas de los almacenes de sesiones (memory, sqlite y redis con fakeredis): ida y vuelta de
+get/set y get_many/set_many, vencimiento por TTL y descarte de las sesiones más antiguas (LRU).
+'''
+import asyncio
+
+import pytest
+
+from app.services.sessions import MemorySessionStore, RedisSessionStore, SQLiteSessionStore
+
+pytestmark = pytest.mark.anyio
+
+BACKENDS = ("memory", "sqlite", "redis")
+
+
+def make_store(backend: str, tmp_path, ttl: float = 60.0, max_sessions: int = 100):
+    if backend == "memory":
+        return MemorySessionStore(ttl, max_sessions)
+    if backend == "sqlite":
+        return SQLiteSessionStore(str(tmp_path / "sessions.sqlite3"), ttl, max_sessions, purge_every=1)
+    fakeredis = pytest.importorskip("fakeredis")
+    return RedisSessionStore("redis://fake", ttl, client=fakeredis.FakeAsyncRedis())
+
+
+@pytest.fixture(params=BACKENDS)
+async def store(request, tmp_path):
+    store = make_store(request.param, tmp_path)
+    yield store
+    await store.close()
+
+
+async def test_round_trip(store):
+    assert await store.get("111") is None
+    await store.set("111", "pileta")
+    await store.set("111", "pileta_horarios")
+
+    session = await store.get("111")
+    assert session.state == "pileta_horarios"
+    await store.delete("111")
+    assert await store.get("111") is None
+
+
+async def test_batch_round_trip(store):
+    await store.set_many({"111": "menu", "222": "tenis", "333": "sum"})
+    await store.set_many({})
+
+    sessions = await store.get_many(["111", "222", "444"])
+    assert {user: session.state for user, session in sessions.items()} == {"111": "menu", "222": "tenis"}
+    assert await store.get_many([]) == {}
+    stats = await store.stats()
+    assert (stats["hits"], stats["misses"]) == (2, 1)
+
+
+@pytest.mark.parametrize("backend", ("memory", "sqlite"))
+async def test_sessions_expire_after_ttl(backend, tmp_path):
+    store = make_store(backend, tmp_path, ttl=0.05)
+    await store.set("111", "pileta")
+    assert (await store.get("111")).state == "pileta"
+    await asyncio.sleep(0.1)
+
+    assert await store.get("111") is None
+    assert await store.get_many(["111"]) == {}
+    assert (await store.stats())["sessions"] == 0
+    await store.close()
+
+
+async def test_redis_sessions_use_server_ttl():
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeAsyncRedis()
+    store = RedisSessionStore("redis://fake", 30, client=client)
+    await store.set("111", "pileta")
+    await store.set_many({"222": "tenis"})
+
+    assert 0 < await client.ttl("wa:session:111") <= 30
+    assert 0 < await client.ttl("wa:session:222") <= 30
+    await store.close()
+
+
+@pytest.mark.parametrize("backend", ("memory", "sqlite"))
+async def test_least_recently_used_sessions_are_evicted(backend, tmp_path):
+    store = make_store(backend, tmp_path, max_sessions=2)
+    await store.set("111", "menu")
+    await asyncio.sleep(0.01)
+    await store.set("222", "menu")
+    await asyncio.sleep(0.01)
+    # Renovar 111 lo vuelve el más reciente: el descartado es 222
+    await store.set("111", "pileta")
+    await asyncio.sleep(0.01)
+    await store.set("333", "tenis")
+
+    assert await store.get("222") is None
+    assert (await store.get("111")).state == "pileta"
+    assert (await store.get("333")).state == "tenis"
+    assert (await store.stats())["sessions"] == 2
+    await store.close()
@@ -0,0 +1,168 @@
+'''
+test_webhook_routes.py
+Pruebas de GET/POST /webhook con las dependencias reemplazadas (app.dependency_overrides):
+parseo del payload, encolado, deduplicación y las respuestas 403 (firma), 422 (body) y 503 (cola llena).
+'''
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.schemas.webhook_schema import WebhookPayload
+from app.services.conversation import DEFAULT_GRAPH, ConversationEngine
+from app.services.dedupe import MemoryDedupeBackend, MessageDeduplicator
+from app.services.dependencies import (
+    get_conversation_engine,
+    get_deduplicator,
+    get_job_queue,
+    get_signature_verifier,
+    get_whatsapp_service,
+)
+from app.services.dispatcher import ReplyDispatcher
+from app.services.job_queue import Job, JobQueue
+from app.services.metrics import WEBHOOK_REQUESTS
+from app.services.sessions import MemorySessionStore
+from app.services.signature import SIGNATURE_HEADER, SignatureVerifier, sign
+from app.services.wa_services import WhatsAppService, handle_webhook_POST_logic
+from main import app
+from tests.benchmarks.graph_simulator import GraphSimulator, SimulatorConfig
+
+pytestmark = pytest.mark.anyio
+
+APP_SECRET = "app-secret"
+
+
+class RecordingQueue:
+    """Cola sin workers: guarda los trabajos encolados para inspeccionarlos."""
+
+    def __init__(self):
+        self.jobs = []
+
+    async def enqueue(self, func, *args) -> None:
+        self.jobs.append(Job(func=func, args=args))
+
+
+@pytest.fixture
+async def simulator():
+    simulator = GraphSimulator()
+    yield simulator
+    await simulator.aclose()
+
+
+@pytest.fixture
+async def resources(simulator):
+    """Dependencias de la app: cola que registra los trabajos, deduplicador, motor y servicio hacia el simulador."""
+    async with simulator.client() as client:
+        resources = {
+            "queue": RecordingQueue(),
+            "deduplicator": MessageDeduplicator(MemoryDedupeBackend(ttl=60, max_entries=100)),
+            "engine": ConversationEngine(DEFAULT_GRAPH, MemorySessionStore(ttl=60, max_sessions=100)),
+            "service": WhatsAppService(client=client),
+            "verifier": None,
+        }
+        app.dependency_overrides.update({
+            get_job_queue: lambda: resources["queue"],
+            get_deduplicator: lambda: resources["deduplicator"],
+            get_conversation_engine: lambda: resources["engine"],
+            get_whatsapp_service: lambda: resources["service"],
+            get_signature_verifier: lambda: resources["verifier"],
+        })
+        yield resources
+        app.dependency_overrides.clear()
+
+
+@pytest.fixture
+async def client(resources):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bot") as client:
+        yield client
+
+
+async def test_verify_webhook_returns_challenge(client):
+    params = {"hub.mode": "subscribe", "hub.verify_token": "verify-token", "hub.challenge": "1158201444"}
+    response = await client.get("/webhook", params=params)
+    assert response.status_code == 200
+    assert response.text == "1158201444"
+
+
+async def test_post_parses_payload_and_enqueues_job(client, resources, make_webhook):
+    response = await client.post("/webhook", json=make_webhook(("5491100000001", "wamid.1", "hola")))
+
+    assert response.status_code == 200
+    assert response.json()["status"] == "success"
+    [job] = resources["queue"].jobs
+    assert job.func is handle_webhook_POST_logic
+    payload, service, deduplicator, dispatcher, engine = job.args
+    assert isinstance(payload, WebhookPayload)
+    message = payload.entry[0].changes[0].value.messages[0]
+    assert (message.from_, message.id, message.text.body) == ("5491100000001", "wamid.1", "hola")
+    assert service is resources["service"]
+    assert deduplicator is resources["deduplicator"]
+    assert engine is resources["engine"]
+
+
+async def test_duplicate_message_is_answered_once(client, resources, simulator, make_webhook):
+    webhook = make_webhook(("5491100000002", "wamid.dup", "hola"))
+    for _ in range(2):
+        assert (await client.post("/webhook", json=webhook)).status_code == 200
+        job = resources["queue"].jobs.pop()
+        await job.func(*job.args[:3], ReplyDispatcher(), job.args[4])
+
+    # Saludo + menú una sola vez: el reenvío de Meta no genera envíos
+    assert simulator.stats()["accepted"] == 2
+    assert resources["deduplicator"].stats()["hits"] == 1
+
+
+async def test_invalid_signature_is_rejected_with_403(client, resources, make_webhook):
+    resources["verifier"] = SignatureVerifier(APP_SECRET)
+    body = json.dumps(make_webhook(("5491100000003", "wamid.2", "hola"))).encode()
+
+    missing = await client.post("/webhook", content=body)
+    forged = await client.post("/webhook", content=body, headers={SIGNATURE_HEADER: sign("otro-secreto", body)})
+    signed = await client.post("/webhook", content=body, headers={SIGNATURE_HEADER: sign(APP_SECRET, body)})
+
+    assert missing.status_code == 403
+    assert forged.status_code == 403
+    assert signed.status_code == 200
+    assert len(resources["queue"].jobs) == 1
+
+
+@pytest.mark.parametrize("body", [b"{not json", b'{"object": "whatsapp_business_account"}', b'{"entry": "x"}'])
+async def test_invalid_body_is_rejected_with_422(client, resources, body):
+    response = await client.post("/webhook", content=body, headers={"Content-Type": "application/json"})
+
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"][0] == "body"
+    assert resources["queue"].jobs == []
+
+
+async def test_full_queue_is_rejected_with_503(client, resources, make_webhook):
+    # Graph lenta: el único worker queda ocupado con el primer webhook y el segundo llena la cola
+    slow = GraphSimulator(SimulatorConfig(latency_ms=300))
+    async with slow.client() as graph:
+        resources["service"] = WhatsAppService(client=graph)
+        queue = resources["queue"] = JobQueue(workers=1, maxsize=1, put_timeout=0.01)
+        await queue.start()
+        statuses = []
+        for i in range(3):
+            response = await client.post("/webhook", json=make_webhook(("5491100000004", f"wamid.full.{i}", "hola")))
+            statuses.append(response.status_code)
+            await asyncio.sleep(0)
+        await queue.stop(drain_timeout=5)
+    await slow.aclose()
+
+    assert statuses == [200, 200, 503]
+    assert response.json()["detail"] == "Servidor ocupado, reintente más tarde"
+    assert queue.stats()["rejected"] == 1
+
+
+async def test_enqueue_failure_is_rejected_with_500(client, resources, make_webhook):
+    # Cola detenida (apagado en curso): el webhook no se da por entregado y Meta lo reintenta
+    resources["queue"] = JobQueue(workers=1, maxsize=1)
+    errors = WEBHOOK_REQUESTS.value(("text", "error"))
+
+    response = await client.post("/webhook", json=make_webhook(("5491100000005", "wamid.down", "hola")))
+
+    assert response.status_code == 500
+    assert response.json()["detail"] == "Error al procesar el webhook"
+    assert WEBHOOK_REQUESTS.value(("text", "error")) == errors + 1